@@ -1,11 +1,65 @@
 # auth_route.py
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from db import SUPABASE_JWT_SECRET
 
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 10000))
+
 security = HTTPBearer()
 
+
+class TokenCache:
+    # Verified token payloads keyed by the token digest, each one kept until the token's exp. Callers get
+    # their own copy of a payload, so a handler that changes current_user does not change it for later requests
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[0])
+
+    def put(self, key, payload, expires_at):
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(payload), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(JWT_CACHE_SIZE)
+
+
 async def auth_middleware(request: Request, call_next):
     token = request.cookies.get("access_token")
     if token and token.startswith("Bearer "):
@@ -16,14 +70,25 @@ async def auth_middleware(request: Request, call_next):
     response = await call_next(request)
     return response
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        # Remove 'Bearer ' prefix if present
-        if token.startswith("Bearer "):
-            token = token.split(" ")[1]
+
+def decode_token(token: str) -> dict:
+    # Remove 'Bearer ' prefix if present
+    if token.startswith("Bearer "):
+        token = token.split(" ")[1]
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is None:
         # Add 'options' parameter to ignore audience claim
         payload = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=['HS256'], options={"verify_aud": False})
+        # tokens without exp never expire, so they are verified every time instead of cached forever
+        if payload.get('exp') is not None:
+            token_cache.put(key, payload, payload['exp'])
+    return payload
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        payload = decode_token(credentials.credentials)
         user_id = payload.get('sub')
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials")
@@ -31,4 +96,4 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
     except jwt.PyJWTError as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
@@ -0,0 +1,57 @@
+"""Compare the blocking Session path with the AsyncSession path inside one event loop.
+
+Every simulated request runs a query that takes ``--latency`` seconds on the server
+(``pg_sleep``), which is how a slow Postgres query looks to a handler.
+
+    python -m benchmarks.async_vs_sync --requests 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from db import engine, async_session_maker
+
+QUERY = text("SELECT pg_sleep(:latency), count(*) FROM \"order\"")
+
+
+async def sync_request(latency):
+    # this is what the handlers did before: a blocking call inside an async def
+    with Session(engine) as session:
+        session.execute(QUERY, {"latency": latency}).all()
+
+
+async def async_request(latency):
+    async with async_session_maker() as session:
+        (await session.execute(QUERY, {"latency": latency})).all()
+
+
+async def run(request, requests, concurrency, latency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await request(latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for name, request in (("sync Session", sync_request), ("AsyncSession", async_request)):
+        elapsed = asyncio.run(run(request, args.requests, args.concurrency, args.latency))
+        print(f"{name:>13}: {args.requests} requests in {elapsed:.2f}s "
+              f"({args.requests / elapsed:.1f} req/s)")
+
+
+if __name__ == "__main__":
+    main()
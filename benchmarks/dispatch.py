@@ -0,0 +1,70 @@
+"""Driver assignment on a synthetic day.
+
+Spreads ``--deliveries`` destinations, a handful of warehouses and ``--drivers`` drivers over
+Addis Ababa and plans them with services.dispatch. Greedy is what a dispatcher picking the nearest
+free driver for each order in turn would do. No database is needed.
+
+    python -m benchmarks.dispatch --deliveries 1000 --drivers 100 --capacity 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services import dispatch
+
+CENTER = (9.02, 38.75)
+SPREAD = 0.08  # degrees, about 9 km
+
+
+def scenario(deliveries, drivers, capacity, warehouses=5, seed=1):
+    rng = np.random.default_rng(seed)
+    depots = rng.normal(CENTER, SPREAD / 2, (warehouses, 2))
+    sources = depots[rng.integers(0, warehouses, deliveries)]
+    destinations = rng.normal(CENTER, SPREAD, (deliveries, 2))
+    positions = rng.normal(CENTER, SPREAD, (drivers, 2))
+    return ([dispatch.OpenDelivery(i, *destinations[i], *sources[i]) for i in range(deliveries)],
+            [dispatch.AvailableDriver(i, *positions[i], capacity) for i in range(drivers)])
+
+
+def greedy(deliveries, drivers):
+    # returns the total and the pickup (empty) km
+    slots = {driver.id: driver.slots for driver in drivers}
+    total = empty = 0.0
+    for delivery in deliveries:
+        source = np.array([delivery.source_latitude, delivery.source_longitude])
+        free = [driver for driver in drivers if slots[driver.id]]
+        if not free:
+            break
+        pickup = dispatch.haversine(np.array([(d.latitude, d.longitude) for d in free]), source)
+        nearest = int(np.argmin(pickup))
+        slots[free[nearest].id] -= 1
+        empty += pickup[nearest]
+        total += pickup[nearest] + dispatch.haversine(source, np.array([delivery.latitude, delivery.longitude]))
+    return total, empty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deliveries", type=int, default=1000)
+    parser.add_argument("--drivers", type=int, default=100)
+    parser.add_argument("--capacity", type=int, default=10)
+    args = parser.parse_args()
+
+    deliveries, drivers = scenario(args.deliveries, args.drivers, args.capacity)
+    start = time.perf_counter()
+    assignments, unassigned = dispatch.assign(deliveries, drivers)
+    elapsed = time.perf_counter() - start
+    optimal = sum(assignment.distance_km for assignment in assignments)
+    optimal_empty = sum(assignment.pickup_km for assignment in assignments)
+    start = time.perf_counter()
+    nearest, nearest_empty = greedy(deliveries, drivers)
+    greedy_elapsed = time.perf_counter() - start
+    print(f"{args.deliveries} deliveries x {args.drivers} drivers ({args.drivers * args.capacity} slots)")
+    print(f"  assignment: {len(assignments)} assigned, {len(unassigned)} left, {optimal:.1f} km "
+          f"({optimal_empty:.1f} km to the warehouses) in {elapsed * 1000:.0f} ms")
+    print(f"      greedy: {nearest:.1f} km ({nearest_empty:.1f} km to the warehouses) in {greedy_elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Load planning of a synthetic day.
+
+Fills an in-memory SQLite database with ``--lines`` order lines spread over deliveries of one to
+ten lines, ``--products`` products and ``--drivers`` drivers, then times the weight and volume
+query and the packing of services.loading separately.
+
+    python -m benchmarks.load_planning --lines 5000 --drivers 50
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import date, datetime
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from model.delivery import Delivery
+from model.orders import Order, OrderItem
+from model.organization import UserOrganization
+from model.product import Product
+from model.user import Driver
+from services import loading
+
+ORGANIZATION_ID = 1
+DAY = date(2024, 3, 1)
+
+
+async def fill(session, lines, products, drivers, seed=1):
+    rng = np.random.default_rng(seed)
+    users = [uuid.uuid4() for _ in range(drivers)]
+    session.add_all(UserOrganization(user_id=user, organization_id=ORGANIZATION_ID) for user in users)
+    session.add_all(Driver(id=i + 1, name=f"driver {i}", driver_id=user, email=f"d{i}@example.com", phone="0911",
+                           car_license_plate=f"AA-{i}", driver_license_id=f"DL-{i}") for i, user in enumerate(users))
+    sizes = rng.integers(5, 60, (products, 3))
+    session.add_all(Product(id=i + 1, name=f"product {i}", unit_of_measurement="pcs", organization_id=ORGANIZATION_ID,
+                            weight=float(rng.uniform(0.5, 20)), dimensions=" x ".join(map(str, sizes[i])))
+                    for i in range(products))
+    per_delivery = rng.integers(1, 11, lines)
+    per_delivery = per_delivery[:np.searchsorted(np.cumsum(per_delivery), lines) + 1]
+    per_delivery[-1] -= per_delivery.sum() - lines
+    session.add_all(Order(id=i + 1, client_id=1, user_id=uuid.uuid4(), organization_id=ORGANIZATION_ID)
+                    for i in range(len(per_delivery)))
+    session.add_all(Delivery(id=i + 1, order_id=i + 1, organization_id=ORGANIZATION_ID,
+                             started_at=datetime(DAY.year, DAY.month, DAY.day, 8)) for i in range(len(per_delivery)))
+    session.add_all(OrderItem(order_id=order_id, product_id=int(rng.integers(1, products + 1)),
+                              quantity=float(rng.integers(1, 6)), price=1)
+                    for order_id, count in enumerate(per_delivery.tolist(), start=1) for _ in range(count))
+    await session.commit()
+    return len(per_delivery)
+
+
+async def run(args):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    if "auth.users" not in SQLModel.metadata.tables:
+        sa.Table("users", SQLModel.metadata, sa.Column("id", sa.Uuid, primary_key=True), schema="auth")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all,
+                            tables=[t for t in SQLModel.metadata.sorted_tables if t.schema is None])
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        deliveries = await fill(session, args.lines, args.products, args.drivers)
+        start = time.perf_counter()
+        loads = await loading.delivery_loads(session, ORGANIZATION_ID, DAY)
+        vehicles = await loading.organization_vehicles(session, ORGANIZATION_ID, args.capacity_kg, args.capacity_m3)
+        queried = time.perf_counter() - start
+        start = time.perf_counter()
+        manifests, unplaced = loading.pack(loads, vehicles)
+        packed = time.perf_counter() - start
+    await engine.dispose()
+    carried = [sum(load.weight_kg for load in manifest) for manifest in manifests.values()]
+    print(f"{args.lines} order lines in {deliveries} deliveries, {args.drivers} vehicles "
+          f"of {args.capacity_kg:g} kg / {args.capacity_m3:g} m3")
+    print(f"  query: {queried * 1000:.0f} ms, packing: {packed * 1000:.0f} ms")
+    print(f"  {deliveries - len(unplaced)} loaded, {len(unplaced)} left over, "
+          f"{np.mean(carried) / args.capacity_kg:.0%} of the weight limit used on average")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--capacity-kg", type=float, default=3500)
+    parser.add_argument("--capacity-m3", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
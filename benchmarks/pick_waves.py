@@ -0,0 +1,36 @@
+"""Pick wave batching of a busy warehouse.
+
+Lays ``--products`` products out over twelve aisles, draws ``--orders`` open orders of one to nine
+lines and times services.picking.build_waves with ``--wave-size`` orders per wave.
+
+    python -m benchmarks.pick_waves --orders 2000 --wave-size 25
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services import picking
+from services.picking import Bin, PickLine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--wave-size", type=int, default=25)
+    args = parser.parse_args()
+    rng = np.random.default_rng(7)
+    bins = {i: Bin(f"p{i}", f"{chr(65 + i % 12)}-{i // 12 % 40:02d}-{i % 4}", "pcs") for i in range(args.products)}
+    lines = [PickLine(order_id, int(product_id), 1.0)
+             for order_id in range(args.orders) for product_id in rng.integers(0, args.products, rng.integers(1, 10))]
+    start = time.perf_counter()
+    waves = picking.build_waves(lines, bins, args.wave_size)
+    elapsed = time.perf_counter() - start
+    picks = sum(len(wave["picks"]) for wave in waves)
+    print(f"{args.orders} orders, {len(lines)} lines over {args.products} bins")
+    print(f"  {len(waves)} waves, {picks} picks in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Route planning of one driver.
+
+Scatters ``--stops`` delivery destinations around Addis Ababa and times services.routing.plan_route
+with a cold and a warm distance cache, ``--repeat`` times each.
+
+    python -m benchmarks.route_planning --stops 60
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services import routing
+
+START = (9.0, 38.7)
+
+
+def timed(stops, cache):
+    start = time.perf_counter()
+    routing.plan_route(START, stops, cache)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    rng = np.random.default_rng(5)
+    cold, warm = [], []
+    for _ in range(args.repeat):
+        stops = [tuple(p) for p in rng.normal((9.02, 38.75), 0.05, (args.stops, 2))]
+        cache = routing.DistanceCache()
+        cold.append(timed(stops, cache))
+        warm.append(timed(stops, cache))
+    print(f"{args.stops} stops, {args.repeat} routes")
+    print(f"  cold cache: median {np.median(cold) * 1000:.1f} ms, max {max(cold) * 1000:.1f} ms")
+    print(f"  warm cache: median {np.median(warm) * 1000:.1f} ms, max {max(warm) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Many sales clerks ordering the same product at once.
+
+Each clerk places ``--orders`` single-line orders for one unit of a scratch product whose stock
+matches the total demand, so every unit must be sold exactly once. ``read-modify-write`` is how
+/sales/create_multiple_order_items used to decrement stock, ``conditional update`` is services.stock.
+
+    python -m benchmarks.stock_contention --organization-id 1 --clerks 50 --orders 20
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete
+from sqlmodel import select
+
+from db import async_engine, async_session_maker
+from model.product import Product
+from services import stock
+
+
+async def read_modify_write(product_id, organization_id):
+    async with async_session_maker() as session:
+        product = (await session.exec(select(Product).where(Product.id == product_id))).first()
+        await asyncio.sleep(0)  # another clerk gets scheduled between the read and the write, as in a handler
+        product.quantity -= 1
+        session.add(product)
+        await session.commit()
+    return True
+
+
+async def conditional_update(product_id, organization_id):
+    async with async_session_maker() as session:
+        try:
+            await stock.reserve(session, organization_id, {product_id: 1})
+        except stock.InsufficientStock:
+            await session.rollback()
+            return False
+        await session.commit()
+    return True
+
+
+async def run(reserve, organization_id, clerks, orders):
+    async with async_session_maker() as session:
+        product = Product(name="benchmark stock contention", unit_of_measurement="unit",
+                          organization_id=organization_id, quantity=clerks * orders, sales_price=1)
+        session.add(product)
+        await session.commit()
+        await session.refresh(product)
+
+    async def clerk():
+        return sum([await reserve(product.id, organization_id) for _ in range(orders)])
+
+    start = time.perf_counter()
+    sold = sum(await asyncio.gather(*(clerk() for _ in range(clerks))))
+    elapsed = time.perf_counter() - start
+
+    async with async_session_maker() as session:
+        left = (await session.exec(select(Product.quantity).where(Product.id == product.id))).one()
+        await session.exec(delete(Product).where(Product.id == product.id))
+        await session.commit()
+    return sold, left, elapsed
+
+
+async def main(organization_id, clerks, orders):
+    for name, reserve in (("read-modify-write", read_modify_write), ("conditional update", conditional_update)):
+        sold, left, elapsed = await run(reserve, organization_id, clerks, orders)
+        lost = left - (clerks * orders - sold)  # units sold but still counted as stock
+        print(f"{name:>18}: {sold} units sold, {left:g} left, {lost:g} lost updates, "
+              f"{sold / elapsed:.1f} orders/s")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--organization-id", type=int, required=True)
+    parser.add_argument("--clerks", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.organization_id, args.clerks, args.orders))
@@ -0,0 +1,85 @@
+"""Many drivers connected to /delivery/ws at once.
+
+Opens ``--connections`` WebSockets to a running server, authenticated as the driver
+``--driver-user-id``, and has each of them send one GPS fix for ``--delivery-status-id`` every
+``--interval`` seconds for ``--duration`` seconds. Reports how many connections were accepted,
+how long the handshakes took and how many fixes reached the database.
+
+    uvicorn main:app --workers 1
+    python -m benchmarks.ws_connections --driver-user-id <uuid> --organization-id 1 \
+        --delivery-status-id 1 --connections 1000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import websockets
+from sqlalchemy import func
+from sqlmodel import select
+
+from db import SUPABASE_JWT_SECRET, async_engine, async_session_maker
+from model.delivery import GPSCoordinates
+
+
+async def stored_fixes(delivery_status_id):
+    async with async_session_maker() as session:
+        return (await session.exec(select(func.count()).select_from(GPSCoordinates)
+                                   .where(GPSCoordinates.delivery_status_id == delivery_status_id))).one()
+
+
+async def driver(index, url, delivery_status_id, interval, duration, start, handshakes):
+    began = time.perf_counter()
+    try:
+        websocket = await websockets.connect(url, open_timeout=30)
+    except Exception:
+        return None
+    handshakes.append(time.perf_counter() - began)
+    sent = 0
+    async with websocket:
+        # spread the clients over the interval like phones that connected at different times
+        await asyncio.sleep(interval * (index % 100) / 100)
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            timestamp = start + timedelta(seconds=sent * interval, microseconds=index)
+            await websocket.send(f'{{"type": "gps", "fixes": [{{"delivery_status_id": {delivery_status_id}, '
+                                 f'"latitude": 9.0, "longitude": 38.7, "timestamp": "{timestamp.isoformat()}"}}]}}')
+            sent += 1
+            await asyncio.sleep(interval)
+    return sent
+
+
+async def main(args):
+    token = jwt.encode({"sub": args.driver_user_id, "user_role": "driver",
+                        "user_metadata": {"organization_id": args.organization_id},
+                        "exp": int(time.time()) + 3600}, SUPABASE_JWT_SECRET, algorithm="HS256")
+    url = f"{args.url}?token={token}"
+    before = await stored_fixes(args.delivery_status_id)
+    start = datetime.utcnow()
+    handshakes = []
+    results = await asyncio.gather(*(driver(i, url, args.delivery_status_id, args.interval, args.duration, start,
+                                            handshakes) for i in range(args.connections)))
+    await asyncio.sleep(2)  # the server flushes buffered fixes about once a second
+    stored = await stored_fixes(args.delivery_status_id) - before
+    await async_engine.dispose()
+
+    connected = [sent for sent in results if sent is not None]
+    handshakes.sort()
+    sent = sum(connected)
+    print(f"{len(connected)}/{args.connections} connections, handshake p50 "
+          f"{handshakes[len(handshakes) // 2] * 1000:.1f} ms, p95 {handshakes[int(len(handshakes) * 0.95)] * 1000:.1f} ms"
+          if handshakes else f"0/{args.connections} connections")
+    print(f"{sent} fixes sent, {stored} stored ({stored / args.duration:.1f} fixes/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/delivery/ws")
+    parser.add_argument("--driver-user-id", required=True)
+    parser.add_argument("--organization-id", type=int, required=True)
+    parser.add_argument("--delivery-status-id", type=int, required=True)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=5)
+    parser.add_argument("--duration", type=float, default=30)
+    asyncio.run(main(parser.parse_args()))
@@ -1,6 +1,18 @@
 import os
+import threading
+import time
+from collections import deque
+from datetime import timezone
+from typing import Annotated
 
+from fastapi import Depends
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -15,10 +27,134 @@ POSTGRES = os.getenv('POSTGRES')
 if not all([SUPABASE_URL, SUPABASE_KEY, SUPABASE_JWT_SECRET, POSTGRES]):
     raise EnvironmentError("One or more Supabase environment variables are missing.")
 
+# The async engine talks to the same database through asyncpg, unless a separate URL is given
+ASYNC_POSTGRES = os.getenv('ASYNC_POSTGRES') or make_url(POSTGRES).set(
+    drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+# Connection pool settings, size them so workers * (pool size + overflow) stays under max_connections
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+
+class PoolMetrics:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._waits.append(wait)
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+                "wait_max_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+class InstrumentedPoolMixin:
+    metrics: PoolMetrics
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    metrics = PoolMetrics()
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+pool_options = dict(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=DB_POOL_PRE_PING)
+
 # Initialize Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-engine = create_engine(POSTGRES)
+engine = create_engine(POSTGRES, poolclass=InstrumentedQueuePool, **pool_options)
+async_engine = create_async_engine(ASYNC_POSTGRES, poolclass=InstrumentedAsyncQueuePool, **pool_options)
+
+# expire_on_commit is off so handlers can keep reading objects after a commit without lazy IO
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def naive_utc(moment):
+    # the timestamp columns are timezone-naive UTC
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def pool_status(pool):
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+    }
+    if isinstance(pool, InstrumentedPoolMixin):
+        status.update(pool.metrics.snapshot())
+    return status
+
+
+def dialect_insert(session, model):
+    # INSERT with ON CONFLICT support for the dialect the session is bound to
+    if session.bind.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
+async def require_migrated(engine=None):
+    # the command line jobs work on tables that only `alembic upgrade head` creates
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(
+        Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))).get_heads())
+    async with (engine or async_engine).connect() as conn:
+        current = await conn.run_sync(lambda sync_conn: set(MigrationContext.configure(sync_conn).get_current_heads()))
+    if current != heads:
+        raise SystemExit(f"The database is at revision {', '.join(sorted(current)) or 'none'}, "
+                         f"run `alembic upgrade head` first")
+
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def get_async_session():
+    async with async_session_maker() as session:
+        yield session
+
+
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
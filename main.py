@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from auth import auth_middleware
@@ -6,14 +8,26 @@ from routes.auth_route import auth_router
 from routes.dashboard_route import dashboard_router
 from routes.delivery_route import delivery_router
 from routes.general_route import general_router
+from routes.health_route import health_router
 from routes.procurement_route import procurement_router
 from routes.sales_route import sales_router
 from routes.user_route import user_router
+from routes.warehouse_route import warehouse_router
+from services.realtime import hub
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # the GPS fixes still buffered for the driver channel
+    await hub.close()
+
 
 app = FastAPI(title="Supply Chain and Logistics API",
     version="0.1",
-    description="This is a Supply Chain and Logistics API, includes routes for user, admin, procurement, sales, delivery, and dashboard.",
-    swagger_ui_parameters={"docExpansion": "none", "tryItOutEnabled": True}
+    description="This is a Supply Chain and Logistics API, includes routes for user, admin, procurement, sales, delivery, warehouse, and dashboard.",
+    swagger_ui_parameters={"docExpansion": "none", "tryItOutEnabled": True},
+    lifespan=lifespan
 )
 
 
@@ -25,7 +39,9 @@ app.include_router(procurement_router, prefix="/procurement", tags=["procurement
 app.include_router(general_router, tags=["general"])
 app.include_router(sales_router, prefix="/sales", tags=["sales"])
 app.include_router(delivery_router, prefix="/delivery", tags=["delivery"])
+app.include_router(warehouse_router, prefix="/warehouse", tags=["warehouse"])
 app.include_router(dashboard_router, prefix="/dashboard", tags=["dashboard"])
+app.include_router(health_router, prefix="/health", tags=["health"])
 
 app.get("/")
 def root():
@@ -0,0 +1,73 @@
+import asyncio
+
+import sqlalchemy as sa
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+import model.dashboard  # noqa: F401, the imports register every table in SQLModel.metadata
+import model.delivery  # noqa: F401
+import model.inventory  # noqa: F401
+import model.orders  # noqa: F401
+import model.organization  # noqa: F401
+import model.product  # noqa: F401
+import model.rfq  # noqa: F401
+import model.user  # noqa: F401
+import model.warehouse  # noqa: F401
+
+config = context.config
+target_metadata = SQLModel.metadata
+
+# auth.users belongs to Supabase, it is only declared so the foreign keys to it resolve
+if "auth.users" not in target_metadata.tables:
+    sa.Table("users", target_metadata, sa.Column("id", sa.Uuid, primary_key=True), schema="auth")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "table":
+        return obj.schema != "auth"
+    if type_ == "foreign_key_constraint" and not reflected:
+        return obj.referred_table.schema != "auth"
+    if type_ == "index" and not reflected and obj.dialect_options["postgresql"]["using"]:
+        # GIN/GiST indexes only exist on Postgres
+        return context.get_context().dialect.name == "postgresql"
+    return True
+
+
+def database_url():
+    # -x url=... or sqlalchemy.url (set by the tests) win over the application's database
+    url = context.get_x_argument(as_dictionary=True).get("url") or config.get_main_option("sqlalchemy.url")
+    if url:
+        return url
+    from db import ASYNC_POSTGRES
+    return ASYNC_POSTGRES
+
+
+def configure(**kwargs):
+    context.configure(target_metadata=target_metadata, include_object=include_object,
+                      compare_type=True, render_as_batch=True, **kwargs)
+
+
+def run_migrations_offline():
+    configure(url=database_url(), literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_sync_migrations(connection):
+    configure(connection=connection)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(database_url())
+    async with engine.connect() as connection:
+        await connection.run_sync(run_sync_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,81 @@
+"""dashboard kpi
+
+Per-organization dashboard counters, filled from the existing orders, deliveries, transactions,
+selected quotations, products and warehouses. Where ``python -m services.kpi rebuild`` created the
+tables before the migrations existed they are kept as they are.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 16:58:21.402316
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def has_table(name):
+    return not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    if not has_table('organization_kpi'):
+        op.create_table('organization_kpi',
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('total_orders', sa.Integer(), nullable=False),
+        sa.Column('total_shipments', sa.Integer(), nullable=False),
+        sa.Column('total_revenue', sa.Float(), nullable=False),
+        sa.Column('total_expense', sa.Float(), nullable=False),
+        sa.Column('total_products', sa.Integer(), nullable=False),
+        sa.Column('total_warehouse', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ),
+        sa.PrimaryKeyConstraint('organization_id')
+        )
+        op.execute(sa.text(
+            'INSERT INTO organization_kpi (organization_id, total_orders, total_shipments, total_revenue, '
+            'total_expense, total_products, total_warehouse, updated_at) '
+            'SELECT o.id, '
+            '(SELECT count(*) FROM "order" WHERE organization_id = o.id), '
+            '(SELECT count(*) FROM delivery WHERE organization_id = o.id), '
+            '(SELECT coalesce(sum(payment_amount), 0) FROM "transaction" WHERE organization_id = o.id), '
+            '(SELECT coalesce(sum(q.price * q.quantity), 0) FROM quotation q JOIN rfq r ON r.id = q.rfq_id '
+            'WHERE q.selected = TRUE AND r.organization_id = o.id), '
+            '(SELECT count(*) FROM product WHERE organization_id = o.id), '
+            '(SELECT count(*) FROM warehouse WHERE organization_id = o.id), '
+            'CURRENT_TIMESTAMP FROM organization o'))
+    if not has_table('organization_kpi_daily'):
+        op.create_table('organization_kpi_daily',
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('shipments', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('expense', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ),
+        sa.PrimaryKeyConstraint('organization_id', 'day')
+        )
+        op.execute(sa.text(
+            'INSERT INTO organization_kpi_daily (organization_id, day, orders, shipments, revenue, expense) '
+            'SELECT organization_id, day, sum(orders), sum(shipments), sum(revenue), sum(expense) FROM ('
+            'SELECT organization_id, date(order_date) AS day, count(*) AS orders, 0 AS shipments, '
+            '0.0 AS revenue, 0.0 AS expense FROM "order" GROUP BY organization_id, date(order_date) '
+            'UNION ALL SELECT organization_id, date(delivered_at), 0, count(*), 0.0, 0.0 FROM delivery '
+            'WHERE delivered_at IS NOT NULL GROUP BY organization_id, date(delivered_at) '
+            'UNION ALL SELECT organization_id, date("time"), 0, 0, coalesce(sum(payment_amount), 0), 0.0 '
+            'FROM "transaction" GROUP BY organization_id, date("time") '
+            'UNION ALL SELECT r.organization_id, date(q.created_at), 0, 0, 0.0, coalesce(sum(q.price * q.quantity), 0) '
+            'FROM quotation q JOIN rfq r ON r.id = q.rfq_id WHERE q.selected = TRUE '
+            'GROUP BY r.organization_id, date(q.created_at)'
+            ') days WHERE organization_id IS NOT NULL AND day IS NOT NULL GROUP BY organization_id, day'))
+
+
+def downgrade() -> None:
+    op.drop_table('organization_kpi_daily')
+    op.drop_table('organization_kpi')
@@ -0,0 +1,59 @@
+"""delivery current status
+
+Newest status update of every delivery for the driver listings, filled from the existing history.
+Where ``python -m services.delivery_status rebuild`` created the table before the migrations
+existed it is kept as it is.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 16:58:27.815942
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def has_table(name):
+    return not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    if has_table('delivery_current_status'):
+        return
+    op.create_table('delivery_current_status',
+    sa.Column('delivery_id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('driver_id', sa.Integer(), nullable=True),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(length=50), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('status_update_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['delivery_id'], ['delivery.id'], ),
+    sa.ForeignKeyConstraint(['driver_id'], ['driver.id'], ),
+    sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ),
+    sa.ForeignKeyConstraint(['status_update_id'], ['delivery_status_update.id'], ),
+    sa.PrimaryKeyConstraint('delivery_id')
+    )
+    with op.batch_alter_table('delivery_current_status', schema=None) as batch_op:
+        batch_op.create_index('ix_delivery_current_status_organization_id_driver_id_status', ['organization_id', 'driver_id', 'status'], unique=False)
+
+    op.execute(sa.text(
+        'INSERT INTO delivery_current_status (delivery_id, organization_id, driver_id, status, timestamp, status_update_id) '
+        'SELECT d.id, d.organization_id, d.driver_id, latest.delivery_status, latest.timestamp, latest.id FROM ('
+        'SELECT id, delivery_id, delivery_status, timestamp, row_number() OVER '
+        '(PARTITION BY delivery_id ORDER BY timestamp DESC, id DESC) AS rank FROM delivery_status_update'
+        ') latest JOIN delivery d ON d.id = latest.delivery_id WHERE latest.rank = 1 AND d.organization_id IS NOT NULL'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('delivery_current_status', schema=None) as batch_op:
+        batch_op.drop_index('ix_delivery_current_status_organization_id_driver_id_status')
+
+    op.drop_table('delivery_current_status')
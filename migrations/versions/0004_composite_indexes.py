@@ -0,0 +1,52 @@
+"""composite indexes
+
+Indexes for the tenant-scoped access paths: organization_id followed by the status, driver,
+order, delivery or timestamp column the queries filter on. They are built CONCURRENTLY on
+Postgres so the tables stay writable while this runs.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 16:58:34.720268
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_client_organization_id', 'client', ['organization_id']),
+    ('ix_delivery_organization_id_delivered_at', 'delivery', ['organization_id', 'delivered_at']),
+    ('ix_delivery_organization_id_driver_id', 'delivery', ['organization_id', 'driver_id']),
+    ('ix_delivery_status_update_delivery_id_timestamp', 'delivery_status_update', ['delivery_id', 'timestamp']),
+    ('ix_gps_coordinates_delivery_status_id_timestamp', 'gps_coordinates', ['delivery_status_id', 'timestamp']),
+    ('ix_order_organization_id_order_date', 'order', ['organization_id', 'order_date']),
+    ('ix_order_organization_id_status', 'order', ['organization_id', 'status']),
+    ('ix_order_item_order_id', 'order_item', ['order_id']),
+    ('ix_product_organization_id', 'product', ['organization_id']),
+    ('ix_quotation_rfq_id', 'quotation', ['rfq_id']),
+    ('ix_rfq_organization_id_status', 'rfq', ['organization_id', 'status']),
+    ('ix_shipment_delivery_organization_id', 'shipment_delivery', ['organization_id']),
+    ('ix_shipment_tracking_shipment_delivery_id', 'shipment_tracking', ['shipment_delivery_id']),
+    ('ix_transaction_order_id', 'transaction', ['order_id']),
+    ('ix_transaction_organization_id_time', 'transaction', ['organization_id', 'time']),
+    ('ix_user_organization_organization_id', 'user_organization', ['organization_id']),
+    ('ix_warehouse_organization_id', 'warehouse', ['organization_id']),
+]
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS because the dashboard time indexes may have been created by hand already
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,41 @@
+"""trigram search
+
+pg_trgm GIN indexes for the fuzzy product and supplier name search. Postgres only, other
+databases rank the matches in process (services/search.py).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 18:12:05.318409
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_product_name_trgm', 'product', 'name'),
+    ('ix_supplier_company_name_trgm', 'supplier', 'company_name'),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(name, table, [column], if_not_exists=True, postgresql_concurrently=True,
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,58 @@
+"""unique gps fixes
+
+Makes (delivery_status_id, timestamp) unique on gps_coordinates so batched uploads can skip fixes
+that were already stored. Existing duplicates are removed first, keeping the oldest row.
+
+The index is built concurrently, so a duplicate uploaded between the cleanup and the build makes
+the build fail and leaves an INVALID index behind. Running the upgrade again drops that index,
+cleans up again and rebuilds it.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 18:47:21.604113
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ['delivery_status_id', 'timestamp']
+UNIQUE_INDEX = 'ux_gps_coordinates_delivery_status_id_timestamp'
+
+
+def drop_invalid_index(name, table_name):
+    # a failed CREATE INDEX CONCURRENTLY leaves the index behind marked invalid, if_not_exists would keep it
+    bind = op.get_bind()
+    if op.get_context().as_sql or bind.dialect.name != 'postgresql':
+        return
+    invalid = bind.execute(sa.text(
+        'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+        'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'), {'name': name}).first()
+    if invalid:
+        op.drop_index(name, table_name=table_name, postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        drop_invalid_index(UNIQUE_INDEX, 'gps_coordinates')
+        op.execute(sa.text(
+            'DELETE FROM gps_coordinates WHERE id NOT IN '
+            '(SELECT min(id) FROM gps_coordinates GROUP BY delivery_status_id, timestamp)'))
+        op.create_index(UNIQUE_INDEX, 'gps_coordinates', COLUMNS,
+                        unique=True, if_not_exists=True, postgresql_concurrently=True)
+        op.drop_index('ix_gps_coordinates_delivery_status_id_timestamp', table_name='gps_coordinates',
+                      if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_gps_coordinates_delivery_status_id_timestamp', 'gps_coordinates', COLUMNS,
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.drop_index(UNIQUE_INDEX, table_name='gps_coordinates',
+                      if_exists=True, postgresql_concurrently=True)
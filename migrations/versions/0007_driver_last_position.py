@@ -0,0 +1,49 @@
+"""driver last position
+
+Newest GPS fix of every driver for /delivery/fleet, filled from the existing history.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 19:36:52.114027
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('driver_last_position',
+    sa.Column('driver_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('delivery_id', sa.Integer(), nullable=False),
+    sa.Column('delivery_status_id', sa.Integer(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('driver_id')
+    )
+    with op.batch_alter_table('driver_last_position', schema=None) as batch_op:
+        batch_op.create_index('ix_driver_last_position_organization_id', ['organization_id'], unique=False)
+
+    op.execute(sa.text(
+        'INSERT INTO driver_last_position (driver_id, organization_id, delivery_id, delivery_status_id, '
+        'latitude, longitude, timestamp) '
+        'SELECT driver_id, organization_id, delivery_id, delivery_status_id, latitude, longitude, timestamp FROM ('
+        'SELECT d.driver_id, d.organization_id, d.id AS delivery_id, g.delivery_status_id, g.latitude, '
+        'g.longitude, g.timestamp, row_number() OVER (PARTITION BY d.driver_id ORDER BY g.timestamp DESC, g.id DESC) AS rank '
+        'FROM gps_coordinates g JOIN delivery_status_update s ON s.id = g.delivery_status_id '
+        'JOIN delivery d ON d.id = s.delivery_id WHERE d.driver_id IS NOT NULL) latest WHERE rank = 1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('driver_last_position', schema=None) as batch_op:
+        batch_op.drop_index('ix_driver_last_position_organization_id')
+
+    op.drop_table('driver_last_position')
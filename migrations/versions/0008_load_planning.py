@@ -0,0 +1,76 @@
+"""load planning
+
+Parsed product dimensions and vehicle capacities for /delivery/load_plan. The dimensions of the
+existing products are parsed once here with a copy of model.product.parse_dimensions as it was
+when this revision was written, later saves keep them in step. The index is built
+CONCURRENTLY on Postgres so deliveries stay writable while this runs.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 20:41:09.338512
+"""
+import re
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# model.product.parse_dimensions as of this revision
+UNITS = {"mm": 0.1, "cm": 1.0, "m": 100.0, "in": 2.54}
+SEPARATOR = re.compile(r"\s*(?:x|×|\*|by)\s*", re.IGNORECASE)
+MEASURE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(mm|cm|m|in)?", re.IGNORECASE)
+
+
+def parse_dimensions(text):
+    matches = [MEASURE.fullmatch(part) for part in SEPARATOR.split((text or "").strip())]
+    if len(matches) != 3 or not all(matches):
+        return None
+    matches = [match.groups() for match in matches]
+    trailing = matches[-1][1]
+    return tuple(float(number.replace(",", ".")) * UNITS[(unit or trailing or "cm").lower()]
+                 for number, unit in matches)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('width_cm', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('height_cm', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('length_cm', sa.Float(), nullable=True))
+    with op.batch_alter_table('driver', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity_kg', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('capacity_m3', sa.Float(), nullable=True))
+
+    connection = op.get_bind()
+    parsed = []
+    for product_id, dimensions in connection.execute(sa.text(
+            'SELECT id, dimensions FROM product WHERE dimensions IS NOT NULL')):
+        sizes = parse_dimensions(dimensions)
+        if sizes:
+            parsed.append(dict(zip(('id', 'width_cm', 'height_cm', 'length_cm'), (product_id, *sizes))))
+    if parsed:
+        connection.execute(sa.text(
+            'UPDATE product SET width_cm = :width_cm, height_cm = :height_cm, length_cm = :length_cm WHERE id = :id'),
+            parsed)
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_delivery_organization_id_started_at', 'delivery', ['organization_id', 'started_at'],
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_delivery_organization_id_started_at', table_name='delivery',
+                      if_exists=True, postgresql_concurrently=True)
+    with op.batch_alter_table('driver', schema=None) as batch_op:
+        batch_op.drop_column('capacity_m3')
+        batch_op.drop_column('capacity_kg')
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('length_cm')
+        batch_op.drop_column('height_cm')
+        batch_op.drop_column('width_cm')
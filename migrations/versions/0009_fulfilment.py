@@ -0,0 +1,48 @@
+"""fulfilment
+
+Source warehouse of a delivery and the delivery lines written by the fulfilment planner.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 21:17:40.502631
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('delivery', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('warehouse_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_delivery_warehouse_id_warehouse', 'warehouse', ['warehouse_id'], ['id'])
+
+    op.create_table('delivery_line',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('delivery_id', sa.Integer(), nullable=False),
+    sa.Column('order_item_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['delivery_id'], ['delivery.id'], ),
+    sa.ForeignKeyConstraint(['order_item_id'], ['order_item.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('delivery_line', schema=None) as batch_op:
+        batch_op.create_index('ix_delivery_line_delivery_id', ['delivery_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('delivery_line', schema=None) as batch_op:
+        batch_op.drop_index('ix_delivery_line_delivery_id')
+
+    op.drop_table('delivery_line')
+    with op.batch_alter_table('delivery', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_delivery_warehouse_id_warehouse', type_='foreignkey')
+        batch_op.drop_column('warehouse_id')
@@ -0,0 +1,60 @@
+"""inventory ledger
+
+Append-only stock movements and per-product snapshots. Every existing product gets an opening
+movement of its current quantity, so the ledger and Product.quantity agree from the start.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 22:05:13.871460
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('inventory_movement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('reason', sa.String(length=50), nullable=False),
+    sa.Column('reference_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Uuid(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('inventory_movement', schema=None) as batch_op:
+        batch_op.create_index('ix_inventory_movement_organization_id_created_at', ['organization_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_inventory_movement_product_id_id', ['product_id', 'id'], unique=False)
+
+    op.create_table('inventory_snapshot',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('movement_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'movement_id')
+    )
+
+    op.execute(sa.text(
+        "INSERT INTO inventory_movement (organization_id, product_id, quantity, reason, created_at) "
+        "SELECT organization_id, id, quantity, 'opening', CURRENT_TIMESTAMP FROM product WHERE quantity <> 0"))
+
+
+def downgrade() -> None:
+    op.drop_table('inventory_snapshot')
+    with op.batch_alter_table('inventory_movement', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_movement_product_id_id')
+        batch_op.drop_index('ix_inventory_movement_organization_id_created_at')
+
+    op.drop_table('inventory_movement')
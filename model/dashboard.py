@@ -0,0 +1,29 @@
+from datetime import datetime, date
+
+from sqlmodel import SQLModel, Field
+
+# Running dashboard totals, kept up to date by the write endpoints and rebuilt by services.kpi
+
+
+class OrganizationKpi(SQLModel, table=True):
+    __tablename__ = "organization_kpi"
+
+    organization_id: int = Field(foreign_key="organization.id", primary_key=True)
+    total_orders: int = Field(default=0)
+    total_shipments: int = Field(default=0)
+    total_revenue: float = Field(default=0.0)
+    total_expense: float = Field(default=0.0)
+    total_products: int = Field(default=0)
+    total_warehouse: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class OrganizationKpiDaily(SQLModel, table=True):
+    __tablename__ = "organization_kpi_daily"
+
+    organization_id: int = Field(foreign_key="organization.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    orders: int = Field(default=0)  # orders by order_date
+    shipments: int = Field(default=0)  # deliveries by delivered_at
+    revenue: float = Field(default=0.0)  # transactions by time
+    expense: float = Field(default=0.0)  # selected quotations by created_at
@@ -3,11 +3,16 @@ from typing import Optional
 from datetime import datetime
 import uuid
 
+from sqlalchemy import Index
+
 # Delivery Model
 
 
 class Delivery(SQLModel, table=True):
     __tablename__ = "delivery"
+    __table_args__ = (Index("ix_delivery_organization_id_delivered_at", "organization_id", "delivered_at"),
+                      Index("ix_delivery_organization_id_driver_id", "organization_id", "driver_id"),
+                      Index("ix_delivery_organization_id_started_at", "organization_id", "started_at"))
 
     id: Optional[int] = Field(default=None, primary_key=True)
     order_id: Optional[int] = Field(foreign_key="order.id")
@@ -15,6 +20,8 @@ class Delivery(SQLModel, table=True):
     created_by: Optional[uuid.UUID] = Field(
         foreign_key="user_roles.user_id", default=None)  # Foreign key to auth.users
     driver_id: Optional[int] = Field(foreign_key="driver.id", default=None)
+    # warehouse the delivery is loaded at, set by the fulfilment planner
+    warehouse_id: Optional[int] = Field(foreign_key="warehouse.id", default=None)
     destination_longitude: Optional[float] = Field(default=None)
     destination_latitude: Optional[float] = Field(default=None)
     destination_name: Optional[str] = Field(
@@ -29,6 +36,7 @@ class Delivery(SQLModel, table=True):
 
 class DeliveryStatusUpdate(SQLModel, table=True):
     __tablename__ = "delivery_status_update"
+    __table_args__ = (Index("ix_delivery_status_update_delivery_id_timestamp", "delivery_id", "timestamp"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     delivery_id: int = Field(foreign_key="delivery.id", nullable=False)
@@ -38,8 +46,53 @@ class DeliveryStatusUpdate(SQLModel, table=True):
     notes: Optional[str] = Field(default=None)  # Optional notes
 
 
+# What a delivery carries when an order ships from several warehouses, product_id is the stock
+# the quantity is taken from and can differ from the ordered product of order_item_id
+class DeliveryLine(SQLModel, table=True):
+    __tablename__ = "delivery_line"
+    __table_args__ = (Index("ix_delivery_line_delivery_id", "delivery_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    delivery_id: int = Field(foreign_key="delivery.id", nullable=False)
+    order_item_id: int = Field(foreign_key="order_item.id", nullable=False)
+    product_id: int = Field(foreign_key="product.id", nullable=False)
+    quantity: float = Field(nullable=False)
+
+
+# Latest status of each delivery, kept in step with delivery_status_update by services.delivery_status
+class DeliveryCurrentStatus(SQLModel, table=True):
+    __tablename__ = "delivery_current_status"
+    __table_args__ = (Index("ix_delivery_current_status_organization_id_driver_id_status",
+                            "organization_id", "driver_id", "status"),)
+
+    delivery_id: int = Field(foreign_key="delivery.id", primary_key=True)
+    organization_id: int = Field(foreign_key="organization.id", default=None)
+    driver_id: Optional[int] = Field(foreign_key="driver.id", default=None)
+    status: str = Field(max_length=50)
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    status_update_id: int = Field(foreign_key="delivery_status_update.id")
+
+
+# Newest GPS fix of each driver, upserted by services.gps while fixes are ingested. It is only a cache
+# of gps_coordinates, so it has no foreign keys that would stop deliveries or drivers being deleted.
+class DriverLastPosition(SQLModel, table=True):
+    __tablename__ = "driver_last_position"
+    __table_args__ = (Index("ix_driver_last_position_organization_id", "organization_id"),)
+
+    driver_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    organization_id: int
+    delivery_id: int
+    delivery_status_id: int
+    latitude: float
+    longitude: float
+    timestamp: datetime
+
+
 class GPSCoordinates(SQLModel, table=True):
     __tablename__ = "gps_coordinates"
+    # unique so a re-uploaded batch of fixes can be skipped with ON CONFLICT DO NOTHING
+    __table_args__ = (Index("ux_gps_coordinates_delivery_status_id_timestamp", "delivery_status_id", "timestamp",
+                            unique=True),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     delivery_status_id: int = Field(
@@ -51,6 +104,7 @@ class GPSCoordinates(SQLModel, table=True):
 
 class ShipmentDelivery(SQLModel, table=True):
     __tablename__ = "shipment_delivery"
+    __table_args__ = (Index("ix_shipment_delivery_organization_id", "organization_id"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     source: Optional[str] = Field(default=None, max_length=255)
@@ -64,6 +118,7 @@ class ShipmentDelivery(SQLModel, table=True):
 
 class ShipmentTracking(SQLModel, table=True):
     __tablename__ = "shipment_tracking"
+    __table_args__ = (Index("ix_shipment_tracking_shipment_delivery_id", "shipment_delivery_id"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     shipment_delivery_id: Optional[int] = Field(foreign_key="shipment_delivery.id", default=None)
     detail: Optional[str] = Field(default=None, max_length=255)
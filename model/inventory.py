@@ -0,0 +1,34 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field
+
+# Every change of stock, rows are only ever inserted. Product.quantity is a cache of the sum, see services.inventory
+
+
+class InventoryMovement(SQLModel, table=True):
+    __tablename__ = "inventory_movement"
+    __table_args__ = (Index("ix_inventory_movement_product_id_id", "product_id", "id"),
+                      Index("ix_inventory_movement_organization_id_created_at", "organization_id", "created_at"))
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    organization_id: Optional[int] = Field(foreign_key="organization.id", default=None)
+    product_id: int = Field(foreign_key="product.id", nullable=False)
+    quantity: float = Field(nullable=False)  # signed, negative when stock leaves
+    # opening, sale, procurement, count, fulfilment
+    reason: str = Field(max_length=50)
+    reference_id: Optional[int] = Field(default=None)  # order or rfq the movement belongs to
+    user_id: Optional[uuid.UUID] = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# On hand quantity of a product after all its movements up to movement_id, written by services.inventory compact
+class InventorySnapshot(SQLModel, table=True):
+    __tablename__ = "inventory_snapshot"
+
+    product_id: int = Field(foreign_key="product.id", primary_key=True)
+    movement_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    quantity: float
+    taken_at: datetime  # created_at of the movement_id movement
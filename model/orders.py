@@ -4,12 +4,15 @@ from datetime import datetime
 import uuid
 
 from sqlmodel import SQLModel
+from sqlalchemy import Index
 
 from model.user import Client
 
 
 class Order(SQLModel, table=True):
     __tablename__ = "order"
+    __table_args__ = (Index("ix_order_organization_id_order_date", "organization_id", "order_date"),
+                      Index("ix_order_organization_id_status", "organization_id", "status"))
 
     id: Optional[int] = Field(default=None, primary_key=True)
     # User who created the order
@@ -25,6 +28,7 @@ class Order(SQLModel, table=True):
 
 class OrderItem(SQLModel, table=True):
     __tablename__ = "order_item"
+    __table_args__ = (Index("ix_order_item_order_id", "order_id"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     order_id: int = Field(foreign_key="order.id", nullable=False)
@@ -35,6 +39,8 @@ class OrderItem(SQLModel, table=True):
 
 class Transaction(SQLModel, table=True):
     __tablename__ = "transaction"
+    __table_args__ = (Index("ix_transaction_organization_id_time", "organization_id", "time"),
+                      Index("ix_transaction_order_id", "order_id"))
 
     id: Optional[int] = Field(default=None, primary_key=True)
     order_id: int = Field(foreign_key="order.id", nullable=False)
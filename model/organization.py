@@ -2,6 +2,7 @@ from datetime import datetime
 from sqlmodel import Field, SQLModel
 from typing import Optional
 import uuid
+from sqlalchemy import Index
 
 
 class Organization(SQLModel, table=True):
@@ -31,6 +32,7 @@ class UserRoles(SQLModel, table=True):
 
 class UserOrganization (SQLModel, table=True):
     __tablename__ = "user_organization"
+    __table_args__ = (Index("ix_user_organization_organization_id", "organization_id"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: uuid.UUID = Field(
         foreign_key="auth.users.id", nullable=False, unique=True)
@@ -1,18 +1,45 @@
+import re
 import uuid
 from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime
 from model.warehouse import Warehouse
+from sqlalchemy import Index, event
+
+# centimetres per unit, a number without a unit is in centimetres
+UNITS = {"mm": 0.1, "cm": 1.0, "m": 100.0, "in": 2.54}
+SEPARATOR = re.compile(r"\s*(?:x|×|\*|by)\s*", re.IGNORECASE)
+MEASURE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(mm|cm|m|in)?", re.IGNORECASE)
+
+
+def parse_dimensions(text):
+    # "40 x 30 x 20", "40x30x20 cm", "0.4m * 0.3m * 0.2m", "400 × 300 × 200 mm" to (width, height, length) in cm
+    matches = [MEASURE.fullmatch(part) for part in SEPARATOR.split((text or "").strip())]
+    if len(matches) != 3 or not all(matches):
+        return None
+    matches = [match.groups() for match in matches]
+    trailing = matches[-1][1]
+    return tuple(float(number.replace(",", ".")) * UNITS[(unit or trailing or "cm").lower()]
+                 for number, unit in matches)
+
 
 class Product(SQLModel, table=True):
     __tablename__ = "product"
+    __table_args__ = (Index("ix_product_organization_id", "organization_id"),
+                      # trigram index for the fuzzy name search, Postgres only
+                      Index("ix_product_name_trgm", "name", postgresql_using="gin",
+                            postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"))
 
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(max_length=255, nullable=False)
-    quantity: float = Field(default=0.0)
+    quantity: float = Field(default=0.0)  # on hand, a cache of the inventory ledger (services.inventory)
     unit_of_measurement: str = Field(default=None)
     weight: Optional[float] = Field(default=None)  # in kilograms
     dimensions: Optional[str] = Field(default=None)  # Stored as "Width x Height x Length"
+    # parsed from dimensions whenever the product is saved, in centimetres
+    width_cm: Optional[float] = Field(default=None)
+    height_cm: Optional[float] = Field(default=None)
+    length_cm: Optional[float] = Field(default=None)
     location: Optional[str] = Field(default=None)  # Location in warehouse
     batch_number: Optional[str] = Field(default=None)
     origin: Optional[str] = Field(default=None, max_length=255)  # Where the item was purchased
@@ -22,4 +49,10 @@ class Product(SQLModel, table=True):
     cost_price: Optional[float] = Field(default=None)
     sales_price: Optional[float] = Field(default=None)
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+@event.listens_for(Product, "before_insert")
+@event.listens_for(Product, "before_update")
+def parse_product_dimensions(mapper, connection, target):
+    target.width_cm, target.height_cm, target.length_cm = parse_dimensions(target.dimensions) or (None, None, None)
@@ -2,11 +2,13 @@ from typing import Optional
 from sqlmodel import SQLModel, Field
 from datetime import datetime
 import uuid
+from sqlalchemy import Index
 # Request for quotation
 
 
 class RFQ(SQLModel, table=True):
     __tablename__ = "rfq"
+    __table_args__ = (Index("ix_rfq_organization_id_status", "organization_id", "status"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     created_by: Optional[uuid.UUID] = Field(
@@ -22,6 +24,7 @@ class RFQ(SQLModel, table=True):
 
 class Quotation(SQLModel, table=True):
     __tablename__ = "quotation"
+    __table_args__ = (Index("ix_quotation_rfq_id", "rfq_id"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     supplier_id: Optional[int] = Field(
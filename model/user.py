@@ -2,6 +2,7 @@ import uuid
 from typing import Optional
 
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 
 
 class Person:
@@ -12,6 +13,8 @@ class Person:
 
 class Supplier(Person, SQLModel, table=True):
     __tablename__ = "supplier"
+    __table_args__ = (Index("ix_supplier_company_name_trgm", "company_name", postgresql_using="gin",
+                            postgresql_ops={"company_name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),)
 
     user_id: Optional[uuid.UUID] = Field(foreign_key="user_organization.user_id", default=None)  # Foreign key to auth.users
     company_name: str = Field(max_length=255, nullable=False)
@@ -25,10 +28,14 @@ class Driver(Person, SQLModel, table=True):
     driver_id: Optional[uuid.UUID] = Field(foreign_key="user_organization.user_id", default=None)  # Foreign key to auth.users
     car_license_plate: str = Field(max_length=15, nullable=False)
     driver_license_id: str = Field(max_length=20, nullable=False)
+    # load limits of the vehicle, /delivery/load_plan uses its defaults where they are not set
+    capacity_kg: Optional[float] = Field(default=None)
+    capacity_m3: Optional[float] = Field(default=None)
 
 
 class Client(Person, SQLModel, table=True):
     __tablename__ = "client"
+    __table_args__ = (Index("ix_client_organization_id", "organization_id"),)
 
     organization_id: Optional[int] = Field(foreign_key="organization.id", default=None)
     company_name: str = Field(max_length=255, nullable=False)
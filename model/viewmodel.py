@@ -8,21 +8,22 @@ from model.orders import Order, OrderItem
 from model.user import Client
 
 
-class Product_map:
+class InvoiceLine(SQLModel, table=False):
+    order_item_id: int
     product_id: int
     product_name: str
-    warehouse_id: int
-    warehouse_name: str
+    warehouse_id: Optional[int] = Field(default=None)
+    warehouse_name: Optional[str] = Field(default=None)
     quantity: float
     price: float
 
 
-class Invoice:
+class Invoice(SQLModel, table=False):
     order_details: Order
-    order_items: OrderItem
+    order_items: List[OrderItem] = Field(default_factory=list)
     client_details: Client
     total: float = 0
-    product_map: List[Product_map] = []
+    product_map: List[InvoiceLine] = Field(default_factory=list)
 
 
 class ClientOrder(SQLModel, table=False):
@@ -50,3 +51,28 @@ class DeliveryAndStatus(SQLModel, table=False):
     destination_name: Optional[str] = Field(default=None)
     delivery_status: Optional[str] = Field(default=None)
     delivery_instructions: Optional[str] = Field(default=None)
+
+
+class GPSFix(SQLModel, table=False):
+    delivery_status_id: int
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    timestamp: datetime
+
+
+class DriverStatus(SQLModel, table=False):
+    delivery_id: int
+    delivery_status: str = Field(max_length=50)
+    notes: Optional[str] = Field(default=None)
+    timestamp: Optional[datetime] = Field(default=None)
+
+
+class FleetPosition(SQLModel, table=False):
+    driver_id: int
+    driver_name: Optional[str] = Field(default=None)
+    car_license_plate: Optional[str] = Field(default=None)
+    delivery_id: int
+    delivery_status: Optional[str] = Field(default=None)
+    latitude: float
+    longitude: float
+    timestamp: datetime
@@ -3,10 +3,12 @@ from typing import Optional
 
 from sqlmodel import SQLModel, Field
 import uuid
+from sqlalchemy import Index
 
 
 class Warehouse(SQLModel, table=True):
     __tablename__ = "warehouse"
+    __table_args__ = (Index("ix_warehouse_organization_id", "organization_id"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(max_length=255, nullable=False)
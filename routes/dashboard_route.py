@@ -1,123 +1,140 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from fastapi import Depends, HTTPException, Form
-from typing import Annotated
+from typing import Annotated, Optional
 from fastapi.routing import APIRouter
-from sqlmodel import select, Session
+from sqlalchemy import func, and_
+from sqlmodel import select
 
 from auth import get_current_user
-from db import get_session
-from model.delivery import Delivery
-from model.orders import Transaction, Order
-from model.organization import UserOrganization
-from model.product import Product
-from model.user import Driver
-from model.rfq import RFQ, Quotation
-from model.warehouse import Warehouse
-
-SessionDep = Annotated[Session, Depends(get_session)]
+from db import AsyncSessionDep, naive_utc
+from model.dashboard import OrganizationKpi, OrganizationKpiDaily
+from services.analytics import BUCKETS, MAX_BUCKETS, bucket_range, timeseries
+from services.kpi import total_drivers
+
 UserDep = Annotated[dict, Depends(get_current_user)]
 
 dashboard_router = dr = APIRouter()
 
+# KPIs are read from the organization_kpi projection maintained by the write endpoints (see services/kpi.py)
+
+
+async def total(session, column, organization_id):
+    value = (await session.exec(select(column).where(OrganizationKpi.organization_id == organization_id))).first()
+    return value or 0
+
+
+async def today(session, column, organization_id):
+    value = (await session.exec(select(column)
+                                .where(OrganizationKpiDaily.organization_id == organization_id)
+                                .where(OrganizationKpiDaily.day == datetime.now().date()))).first()
+    return value or 0
+
+
+@dr.get("/summary", description="All dashboard KPIs in one query")
+async def get_summary(session: AsyncSessionDep, current_user: UserDep):
+    if current_user.get("user_role") not in ["admin"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    row = (await session.exec(
+        select(
+            func.coalesce(OrganizationKpi.total_revenue, 0.0).label("total_revenue"),
+            func.coalesce(OrganizationKpi.total_expense, 0.0).label("total_expense"),
+            func.coalesce(OrganizationKpi.total_orders, 0).label("total_orders"),
+            func.coalesce(OrganizationKpiDaily.orders, 0).label("total_orders_today"),
+            func.coalesce(OrganizationKpi.total_shipments, 0).label("total_shipments"),
+            func.coalesce(OrganizationKpiDaily.shipments, 0).label("total_shipments_today"),
+            func.coalesce(OrganizationKpi.total_products, 0).label("total_products"),
+            func.coalesce(OrganizationKpi.total_warehouse, 0).label("total_warehouse"),
+            total_drivers(organization_id).label("total_drivers"),
+        )
+        .select_from(OrganizationKpi)
+        .outerjoin(OrganizationKpiDaily, and_(OrganizationKpiDaily.organization_id == OrganizationKpi.organization_id,
+                                              OrganizationKpiDaily.day == datetime.now().date()))
+        .where(OrganizationKpi.organization_id == organization_id)
+    )).first()
+    if row is None:
+        return {"total_revenue": 0.0, "total_expense": 0.0, "total_orders": 0, "total_orders_today": 0,
+                "total_shipments": 0, "total_shipments_today": 0, "total_products": 0, "total_warehouse": 0,
+                "total_drivers": (await session.exec(select(total_drivers(organization_id)))).one()}
+    return row._asdict()
+
+
+@dr.get("/timeseries", description="Revenue, orders, deliveries and procurement spend per hour/day/week/month")
+async def get_timeseries(session: AsyncSessionDep, current_user: UserDep, bucket: str = "day",
+                         start: Optional[datetime] = None, end: Optional[datetime] = None):
+    if current_user.get("user_role") not in ["admin"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
+    if bucket not in BUCKETS:
+        return HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - timedelta(days=30)
+    if start >= end:
+        return HTTPException(status_code=400, detail="start must be before end")
+    if sum(1 for _ in zip(bucket_range(start, end, bucket), range(MAX_BUCKETS + 1))) > MAX_BUCKETS:
+        return HTTPException(status_code=400, detail=f"Range is longer than {MAX_BUCKETS} {bucket} buckets")
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    return await timeseries(session, organization_id, bucket, start, end)
+
 
 @dr.get("/total_revenue")
-async def get_total_revenue(session: SessionDep, current_user: UserDep):
+async def get_total_revenue(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    transactions = session.exec(select(Transaction).where(
-        Transaction.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    total_revenue = 0.0
-    for transaction in transactions:
-        total_revenue += transaction.payment_amount
-    return total_revenue
+    return await total(session, OrganizationKpi.total_revenue, current_user.get("user_metadata").get("organization_id"))
 
 
 @dr.get("/total_drivers")
-async def get_total_drivers(session: SessionDep, current_user: UserDep):
+async def get_total_drivers(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    drivers = session.exec(select(Driver).distinct()
-                           .join(UserOrganization)
-                           .where(Driver.driver_id == UserOrganization.user_id)
-                           .where(
-        UserOrganization.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    return len(drivers)
+    return (await session.exec(select(total_drivers(current_user.get("user_metadata").get("organization_id"))))).one()
 
 
 @dr.get("/total_orders")
-async def get_total_orders(session: SessionDep, current_user: UserDep):
+async def get_total_orders(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    orders = session.exec(select(Order).where(
-        Order.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    return len(orders)
+    return await total(session, OrganizationKpi.total_orders, current_user.get("user_metadata").get("organization_id"))
 
 
 @dr.get("/total_shipments")
-async def get_total_shipments(session: SessionDep, current_user: UserDep):
+async def get_total_shipments(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    shipments = session.exec(select(Delivery).where(
-        Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    return len(shipments)
+    return await total(session, OrganizationKpi.total_shipments, current_user.get("user_metadata").get("organization_id"))
 
 
 @dr.get("/total_shipments_today")
-async def get_total_shipments_that_were_made_today(session: SessionDep, current_user: UserDep):
+async def get_total_shipments_that_were_made_today(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    shipments = session.exec(
-        select(Delivery)
-        .where(Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))
-    ).all()
-    today = datetime.now().date()
-    today_shipments = []
-    for shipment in shipments:
-        if shipment.delivered_at and shipment.delivered_at.date() == today:
-            today_shipments.append(shipment)
-    return len(today_shipments)
+    return await today(session, OrganizationKpiDaily.shipments, current_user.get("user_metadata").get("organization_id"))
 
 
 @dr.get("/total_orders_today")
-async def get_total_orders_that_were_made_today(session: SessionDep, current_user: UserDep):
+async def get_total_orders_that_were_made_today(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    orders = session.exec(select(Order).where(
-        Order.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    today = datetime.now().date()
-    today_orders = []
-    for order in orders:
-        if order.order_date.date() == today:
-            today_orders.append(order)
-    return len(today_orders)
+    return await today(session, OrganizationKpiDaily.orders, current_user.get("user_metadata").get("organization_id"))
 
 
 @dr.get("/total_products")
-async def get_total_products(session: SessionDep, current_user: UserDep):
+async def get_total_products(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    products = session.exec(select(Product).where(
-        Product.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    return len(products)
+    return await total(session, OrganizationKpi.total_products, current_user.get("user_metadata").get("organization_id"))
 
 
 @dr.get("/total_warehouse")
-async def get_total_products(session: SessionDep, current_user: UserDep):
+async def get_total_warehouses(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    products = session.exec(select(Warehouse).where(
-        Warehouse.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    return len(products)
+    return await total(session, OrganizationKpi.total_warehouse, current_user.get("user_metadata").get("organization_id"))
 
 
 @dr.get("/total_expense")
-async def get_total_expense(session: SessionDep, current_user: UserDep):
+async def get_total_expense(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    quotes = session.exec(select(Quotation).where(Quotation.selected == True).join(RFQ).where(
-        RFQ.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
-    total_expense = 0.0
-    for quote in quotes:
-        total_expense += quote.price*quote.quantity
-    return total_expense
+    return await total(session, OrganizationKpi.total_expense, current_user.get("user_metadata").get("organization_id"))
@@ -1,103 +1,246 @@
-from fastapi import Depends, HTTPException, Form
-from typing import Annotated
+import json
+from collections import Counter
+from datetime import date, datetime
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, Form, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Literal, Optional
 from fastapi.routing import APIRouter
-from sqlmodel import select, Session, or_, and_
+import jwt
+from pydantic import TypeAdapter
+from sqlmodel import select
 
-from auth import get_current_user
-from db import get_session
-from model.delivery import Delivery, DeliveryStatusUpdate, GPSCoordinates, ShipmentDelivery, ShipmentTracking
+from auth import decode_token, get_current_user
+from db import AsyncSessionDep, naive_utc
+from model.delivery import Delivery, DeliveryCurrentStatus, DeliveryStatusUpdate, DriverLastPosition, GPSCoordinates, ShipmentDelivery, ShipmentTracking
 from model.orders import Order, OrderItem
 from model.product import Product
-from model.viewmodel import DeliveryAndStatus
+from model.user import Driver
+from model.viewmodel import DeliveryAndStatus, DriverStatus, FleetPosition, GPSFix
 from model.warehouse import Warehouse
+from services import delivery_status, dispatch, fulfilment, geo, kpi, loading, routing, stock
+from services.forms import validated_form
+from services.gps import UnknownStatusUpdate, ingest_fixes, status_updates
+from services.pubsub import event_stream, organization_channel, publish_on_commit
+from services.realtime import DriverHubDep
+from services.pagination import PageDep, paginate
 
-SessionDep = Annotated[Session, Depends(get_session)]
 UserDep = Annotated[dict, Depends(get_current_user)]
 
 delivery_router = dr = APIRouter()
 
 
 @dr.get("/orders_unassigned")
-async def get_orders_confirmed_but_not_assigned_to_drivers(session: SessionDep, current_user: UserDep):
+async def get_orders_confirmed_but_not_assigned_to_drivers(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view deliveries")
     try:
-        return session.exec(select(Order).where(Order.status == "Succeeded").where(
-            Order.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+        return (await session.exec(select(Order).where(Order.status == "Succeeded").where(
+            Order.organization_id == current_user.get("user_metadata").get("organization_id")))).all()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@dr.post("/plan_fulfilment", description="Chooses the warehouses every paid, unplanned order ships from and creates a delivery per warehouse. With dry_run nothing is saved.")
+async def plan_fulfilment_of_unassigned_orders(session: AsyncSessionDep, current_user: UserDep, dry_run: bool = True):
+    if current_user.get("user_role") not in ["admin", "warehouse"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to create a delivery")
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    plans, short = await fulfilment.plan(session, organization_id, lock=not dry_run)
+    deliveries = {}
+    if not dry_run and plans:
+        try:
+            deliveries = await fulfilment.apply(session, organization_id, plans, current_user.get("sub"))
+        except (stock.InsufficientStock, stock.UnknownProduct) as e:
+            await session.rollback()
+            return HTTPException(status_code=400, detail=str(e))
+        await session.commit()
+    return {"dry_run": dry_run,
+            "orders": [{"order_id": order_plan.order_id,
+                        "shipments": [{"delivery_id": deliveries[order_plan.order_id][index] if deliveries else None,
+                                       "warehouse_id": shipment.warehouse_id,
+                                       "distance_km": shipment.distance_km,
+                                       "lines": [line._asdict() for line in shipment.lines]}
+                                      for index, shipment in enumerate(order_plan.shipments)]}
+                       for order_plan in plans],
+            "split_orders": sum(len(order_plan.shipments) > 1 for order_plan in plans),
+            "short": short}
+
+
+@dr.post("/auto_assign", description="Assigns drivers to the open deliveries so the total distance driven is minimal. With dry_run nothing is saved.")
+async def assign_drivers_to_open_deliveries(session: AsyncSessionDep, current_user: UserDep, hub: DriverHubDep,
+                                            dry_run: bool = True, capacity: int = Query(5, ge=1, le=50),
+                                            max_pickup_km: Optional[float] = Query(None, gt=0)):
+    if current_user.get("user_role") not in ["admin", "warehouse"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    deliveries = await dispatch.open_deliveries(session, organization_id, lock=not dry_run)
+    drivers = await dispatch.available_drivers(session, organization_id, capacity)
+    assignments, unassigned = dispatch.assign(deliveries, drivers, max_pickup_km)
+    if not dry_run and assignments:
+        await dispatch.apply(session, organization_id, assignments)
+        await session.commit()
+        for delivery in (await session.exec(select(Delivery).where(
+                Delivery.id.in_([a.delivery_id for a in assignments])))).all():
+            await hub.send(delivery.driver_id, {"type": "assigned", "delivery": delivery})
+    return {"dry_run": dry_run,
+            "assignments": [assignment._asdict() for assignment in assignments],
+            "unassigned": unassigned,
+            "total_distance_km": round(sum(assignment.distance_km for assignment in assignments), 3)}
+
+
 @dr.get("/deliveries")
-async def get_all_deliveries(session: SessionDep, current_user: UserDep):
+async def get_all_deliveries(session: AsyncSessionDep, current_user: UserDep, page: PageDep):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view deliveries")
-    return session.exec(select(Delivery).where(Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+    return await paginate(session, select(Delivery)
+                          .outerjoin(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+                          .where(Delivery.organization_id == current_user.get("user_metadata").get("organization_id")),
+                          page, Delivery.id, sort_keys={"started_at": Delivery.started_at},
+                          status_column=DeliveryCurrentStatus.status, date_column=Delivery.started_at)
+
+
+@dr.get("/events", description="Server-sent events: delivery_status and shipment_tracking updates of the organization as they commit")
+async def get_delivery_events(request: Request, current_user: UserDep):
+    if current_user.get("user_role") not in ["admin", "warehouse", "sales"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view deliveries")
+    channel = organization_channel(current_user.get("user_metadata").get("organization_id"))
+    return StreamingResponse(event_stream(channel, request.is_disconnected), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @dr.get("/deliveries_driver")
-async def get_deliveries_assigned_to_a_specific_driver_used_in_mobile_app(session: SessionDep, current_user: UserDep, driver_id: int):
+async def get_deliveries_assigned_to_a_specific_driver_used_in_mobile_app(session: AsyncSessionDep, current_user: UserDep, driver_id: int):
+    if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view deliveries")
+    rows = (await session.exec(select(Delivery, DeliveryCurrentStatus.status)
+                               .join(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+                               .where(DeliveryCurrentStatus.organization_id == current_user.get("user_metadata").get("organization_id"))
+                               .where(DeliveryCurrentStatus.driver_id == driver_id)
+                               .where(DeliveryCurrentStatus.status.in_(delivery_status.ACTIVE))
+                               .order_by(Delivery.id))).all()
+    return [DeliveryAndStatus(id=d.id,
+                              order_id=d.order_id,
+                              destination_name=d.destination_name,
+                              destination_longitude=d.destination_longitude,
+                              destination_latitude=d.destination_latitude,
+                              delivery_status=status,
+                              delivery_instructions=d.delivery_instructions)
+            for d, status in rows]
+
+
+@dr.get("/route_plan", description="The driver's undelivered deliveries in driving order, from the source warehouse unless a start is given")
+async def get_route_plan_of_a_driver(session: AsyncSessionDep, current_user: UserDep, driver_id: int,
+                                     start_latitude: Optional[float] = Query(None, ge=-90, le=90),
+                                     start_longitude: Optional[float] = Query(None, ge=-180, le=180)):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view deliveries")
-    delivery_model: DeliveryAndStatus
-    ready_deliveries = session.exec(select(Delivery).where(Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))
-                                    .distinct()
-                                    .where(Delivery.driver_id == driver_id)
-                                    .join(DeliveryStatusUpdate)
-                                    .where(or_(DeliveryStatusUpdate.delivery_status == "Packed", DeliveryStatusUpdate.delivery_status == "In Transit", DeliveryStatusUpdate.delivery_status == "Delayed"))
-                                    ).all()
-    delivered = session.exec(select(Delivery.id)
-                             .where(Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))
-                             .where(Delivery.driver_id == driver_id)
-                             .join(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_status == "Delivered")).all()
-    final = []
-    for d in ready_deliveries:
-        if d.id not in delivered:
-            delivery_model = DeliveryAndStatus()
-            delivery_model.id = d.id
-            delivery_model.order_id = d.order_id
-            delivery_model.destination_name = d.destination_name
-            delivery_model.destination_longitude = d.destination_longitude
-            delivery_model.destination_latitude = d.destination_latitude
-            delivery_model.delivery_status = session.exec(select(DeliveryStatusUpdate.delivery_status).where(
-                DeliveryStatusUpdate.delivery_id == d.id).order_by(DeliveryStatusUpdate.timestamp.desc())).first()
-            delivery_model.delivery_instructions = d.delivery_instructions
-            final.append(delivery_model)
-    return final
+    deliveries = (await session.exec(select(Delivery)
+                                     .join(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+                                     .where(DeliveryCurrentStatus.organization_id == current_user.get("user_metadata").get("organization_id"))
+                                     .where(DeliveryCurrentStatus.driver_id == driver_id)
+                                     .where(DeliveryCurrentStatus.status != "Delivered")
+                                     .order_by(Delivery.id))).all()
+    stops = [d for d in deliveries if d.destination_latitude is not None and d.destination_longitude is not None]
+    start = {"latitude": start_latitude, "longitude": start_longitude, "warehouse_id": None}
+    if (start_latitude is None or start_longitude is None) and stops:
+        sources = await dispatch.source_warehouses(session, [d.id for d in stops])
+        position = (await session.exec(select(DriverLastPosition.latitude, DriverLastPosition.longitude)
+                                       .where(DriverLastPosition.driver_id == driver_id))).first()
+        if sources:
+            # the warehouse most of the stops are loaded at
+            warehouse_id, latitude, longitude = Counter(sources.values()).most_common(1)[0][0]
+            start = {"latitude": latitude, "longitude": longitude, "warehouse_id": warehouse_id}
+        elif position:
+            start = {"latitude": position.latitude, "longitude": position.longitude, "warehouse_id": None}
+        else:
+            start = {"latitude": stops[0].destination_latitude, "longitude": stops[0].destination_longitude, "warehouse_id": None}
+    order, legs = routing.plan_route((start["latitude"], start["longitude"]),
+                                     [(d.destination_latitude, d.destination_longitude) for d in stops])
+    planned, travelled = [], 0.0
+    for index, leg in zip(order, legs):
+        travelled += leg
+        planned.append({"delivery_id": stops[index].id,
+                        "destination_name": stops[index].destination_name,
+                        "latitude": stops[index].destination_latitude,
+                        "longitude": stops[index].destination_longitude,
+                        "leg_km": round(leg, 3),
+                        "cumulative_km": round(travelled, 3)})
+    return {"driver_id": driver_id, "start": start, "stops": planned, "total_km": round(travelled, 3),
+            "unrouted": [d.id for d in deliveries if d not in stops]}
+
+
+@dr.get("/load_plan", description="Packs the undelivered deliveries started on day into the drivers' vehicles by weight and volume")
+async def get_load_plan(session: AsyncSessionDep, current_user: UserDep, day: Optional[date] = None,
+                        capacity_kg: float = Query(1000, gt=0), capacity_m3: float = Query(8, gt=0)):
+    if current_user.get("user_role") not in ["admin", "warehouse"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view deliveries")
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    day = day or datetime.utcnow().date()
+    loads = await loading.delivery_loads(session, organization_id, day)
+    vehicles = await loading.organization_vehicles(session, organization_id, capacity_kg, capacity_m3)
+    manifests, unplaced = loading.pack(loads, vehicles)
+    drivers = {driver.id: driver for driver in (await session.exec(
+        select(Driver).where(Driver.id.in_([vehicle.driver_id for vehicle in vehicles])))).all()}
+    plan = []
+    for vehicle in vehicles:
+        carried = manifests[vehicle.driver_id]
+        weight = sum(load.weight_kg for load in carried)
+        volume = sum(load.volume_m3 for load in carried)
+        plan.append({"driver_id": vehicle.driver_id,
+                     "name": drivers[vehicle.driver_id].name,
+                     "car_license_plate": drivers[vehicle.driver_id].car_license_plate,
+                     "capacity_kg": vehicle.capacity_kg,
+                     "capacity_m3": vehicle.capacity_m3,
+                     "weight_kg": round(weight, 3),
+                     "volume_m3": round(volume, 4),
+                     "overloaded": weight > vehicle.capacity_kg or volume > vehicle.capacity_m3,
+                     "deliveries": [{"delivery_id": load.id, "weight_kg": round(load.weight_kg, 3),
+                                     "volume_m3": round(load.volume_m3, 4), "assigned": load.driver_id is not None}
+                                    for load in carried]})
+    return {"day": day, "manifests": plan,
+            "unplaced": [load.id for load in unplaced],
+            "incomplete": [load.id for load in loads if load.incomplete_lines]}
 
 
 @dr.get("/deliveries_driver_history")
-async def get_deliveries_that_a_specific_driver_has_delivered(session: SessionDep, current_user: UserDep, driver_id: int):
+async def get_deliveries_that_a_specific_driver_has_delivered(session: AsyncSessionDep, current_user: UserDep, driver_id: int):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view deliveries")
-    return session.exec(select(Delivery)
-                        .where(Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))
-                        .where(Delivery.driver_id == driver_id)
-                        .join(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_status == "Delivered")).all()
+    return (await session.exec(select(Delivery)
+                        .join(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+                        .where(DeliveryCurrentStatus.organization_id == current_user.get("user_metadata").get("organization_id"))
+                        .where(DeliveryCurrentStatus.driver_id == driver_id)
+                        .where(DeliveryCurrentStatus.status == "Delivered"))).all()
 
 
 @dr.get("/delivery")
-async def get_delivery_by_id(session: SessionDep, current_user: UserDep, delivery_id: int):
+async def get_delivery_by_id(session: AsyncSessionDep, current_user: UserDep, delivery_id: int):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view a delivery")
-    return session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
-        Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    return (await session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
+        Delivery.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
 
 
 @dr.get("/delivery_source")
-async def get_warehouse_of_delivery(session: SessionDep, current_user: UserDep, delivery_id: int):
+async def get_warehouse_of_delivery(session: AsyncSessionDep, current_user: UserDep, delivery_id: int):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view a delivery")
-    return session.exec(select(Warehouse)
+    planned = (await session.exec(select(Warehouse).join(Delivery, Delivery.warehouse_id == Warehouse.id)
+                                  .where(Delivery.id == delivery_id))).all()
+    if planned:
+        return planned
+    return (await session.exec(select(Warehouse)
                         .join(Product)
                         .join(OrderItem)
                         .join(Order)
                         .join(Delivery)
-                        .where(Delivery.id == delivery_id)).all()
+                        .where(Delivery.id == delivery_id))).all()
 
 
 @dr.post("/create_delivery")
-async def create_delivery(session: SessionDep, current_user: UserDep, new_delivery: Delivery = Form(...)):
+async def create_delivery(session: AsyncSessionDep, current_user: UserDep, new_delivery: Delivery = validated_form(Delivery)):
     if current_user.get("user_role") not in ["admin", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a delivery")
     new_delivery.id = None
@@ -105,20 +248,25 @@ async def create_delivery(session: SessionDep, current_user: UserDep, new_delive
     new_delivery.organization_id = current_user.get(
         "user_metadata").get("organization_id")
     session.add(new_delivery)
-    session.commit()
-    session.refresh(new_delivery)
+    await session.flush()
+    await kpi.bump(session, new_delivery.organization_id, total_shipments=1)
+    await kpi.bump_day(session, new_delivery.organization_id, new_delivery.delivered_at, shipments=1)
+    await session.commit()
+    await session.refresh(new_delivery)
     return new_delivery
 
 
 @dr.post("/update_delivery")
-async def update_delivery(session: SessionDep, current_user: UserDep, new_delivery: Delivery = Form(...)):
+async def update_delivery(session: AsyncSessionDep, current_user: UserDep, hub: DriverHubDep, new_delivery: Delivery = validated_form(Delivery)):
     if current_user.get("user_role") not in ["admin", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
-    db_delivery = session.exec(select(Delivery).where(Delivery.id == new_delivery.id).where(
-        Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    db_delivery = (await session.exec(select(Delivery).where(Delivery.id == new_delivery.id).where(
+        Delivery.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not db_delivery:
         return HTTPException(status_code=400, detail="Delivery does not exist.")
     try:
+        old_delivered_at = db_delivery.delivered_at
+        old_driver_id = db_delivery.driver_id
         db_delivery.driver_id = new_delivery.driver_id
         db_delivery.destination_longitude = new_delivery.destination_longitude
         db_delivery.destination_latitude = new_delivery.destination_latitude
@@ -128,92 +276,107 @@ async def update_delivery(session: SessionDep, current_user: UserDep, new_delive
         db_delivery.client_signature = new_delivery.client_signature
 
         session.add(db_delivery)
-        session.commit()
+        await session.flush()
+        await kpi.move_day(session, db_delivery.organization_id, old_delivered_at, db_delivery.delivered_at, "shipments")
+        await delivery_status.set_driver(session, db_delivery.id, db_delivery.driver_id)
+        await session.commit()
 
-        if not session.exec(select(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_id == db_delivery.id)).first():
+        if not (await session.exec(select(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_id == db_delivery.id))).first():
             delivery_status_update: DeliveryStatusUpdate = DeliveryStatusUpdate()
             delivery_status_update.delivery_id = db_delivery.id
             delivery_status_update.delivery_status = "Pending"
             session.add(delivery_status_update)
-            session.commit()
-
-        session.refresh(db_delivery)
+            await delivery_status.record_status(session, delivery_status_update)
+            await session.commit()
+
+        await session.refresh(db_delivery)
+        if old_driver_id is not None and old_driver_id != db_delivery.driver_id:
+            await hub.send(old_driver_id, {"type": "unassigned", "delivery_id": db_delivery.id})
+        if db_delivery.driver_id is not None:
+            await hub.send(db_delivery.driver_id, {
+                "type": "assigned" if old_driver_id != db_delivery.driver_id else "updated", "delivery": db_delivery})
         return db_delivery
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/add_client_signature")
-async def add_the_client_signature(session: SessionDep, current_user: UserDep, delivery_id: int, signature: str):
+async def add_the_client_signature(session: AsyncSessionDep, current_user: UserDep, delivery_id: int, signature: str):
     if current_user.get("user_role") not in ["admin", "warehouse", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
-    db_delivery = session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
-        Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    db_delivery = (await session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
+        Delivery.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not db_delivery:
         return HTTPException(status_code=400, detail="Delivery does not exist.")
     try:
         db_delivery.client_signature = signature
 
         session.add(db_delivery)
-        session.commit()
-        session.refresh(db_delivery)
+        await session.commit()
+        await session.refresh(db_delivery)
         return db_delivery
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.delete("/delete_delivery")
-async def delete_delivery(session: SessionDep, current_user: UserDep, delivery_id: int = Form(...)):
+async def delete_delivery(session: AsyncSessionDep, current_user: UserDep, delivery_id: int = Form(...)):
     if current_user.get("user_role") not in ["admin", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a delivery")
-    db_delivery = session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
-        Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    db_delivery = (await session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
+        Delivery.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not db_delivery:
         return HTTPException(status_code=400, detail="Delivery does not exist.")
     try:
-        session.delete(db_delivery)
-        session.commit()
+        await delivery_status.forget(session, db_delivery.id)
+        await session.delete(db_delivery)
+        await kpi.bump(session, db_delivery.organization_id, total_shipments=-1)
+        await kpi.bump_day(session, db_delivery.organization_id, db_delivery.delivered_at, shipments=-1)
+        await session.commit()
         return {"message": "Delivery deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.get("/get_delivery_status_updates")
-async def get_delivery_status_updates(session: SessionDep, current_user: UserDep, delivery_id: int):
+async def get_delivery_status_updates(session: AsyncSessionDep, current_user: UserDep, delivery_id: int):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view delivery status updates")
-    if not session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
-            Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).first():
+    if not (await session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
+            Delivery.organization_id == current_user.get("user_metadata").get("organization_id")))).first():
         return HTTPException(status_code=400, detail="Delivery does not exist.")
-    return session.exec(select(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_id == delivery_id).order_by(DeliveryStatusUpdate.timestamp.asc())).all()
+    return (await session.exec(select(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_id == delivery_id).order_by(DeliveryStatusUpdate.timestamp.asc()))).all()
 
 
 @dr.get("/get_latest_delivery_status_update")
-async def get_the_latest_delivery_status_update(session: SessionDep, current_user: UserDep, delivery_id: int):
+async def get_the_latest_delivery_status_update(session: AsyncSessionDep, current_user: UserDep, delivery_id: int):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view delivery status updates")
-    if not session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
-            Delivery.organization_id == current_user.get("user_metadata").get("organization_id"))).first():
+    if not (await session.exec(select(Delivery).where(Delivery.id == delivery_id).where(
+            Delivery.organization_id == current_user.get("user_metadata").get("organization_id")))).first():
         return HTTPException(status_code=400, detail="Delivery does not exist.")
-    return session.exec(select(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_id == delivery_id).order_by(DeliveryStatusUpdate.timestamp.desc())).first()
+    return (await session.exec(select(DeliveryStatusUpdate)
+                               .join(DeliveryCurrentStatus, DeliveryCurrentStatus.status_update_id == DeliveryStatusUpdate.id)
+                               .where(DeliveryCurrentStatus.delivery_id == delivery_id))).first()
 
 
 @dr.post("/create_delivery_status")
-async def create_delivery_status_update(session: SessionDep, current_user: UserDep, delivery_status_update: DeliveryStatusUpdate = Form(...)):
+async def create_delivery_status_update(session: AsyncSessionDep, current_user: UserDep, delivery_status_update: DeliveryStatusUpdate = validated_form(DeliveryStatusUpdate)):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
     try:
         delivery_status_update.id = None
         session.add(delivery_status_update)
-        session.commit()
-        session.refresh(delivery_status_update)
+        await delivery_status.record_status(session, delivery_status_update)
+        await session.commit()
+        await session.refresh(delivery_status_update)
         return delivery_status_update
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/delivery_packed")
-async def status_update_order_is_ready_for_delivery(session: SessionDep, current_user: UserDep, delivery_id: int):
+async def status_update_order_is_ready_for_delivery(session: AsyncSessionDep, current_user: UserDep, delivery_id: int):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
     try:
@@ -221,15 +384,16 @@ async def status_update_order_is_ready_for_delivery(session: SessionDep, current
         delivery_status_update.delivery_id = delivery_id
         delivery_status_update.delivery_status = "Packed"
         session.add(delivery_status_update)
-        session.commit()
-        session.refresh(delivery_status_update)
+        await delivery_status.record_status(session, delivery_status_update)
+        await session.commit()
+        await session.refresh(delivery_status_update)
         return delivery_status_update
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/delivery_picked_up")
-async def status_update_delivery_is_picked_up_by_the_driver_and_is_in_transit(session: SessionDep, current_user: UserDep, delivery_id: int):
+async def status_update_delivery_is_picked_up_by_the_driver_and_is_in_transit(session: AsyncSessionDep, current_user: UserDep, delivery_id: int):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
     try:
@@ -237,15 +401,16 @@ async def status_update_delivery_is_picked_up_by_the_driver_and_is_in_transit(se
         delivery_status_update.delivery_id = delivery_id
         delivery_status_update.delivery_status = "In Transit"
         session.add(delivery_status_update)
-        session.commit()
-        session.refresh(delivery_status_update)
+        await delivery_status.record_status(session, delivery_status_update)
+        await session.commit()
+        await session.refresh(delivery_status_update)
         return delivery_status_update
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/delivery_delivered")
-async def status_update_delivery_has_arrived_at_its_destination(session: SessionDep, current_user: UserDep, delivery_id: int):
+async def status_update_delivery_has_arrived_at_its_destination(session: AsyncSessionDep, current_user: UserDep, delivery_id: int):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
     try:
@@ -253,15 +418,16 @@ async def status_update_delivery_has_arrived_at_its_destination(session: Session
         delivery_status_update.delivery_id = delivery_id
         delivery_status_update.delivery_status = "Delivered"
         session.add(delivery_status_update)
-        session.commit()
-        session.refresh(delivery_status_update)
+        await delivery_status.record_status(session, delivery_status_update)
+        await session.commit()
+        await session.refresh(delivery_status_update)
         return delivery_status_update
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/delivery_delay")
-async def status_update_delivery_has_arrived_at_its_destination(session: SessionDep, current_user: UserDep, delivery_id: int, note: str):
+async def status_update_delivery_has_arrived_at_its_destination(session: AsyncSessionDep, current_user: UserDep, delivery_id: int, note: str):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery")
     try:
@@ -270,88 +436,167 @@ async def status_update_delivery_has_arrived_at_its_destination(session: Session
         delivery_status_update.delivery_status = "Delayed"
         delivery_status_update.notes = note
         session.add(delivery_status_update)
-        session.commit()
-        session.refresh(delivery_status_update)
+        await delivery_status.record_status(session, delivery_status_update)
+        await session.commit()
+        await session.refresh(delivery_status_update)
         return delivery_status_update
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/update_delivery_status")
-async def update_delivery_status_update_table_notes(session: SessionDep, current_user: UserDep, delivery_status_update: DeliveryStatusUpdate = Form(...)):
+async def update_delivery_status_update_table_notes(session: AsyncSessionDep, current_user: UserDep, delivery_status_update: DeliveryStatusUpdate = validated_form(DeliveryStatusUpdate)):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a delivery status update")
-    db_delivery_status_update = session.exec(select(DeliveryStatusUpdate).where(
-        DeliveryStatusUpdate.id == delivery_status_update.id)).first()
+    db_delivery_status_update = (await session.exec(select(DeliveryStatusUpdate).where(
+        DeliveryStatusUpdate.id == delivery_status_update.id))).first()
     if not db_delivery_status_update:
         return HTTPException(status_code=400, detail="Delivery status update does not exist.")
     try:
         db_delivery_status_update.notes = delivery_status_update.notes
 
         session.add(db_delivery_status_update)
-        session.commit()
-        session.refresh(db_delivery_status_update)
+        await session.commit()
+        await session.refresh(db_delivery_status_update)
         return db_delivery_status_update
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.delete("/delete_delivery_status")
-async def delete_delivery_status_update(session: SessionDep, current_user: UserDep, delivery_status_update_id: int = Form(...)):
+async def delete_delivery_status_update(session: AsyncSessionDep, current_user: UserDep, delivery_status_update_id: int = Form(...)):
     if current_user.get("user_role") not in ["admin", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a delivery status update")
-    db_delivery_status_update = session.exec(select(DeliveryStatusUpdate).where(
-        DeliveryStatusUpdate.id == delivery_status_update_id)).first()
+    db_delivery_status_update = (await session.exec(select(DeliveryStatusUpdate).where(
+        DeliveryStatusUpdate.id == delivery_status_update_id))).first()
     if not db_delivery_status_update:
         return HTTPException(status_code=400, detail="Delivery status update does not exist.")
     try:
-        session.delete(db_delivery_status_update)
-        session.commit()
+        await session.delete(db_delivery_status_update)
+        await delivery_status.refresh(session, db_delivery_status_update.delivery_id)
+        await session.commit()
         return {"message": "Delivery status update deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.get("/get_delivery_gps")
-async def get_gps_coordinate_of_delivery_that_is_on_route_to_a_client(session: SessionDep, current_user: UserDep, delivery_status_id: int):
+async def get_gps_coordinate_of_delivery_that_is_on_route_to_a_client(session: AsyncSessionDep, current_user: UserDep, delivery_status_id: int):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view GPS coordinates")
-    return session.exec(select(GPSCoordinates).where(GPSCoordinates.delivery_status_id == delivery_status_id)).all()
+    return (await session.exec(select(GPSCoordinates).where(GPSCoordinates.delivery_status_id == delivery_status_id))).all()
 
 
-@dr.post("/add_gps")
-async def create_gps_coordinate_update_this_is_done_by_driver(session: SessionDep, current_user: UserDep, gps: GPSCoordinates = Form(...)):
+@dr.get("/fleet", description="Last known position, delivery and delivery status of every driver of the organization")
+async def get_fleet_positions(session: AsyncSessionDep, current_user: UserDep):
+    if current_user.get("user_role") not in ["admin", "warehouse", "sales"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view GPS coordinates")
+    rows = (await session.exec(select(DriverLastPosition, Driver.name, Driver.car_license_plate, DeliveryCurrentStatus.status)
+                               .join(Driver, Driver.id == DriverLastPosition.driver_id)
+                               .outerjoin(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == DriverLastPosition.delivery_id)
+                               .where(DriverLastPosition.organization_id == current_user.get("user_metadata").get("organization_id"))
+                               .order_by(DriverLastPosition.driver_id))).all()
+    return [FleetPosition(driver_id=position.driver_id,
+                          driver_name=name,
+                          car_license_plate=plate,
+                          delivery_id=position.delivery_id,
+                          delivery_status=status,
+                          latitude=position.latitude,
+                          longitude=position.longitude,
+                          timestamp=position.timestamp)
+            for position, name, plate, status in rows]
+
+
+@dr.get("/track", description="The whole GPS path of a delivery, simplified to `tolerance` metres or to one pixel at map `zoom`")
+async def get_track_of_a_delivery(session: AsyncSessionDep, current_user: UserDep, delivery_id: int,
+                                  tolerance: float = Query(0, ge=0), zoom: Optional[int] = Query(None, ge=0, le=22),
+                                  encoding: Literal["points", "polyline"] = "points"):
+    if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view GPS coordinates")
+    if not (await session.exec(select(Delivery.id).where(Delivery.id == delivery_id).where(
+            Delivery.organization_id == current_user.get("user_metadata").get("organization_id")))).first():
+        return HTTPException(status_code=400, detail="Delivery does not exist.")
+    fixes = (await session.exec(select(GPSCoordinates.latitude, GPSCoordinates.longitude, GPSCoordinates.timestamp)
+                                .join(DeliveryStatusUpdate, DeliveryStatusUpdate.id == GPSCoordinates.delivery_status_id)
+                                .where(DeliveryStatusUpdate.delivery_id == delivery_id)
+                                .order_by(GPSCoordinates.timestamp, GPSCoordinates.id))).all()
+    track = {"delivery_id": delivery_id, "total_points": len(fixes), "returned_points": 0,
+             "started_at": fixes[0].timestamp if fixes else None, "ended_at": fixes[-1].timestamp if fixes else None}
+    if not fixes:
+        return {**track, encoding: "" if encoding == "polyline" else []}
+    coordinates = [(fix.latitude, fix.longitude) for fix in fixes]
+    if zoom is not None:
+        tolerance = geo.metres_per_pixel(zoom, coordinates[0][0])
+    path = [coordinates[i] for i in geo.simplify(geo.project(coordinates), tolerance).tolist()]
+    track["returned_points"] = len(path)
+    return {**track, encoding: geo.encode_polyline(path) if encoding == "polyline" else path}
+
+
+async def current_driver_id(session, current_user):
+    return (await session.exec(select(Driver.id).where(Driver.driver_id == UUID(str(current_user.get("sub")))))).first()
+
+
+@dr.post("/add_gps", description="Stores one GPS fix, a fix that was already uploaded is not stored twice")
+async def create_gps_coordinate_update_this_is_done_by_driver(session: AsyncSessionDep, current_user: UserDep, gps: GPSCoordinates = validated_form(GPSCoordinates)):
     if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create GPS coordinates")
+    # drivers may only report fixes for their own deliveries, the other roles for any in the organization
+    driver_id = None
+    if current_user.get("user_role") == "driver":
+        driver_id = await current_driver_id(session, current_user)
+        if driver_id is None:
+            return HTTPException(status_code=400, detail="Driver does not exist.")
     try:
-        gps.id = None
-        session.add(gps)
-        session.commit()
-        session.refresh(gps)
-        return gps
+        fix = GPSFix.model_validate(gps.model_dump(include={"delivery_status_id", "latitude", "longitude", "timestamp"}))
+        await ingest_fixes(session, current_user.get("user_metadata").get("organization_id"), [fix], driver_id=driver_id)
+        await session.commit()
+    except UnknownStatusUpdate as e:
+        await session.rollback()
+        return HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return (await session.exec(select(GPSCoordinates).where(GPSCoordinates.delivery_status_id == fix.delivery_status_id)
+                               .where(GPSCoordinates.timestamp == naive_utc(fix.timestamp)))).first()
+
+
+@dr.post("/add_gps_batch", description="Stores a batch of buffered GPS fixes, fixes that were already uploaded are skipped")
+async def create_gps_coordinates_in_batch_this_is_done_by_driver(session: AsyncSessionDep, current_user: UserDep, fixes: list[GPSFix]):
+    if current_user.get("user_role") not in ["admin", "driver", "warehouse"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to create GPS coordinates")
+    driver_id = None
+    if current_user.get("user_role") == "driver":
+        driver_id = await current_driver_id(session, current_user)
+        if driver_id is None:
+            return HTTPException(status_code=400, detail="Driver does not exist.")
+    try:
+        accepted = await ingest_fixes(session, current_user.get("user_metadata").get("organization_id"), fixes,
+                                      driver_id=driver_id)
+        await session.commit()
+    except UnknownStatusUpdate as e:
+        await session.rollback()
+        return HTTPException(status_code=400, detail=str(e))
+    return {"received": len(fixes), "accepted": accepted, "duplicates": len(fixes) - accepted}
 
 
 @dr.get("/get_container_shipment")
-async def get_shipment_details(session: SessionDep, current_user: UserDep):
+async def get_shipment_details(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment details")
-    return session.exec(select(ShipmentDelivery).where(ShipmentDelivery.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+    return (await session.exec(select(ShipmentDelivery).where(ShipmentDelivery.organization_id == current_user.get("user_metadata").get("organization_id")))).all()
 
 
 @dr.get("/get_container_shipment_id")
-async def get_shipment_details(session: SessionDep, current_user: UserDep, id: int):
+async def get_shipment_details(session: AsyncSessionDep, current_user: UserDep, id: int):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment details")
     try:
-        return session.exec(select(ShipmentDelivery).where(ShipmentDelivery.id == id)).first()
+        return (await session.exec(select(ShipmentDelivery).where(ShipmentDelivery.id == id))).first()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/create_container_shipment")
-async def create_shipment_details(session: SessionDep, current_user: UserDep, ship: ShipmentDelivery = Form(...)):
+async def create_shipment_details(session: AsyncSessionDep, current_user: UserDep, ship: ShipmentDelivery = validated_form(ShipmentDelivery)):
     if current_user.get("user_role") not in ["admin", "procurement", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment details")
     try:
@@ -361,98 +606,179 @@ async def create_shipment_details(session: SessionDep, current_user: UserDep, sh
         if ship.description == "" or ship.description == "null":
             ship.description = None
         session.add(ship)
-        session.commit()
-        session.refresh(ship)
+        await session.commit()
+        await session.refresh(ship)
         return ship
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/update_container_shipment")
-async def update_shipment_details(session: SessionDep, current_user: UserDep, ship: ShipmentDelivery = Form(...)):
+async def update_shipment_details(session: AsyncSessionDep, current_user: UserDep, ship: ShipmentDelivery = validated_form(ShipmentDelivery)):
     if current_user.get("user_role") not in ["admin", "procurement", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment details")
     try:
-        db_ship: ShipmentDelivery = session.exec(
-            select(ShipmentDelivery).where(ShipmentDelivery.id == ship.id)).first()
+        db_ship: ShipmentDelivery = (await session.exec(
+            select(ShipmentDelivery).where(ShipmentDelivery.id == ship.id))).first()
         db_ship.source = ship.source
         db_ship.warehouse_id = ship.warehouse_id
         db_ship.container_number = ship.container_number
         db_ship.description = ship.description
         db_ship.driver_id = ship.driver_id
         session.add(db_ship)
-        session.commit()
-        session.refresh(db_ship)
+        await session.commit()
+        await session.refresh(db_ship)
         return db_ship
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.delete("/delete_container_shipment")
-async def delete_shipment_details(session: SessionDep, current_user: UserDep, id: int):
+async def delete_shipment_details(session: AsyncSessionDep, current_user: UserDep, id: int):
     if current_user.get("user_role") not in ["admin", "procurement", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment details")
     try:
-        db_ship: ShipmentDelivery = session.exec(
-            select(ShipmentDelivery).where(ShipmentDelivery.id == id)).first()
-        session.delete(db_ship)
-        session.commit()
+        db_ship: ShipmentDelivery = (await session.exec(
+            select(ShipmentDelivery).where(ShipmentDelivery.id == id))).first()
+        await session.delete(db_ship)
+        await session.commit()
         return "Container Shipment Deleted"
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.get("/get_shipment_tracking")
-async def get_shipment_tracking(session: SessionDep, current_user: UserDep):
+async def get_shipment_tracking(session: AsyncSessionDep, current_user: UserDep, page: PageDep):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment tracking details")
-    return session.exec(select(ShipmentTracking)).all()
+    return await paginate(session, select(ShipmentTracking)
+                          .join(ShipmentDelivery, ShipmentDelivery.id == ShipmentTracking.shipment_delivery_id)
+                          .where(ShipmentDelivery.organization_id == current_user.get("user_metadata").get("organization_id")),
+                          page, ShipmentTracking.id)
+
+
+async def publish_shipment_tracking(session, shipment_tracking):
+    await session.flush()
+    organization_id = (await session.exec(select(ShipmentDelivery.organization_id).where(
+        ShipmentDelivery.id == shipment_tracking.shipment_delivery_id))).first()
+    if organization_id is not None:
+        publish_on_commit(session, organization_id, "shipment_tracking", shipment_tracking)
 
 
 @dr.post("/create_shipment_tracking")
-async def create_shipment_tracking(session: SessionDep, current_user: UserDep, shipmentTracking: ShipmentTracking = Form(...)):
+async def create_shipment_tracking(session: AsyncSessionDep, current_user: UserDep, shipmentTracking: ShipmentTracking = validated_form(ShipmentTracking)):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment tracking details")
     try:
         shipmentTracking.id = None
         session.add(shipmentTracking)
-        session.commit()
-        session.refresh(shipmentTracking)
+        await publish_shipment_tracking(session, shipmentTracking)
+        await session.commit()
+        await session.refresh(shipmentTracking)
         return shipmentTracking
     except Exception as e:
         raise HTTPException(status_code=400, detail=srt(e))
 
 
 @dr.post("/update_shipment_tracking")
-async def update_shipment_tracking(session: SessionDep, current_user: UserDep, shipmentTracking: ShipmentTracking = Form(...)):
+async def update_shipment_tracking(session: AsyncSessionDep, current_user: UserDep, shipmentTracking: ShipmentTracking = validated_form(ShipmentTracking)):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment tracking details")
     try:
-        db_st = session.exec(select(ShipmentTracking).where(
-            ShipmentTracking.id == shipmentTracking.id)).first()
+        db_st = (await session.exec(select(ShipmentTracking).where(
+            ShipmentTracking.id == shipmentTracking.id))).first()
         db_st.shipment_delivery_id = shipmentTracking.shipment_delivery_id
         db_st.detail = shipmentTracking.detail
         db_st.latitude = shipmentTracking.latitude
         db_st.longitude = shipmentTracking.longitude
 
         session.add(db_st)
-        session.commit()
-        session.refresh(db_st)
+        await publish_shipment_tracking(session, db_st)
+        await session.commit()
+        await session.refresh(db_st)
         return db_st
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @dr.post("/delete_shipment_tracking")
-async def delete_shipment_tracking(session: SessionDep, current_user: UserDep, id: int):
+async def delete_shipment_tracking(session: AsyncSessionDep, current_user: UserDep, id: int):
     if current_user.get("user_role") not in ["admin", "warehouse", "sales", "driver"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view shipment tracking details")
     try:
-        db_st = session.exec(select(ShipmentTracking).where(
-            ShipmentTracking.id == id)).first()
+        db_st = (await session.exec(select(ShipmentTracking).where(
+            ShipmentTracking.id == id))).first()
 
-        session.delete(db_st)
-        session.commit()
+        await session.delete(db_st)
+        await session.commit()
         return "Shipment Tracking Deleted"
     except Exception as e:
         raise HTTPException(status_code=400, detail=srt(e))
+
+
+fixes_adapter = TypeAdapter(list[GPSFix])
+
+
+@dr.websocket("/ws")
+async def driver_channel_used_in_mobile_app(websocket: WebSocket, hub: DriverHubDep, token: Optional[str] = None):
+    # authenticated once per connection, with ?token= or the Authorization header
+    try:
+        current_user = decode_token(token or websocket.headers.get("authorization") or "")
+    except jwt.PyJWTError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+    if current_user.get("user_role") != "driver":
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Only drivers can connect")
+        return
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    async with hub.session_maker() as session:
+        driver = (await session.exec(select(Driver).where(Driver.driver_id == UUID(current_user.get("sub"))))).first()
+    if not driver:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Driver does not exist")
+        return
+
+    await websocket.accept()
+    hub.connect(driver.id, websocket)
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError("Messages must be JSON objects.")
+                if message.get("type") == "gps":
+                    fixes = fixes_adapter.validate_python(message.get("fixes"))
+                    # like the status below, a driver only reports on the deliveries assigned to them
+                    status_update_ids = {fix.delivery_status_id for fix in fixes}
+                    async with hub.session_maker() as session:
+                        own = await status_updates(session, organization_id, status_update_ids, driver.id)
+                    if own.keys() != status_update_ids:
+                        await websocket.send_json({"type": "error",
+                                                   "detail": str(UnknownStatusUpdate(status_update_ids - own.keys()))})
+                        continue
+                    await hub.add_fixes(organization_id, fixes)
+                elif message.get("type") == "status":
+                    update = DriverStatus.model_validate(message)
+                    async with hub.session_maker() as session:
+                        if not (await session.exec(select(Delivery.id).where(Delivery.id == update.delivery_id)
+                                                   .where(Delivery.organization_id == organization_id)
+                                                   .where(Delivery.driver_id == driver.id))).first():
+                            await websocket.send_json({"type": "error", "detail": "Delivery does not exist."})
+                            continue
+                        delivery_status_update = DeliveryStatusUpdate(delivery_id=update.delivery_id,
+                                                                      delivery_status=update.delivery_status,
+                                                                      notes=update.notes)
+                        if update.timestamp:
+                            delivery_status_update.timestamp = naive_utc(update.timestamp)
+                        session.add(delivery_status_update)
+                        await delivery_status.record_status(session, delivery_status_update)
+                        await session.commit()
+                    await hub.send(driver.id, {"type": "status", "delivery_status_update": delivery_status_update})
+                else:
+                    await websocket.send_json({"type": "error", "detail": "Unknown message type."})
+            except ValueError as e:  # invalid JSON or a ValidationError
+                await websocket.send_json({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(driver.id, websocket)
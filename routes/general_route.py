@@ -1,28 +1,29 @@
-from fastapi import Depends, HTTPException, Form
+from fastapi import Depends, HTTPException, Form, Query
 from typing import Annotated
 from fastapi.routing import APIRouter
-from sqlmodel import select, Session
+from sqlmodel import select
 
 from auth import get_current_user
-from db import get_session
+from db import AsyncSessionDep
 from model.organization import Organization
 from model.product import Product
 from model.user import Driver
 from model.warehouse import Warehouse
+from services.pagination import PageDep, paginate
+from services.search import SEARCH_LIMIT, SEARCH_THRESHOLD, fuzzy_search
 
-SessionDep = Annotated[Session, Depends(get_session)]
 UserDep = Annotated[dict, Depends(get_current_user)]
 
 general_router = gr = APIRouter()
 
 
 @gr.get("/organization")
-async def get_user_organization(session: SessionDep, current_user: UserDep):
+async def get_user_organization(session: AsyncSessionDep, current_user: UserDep):
     try:
         user_organization_id = current_user.get(
             "user_metadata").get("organization_id")
-        organization = session.exec(select(Organization).where(
-            Organization.id == user_organization_id)).all()
+        organization = (await session.exec(select(Organization).where(
+            Organization.id == user_organization_id))).all()
         if not organization:
             return HTTPException(status_code=400, detail="The organization associated with this user does not exist. Please ensure you have a valid organization.")
         return organization
@@ -31,72 +32,67 @@ async def get_user_organization(session: SessionDep, current_user: UserDep):
 
 
 @gr.get("/warehouses")
-async def get_user_warehouse(session: SessionDep, current_user: UserDep):
+async def get_user_warehouse(session: AsyncSessionDep, current_user: UserDep):
     try:
         user_organization_id = current_user.get(
             "user_metadata").get("organization_id")
-        warehouses = session.exec(select(Warehouse).where(
-            Warehouse.organization_id == user_organization_id)).all()
+        warehouses = (await session.exec(select(Warehouse).where(
+            Warehouse.organization_id == user_organization_id))).all()
         return warehouses
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @gr.get("/warehouse_id")
-async def get_warehouse_by_id(session: SessionDep, current_user: UserDep, warehouse_id: int):
+async def get_warehouse_by_id(session: AsyncSessionDep, current_user: UserDep, warehouse_id: int):
     try:
         user_organization_id = current_user.get(
             "user_metadata").get("organization_id")
-        warehouse = session.exec(select(Warehouse).where(
-            Warehouse.organization_id == user_organization_id).where(Warehouse.id == warehouse_id)).first()
+        warehouse = (await session.exec(select(Warehouse).where(
+            Warehouse.organization_id == user_organization_id).where(Warehouse.id == warehouse_id))).first()
         return warehouse
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @gr.get("/products")
-async def get_all_products(session: SessionDep, current_user: UserDep):
-    try:
-        user_organization_id = current_user.get(
-            "user_metadata").get("organization_id")
-        products = session.exec(select(Product).where(
-            Product.organization_id == user_organization_id)).all()
-        return products
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+async def get_all_products(session: AsyncSessionDep, current_user: UserDep, page: PageDep):
+    user_organization_id = current_user.get(
+        "user_metadata").get("organization_id")
+    return await paginate(session, select(Product).where(Product.organization_id == user_organization_id),
+                          page, Product.id, sort_keys={"name": Product.name, "created_at": Product.created_at},
+                          date_column=Product.created_at)
 
 
 @gr.get("/product_id")
-async def get_product_by_id(session: SessionDep, current_user: UserDep, product_id: int):
+async def get_product_by_id(session: AsyncSessionDep, current_user: UserDep, product_id: int):
     try:
         user_organization_id = current_user.get(
             "user_metadata").get("organization_id")
-        products = session.exec(select(Product).where(Product.id == product_id).where(
-            Product.organization_id == user_organization_id)).all()
+        products = (await session.exec(select(Product).where(Product.id == product_id).where(
+            Product.organization_id == user_organization_id))).all()
         return products
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@gr.get("/product_name", description="Checks if the search term is in the product name")
-async def search_product_by_name(session: SessionDep, current_user: UserDep, product_name: str):
+@gr.get("/product_name", description="Products whose name contains or resembles the search term, best match first")
+async def search_product_by_name(session: AsyncSessionDep, current_user: UserDep, product_name: str,
+                                 limit: int = Query(SEARCH_LIMIT, ge=1, le=100),
+                                 threshold: float = Query(SEARCH_THRESHOLD, ge=0, le=1)):
     try:
         user_organization_id = current_user.get(
             "user_metadata").get("organization_id")
-        products = session.exec(
-            select(Product)
-            .where(Product.name.ilike(f"%{product_name}%"))
-            .where(Product.organization_id == user_organization_id)
-        ).all()
-        return products
+        return await fuzzy_search(session, Product, Product.name, product_name,
+                                  Product.organization_id == user_organization_id, threshold=threshold, limit=limit)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @gr.get("/driver_id")
-async def get_driver_id(session: SessionDep, current_user: UserDep):
+async def get_driver_id(session: AsyncSessionDep, current_user: UserDep):
     try:
-        return session.exec(select(Driver).where(
-            Driver.driver_id == current_user.get("sub"))).all()
+        return (await session.exec(select(Driver).where(
+            Driver.driver_id == current_user.get("sub")))).all()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
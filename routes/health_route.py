@@ -0,0 +1,38 @@
+import time
+
+from fastapi import Depends, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRouter
+from typing import Annotated
+from sqlalchemy import text
+
+from auth import get_current_user, token_cache
+from db import AsyncSessionDep, async_engine, engine, pool_status
+
+UserDep = Annotated[dict, Depends(get_current_user)]
+
+health_router = hr = APIRouter()
+
+
+@hr.get("/db", description="Database reachability and connection pool usage of this worker")
+async def get_database_health(session: AsyncSessionDep, current_user: UserDep):
+    if current_user.get("user_role") != "admin":
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view the database health.")
+    pools = {"async": pool_status(async_engine.pool), "sync": pool_status(engine.pool)}
+    try:
+        start = time.perf_counter()
+        await session.exec(text("SELECT 1"))
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        max_connections = None
+        if session.bind.dialect.name == "postgresql":
+            max_connections = int((await session.exec(text("SHOW max_connections"))).scalar())
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e), "pools": pools})
+    return {"status": "ok", "latency_ms": latency_ms, "max_connections": max_connections, "pools": pools}
+
+
+@hr.get("/auth_cache", description="Hit and miss counters of the verified JWT cache of this worker")
+async def get_auth_cache_stats(current_user: UserDep):
+    if current_user.get("user_role") != "admin":
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view the auth cache.")
+    return token_cache.stats()
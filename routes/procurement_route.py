@@ -3,39 +3,43 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from uuid import UUID
 
-from fastapi import Depends, HTTPException, Form
+from fastapi import Depends, HTTPException
 from typing import Annotated
 from fastapi.routing import APIRouter
-from sqlmodel import select, Session
+from sqlmodel import select
 
 from auth import get_current_user
-from db import get_session
+from db import AsyncSessionDep
 from model.product import Product
 from model.user import Supplier
 from model.rfq import RFQ, Quotation
+from services import inventory, kpi
+from services.forms import validated_form
+from services.pagination import PageDep, paginate
 
-SessionDep = Annotated[Session, Depends(get_session)]
 UserDep = Annotated[dict, Depends(get_current_user)]
 
 procurement_router = pr = APIRouter()
 
 
 @pr.get("/rfqs")
-async def get_request_for_rfqs(session: SessionDep, current_user: UserDep):
+async def get_request_for_rfqs(session: AsyncSessionDep, current_user: UserDep, page: PageDep):
     if current_user.get("user_role") not in ["admin", "procurer", "supplier"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view request for quotation")
-    return session.exec(select(RFQ).where(RFQ.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+    return await paginate(session, select(RFQ).where(RFQ.organization_id == current_user.get("user_metadata").get("organization_id")),
+                          page, RFQ.id, sort_keys={"created_at": RFQ.created_at},
+                          status_column=RFQ.status, date_column=RFQ.created_at)
 
 
 @pr.get("/rfq_by_id")
-async def get_request_for_rfqs(session: SessionDep, current_user: UserDep, rfq_id: int):
+async def get_request_for_rfqs(session: AsyncSessionDep, current_user: UserDep, rfq_id: int):
     if current_user.get("user_role") not in ["admin", "procurer", "supplier"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view request for quotation")
-    return session.exec(select(RFQ).where(RFQ.organization_id == current_user.get("user_metadata").get("organization_id")).where(RFQ.id == rfq_id)).all()
+    return (await session.exec(select(RFQ).where(RFQ.organization_id == current_user.get("user_metadata").get("organization_id")).where(RFQ.id == rfq_id))).all()
 
 
 @pr.post("/create_rfq")
-async def create_request_for_rfq(session: SessionDep, current_user: UserDep, new_rfq: RFQ = Form(...)):
+async def create_request_for_rfq(session: AsyncSessionDep, current_user: UserDep, new_rfq: RFQ = validated_form(RFQ)):
     if current_user.get("user_role") not in ["admin", "procurer"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a request for quotation")
     try:
@@ -44,19 +48,19 @@ async def create_request_for_rfq(session: SessionDep, current_user: UserDep, new
         new_rfq.organization_id = current_user.get(
             "user_metadata").get("organization_id")
         session.add(new_rfq)
-        session.commit()
-        session.refresh(new_rfq)
+        await session.commit()
+        await session.refresh(new_rfq)
         return new_rfq
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @pr.post("/update_rfq")
-async def update_request_for_rfq(session: SessionDep, current_user: UserDep, new_rfq: RFQ = Form(...)):
+async def update_request_for_rfq(session: AsyncSessionDep, current_user: UserDep, new_rfq: RFQ = validated_form(RFQ)):
     if current_user.get("user_role") not in ["admin", "procurer"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a request for quotation")
-    db_rfq = session.exec(select(RFQ).where(RFQ.id == new_rfq.id).where(
-        RFQ.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    db_rfq = (await session.exec(select(RFQ).where(RFQ.id == new_rfq.id).where(
+        RFQ.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not db_rfq:
         return HTTPException(status_code=400, detail="Request for quotation does not exist.")
     try:
@@ -67,126 +71,124 @@ async def update_request_for_rfq(session: SessionDep, current_user: UserDep, new
         db_rfq.status = new_rfq.status
 
         session.add(db_rfq)
-        session.commit()
-        session.refresh(db_rfq)
+        await session.commit()
+        await session.refresh(db_rfq)
         return db_rfq
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @pr.delete("/delete_rfq")
-async def delete_request_for_rfq(session: SessionDep, current_user: UserDep, rfq_id: int):
+async def delete_request_for_rfq(session: AsyncSessionDep, current_user: UserDep, rfq_id: int):
     if current_user.get("user_role") not in ["admin", "procurer"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a request for quotation")
-    db_rfq = session.exec(select(RFQ).where(RFQ.id == rfq_id).where(
-        RFQ.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    db_rfq = (await session.exec(select(RFQ).where(RFQ.id == rfq_id).where(
+        RFQ.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not db_rfq:
         return HTTPException(status_code=400, detail="Request for quotation does not exist.")
     try:
-        session.delete(db_rfq)
-        session.commit()
+        await session.delete(db_rfq)
+        await session.commit()
         return {"message": "Request for quotation deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @pr.get("/quotations")
-async def get_quotations(session: SessionDep, current_user: UserDep, rfq_id: int):
+async def get_quotations(session: AsyncSessionDep, current_user: UserDep, rfq_id: int):
     if current_user.get("user_role") not in ["admin", "procurer"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view quotations")
-    rfq = session.exec(select(RFQ).where(RFQ.id == rfq_id).where(
-        RFQ.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    rfq = (await session.exec(select(RFQ).where(RFQ.id == rfq_id).where(
+        RFQ.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not rfq:
         return HTTPException(status_code=400, detail="RFQ does not exist.")
-    return session.exec(select(Quotation).where(Quotation.rfq_id == rfq_id)).all()
+    return (await session.exec(select(Quotation).where(Quotation.rfq_id == rfq_id))).all()
 
 
 @pr.get("/quotations_of_supplier")
-async def get_quotations_made_by_the_supplier(session: SessionDep, current_user: UserDep):
+async def get_quotations_made_by_the_supplier(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin", "procurer", "supplier"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view quotations")
-    return session.exec(select(Quotation).join(Supplier).where(Supplier.user_id == current_user.get("sub")).where(Quotation.supplier_id == Supplier.id)).all()
+    return (await session.exec(select(Quotation).join(Supplier).where(Supplier.user_id == current_user.get("sub")).where(Quotation.supplier_id == Supplier.id))).all()
 
 
 @pr.post("/create_quotation")
-async def create_quotation(session: SessionDep, current_user: UserDep, new_quotation: Quotation = Form(...)):
+async def create_quotation(session: AsyncSessionDep, current_user: UserDep, new_quotation: Quotation = validated_form(Quotation)):
     if current_user.get("user_role") not in ["admin", "procurer", "supplier"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a quotation")
     try:
-        if new_quotation.selected == "true":
-            new_quotation.selected = True
-        else:
-            new_quotation.selected = False
         new_quotation.id = None
         new_quotation.created_by = current_user.get("sub")
-        if new_quotation.supplier_id == "":
-            new_quotation.supplier_id = None
         session.add(new_quotation)
-        session.commit()
-        session.refresh(new_quotation)
+        await session.flush()
+        await kpi.bump_expense(session, new_quotation, kpi.quotation_expense(new_quotation))
+        await session.commit()
+        await session.refresh(new_quotation)
         return new_quotation
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @pr.post("/update_quotation")
-async def update_quotation(session: SessionDep, current_user: UserDep, new_quotation: Quotation = Form(...)):
+async def update_quotation(session: AsyncSessionDep, current_user: UserDep, new_quotation: Quotation = validated_form(Quotation)):
     if current_user.get("user_role") not in ["admin", "procurer", "supplier"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a quotation")
-    db_quotation = session.exec(select(Quotation).where(
-        Quotation.id == new_quotation.id)).first()
+    db_quotation = (await session.exec(select(Quotation).where(
+        Quotation.id == new_quotation.id))).first()
     if not db_quotation:
         return HTTPException(status_code=400, detail="Quotation does not exist.")
     try:
-        if new_quotation.selected == "true":
-            new_quotation.selected = True
-        else:
-            new_quotation.selected = False
+        old_expense = kpi.quotation_expense(db_quotation)
         db_quotation.price = new_quotation.price
         db_quotation.quantity = new_quotation.quantity
         db_quotation.selected = new_quotation.selected
         db_quotation.delivery_date = new_quotation.delivery_date
         session.add(db_quotation)
-        session.commit()
-        session.refresh(db_quotation)
+        await session.flush()
+        await kpi.bump_expense(session, db_quotation, kpi.quotation_expense(db_quotation) - old_expense)
+        await session.commit()
+        await session.refresh(db_quotation)
         return db_quotation
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @pr.delete("/delete_quotation")
-async def delete_quotation(session: SessionDep, current_user: UserDep, quotation_id: int):
+async def delete_quotation(session: AsyncSessionDep, current_user: UserDep, quotation_id: int):
     if current_user.get("user_role") not in ["admin", "procurer"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a quotation")
-    db_quotation = session.exec(select(Quotation).where(
-        Quotation.id == quotation_id)).first()
+    db_quotation = (await session.exec(select(Quotation).where(
+        Quotation.id == quotation_id))).first()
     if not db_quotation:
         return HTTPException(status_code=400, detail="Quotation does not exist.")
-    session.delete(db_quotation)
-    session.commit()
+    await session.delete(db_quotation)
+    await kpi.bump_expense(session, db_quotation, -kpi.quotation_expense(db_quotation))
+    await session.commit()
     return {"message": "Quotation deleted successfully."}
 
 
 @pr.post("/select_quotation")
-async def select_quotation(session: SessionDep, current_user: UserDep, quotation_id: int):
+async def select_quotation(session: AsyncSessionDep, current_user: UserDep, quotation_id: int):
     if current_user.get("user_role") not in ["admin", "procurer"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to select a quotation")
     try:
-        db_quotation = session.exec(select(Quotation).where(
-            Quotation.id == quotation_id)).first()
+        db_quotation = (await session.exec(select(Quotation).where(
+            Quotation.id == quotation_id))).first()
         if not db_quotation:
             return HTTPException(status_code=400, detail="Quotation does not exist.")
+        old_expense = kpi.quotation_expense(db_quotation)
         db_quotation.selected = True
         session.add(db_quotation)
-        session.commit()
-        session.refresh(db_quotation)
+        await kpi.bump_expense(session, db_quotation, kpi.quotation_expense(db_quotation) - old_expense)
+        await session.commit()
+        await session.refresh(db_quotation)
         return db_quotation
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     # Send email to supplier
 """  try:
-        supplier = session.exec(select(Supplier).where(
-            Supplier.id == db_quotation.supplier_id)).first()
+        supplier = (await session.exec(select(Supplier).where(
+            Supplier.id == db_quotation.supplier_id))).first()
         if supplier and supplier.email:
             sender_email = "procurement@supplychain.com"
             receiver_email = supplier.email
@@ -209,15 +211,15 @@ async def select_quotation(session: SessionDep, current_user: UserDep, quotation
 
 
 @pr.post("/product_delivered")
-async def product_that_was_procured_arrives_at_the_warehouse(session: SessionDep, current_user: UserDep, rfq_id: int):
+async def product_that_was_procured_arrives_at_the_warehouse(session: AsyncSessionDep, current_user: UserDep, rfq_id: int):
     if current_user.get("user_role") not in ["admin", "procurer", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a request for quotation")
 
-    db_rfq = session.exec(
+    db_rfq = (await session.exec(
         select(RFQ)
         .where(RFQ.id == rfq_id)
         .where(RFQ.organization_id == current_user.get("user_metadata").get("organization_id"))
-    ).first()
+    )).first()
     if not db_rfq:
         return HTTPException(status_code=400, detail="Request for quotation does not exist.")
 
@@ -225,18 +227,18 @@ async def product_that_was_procured_arrives_at_the_warehouse(session: SessionDep
         db_rfq.status = "Delivered"
         session.add(db_rfq)
 
-        product: Product = session.exec(
+        product: Product = (await session.exec(
             select(Product).where(Product.id == db_rfq.product_id)
-        ).first()
+        )).first()
 
         if not product:
             return HTTPException(status_code=400, detail="Product not found.")
 
-        product.quantity += db_rfq.required_quantity
-        session.add(product)
-        session.commit()
+        await inventory.adjust(session, db_rfq.organization_id, {product.id: db_rfq.required_quantity},
+                               "procurement", db_rfq.id, current_user.get("sub"))
+        await session.commit()
 
-        session.refresh(db_rfq)
+        await session.refresh(db_rfq)
         return db_rfq
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,32 +1,37 @@
 from fastapi import Depends, HTTPException, Form
 from typing import Annotated
 from fastapi.routing import APIRouter
-from sqlmodel import select, Session
+from sqlalchemy import delete, insert, update
+from sqlmodel import select
 
 from auth import get_current_user
-from db import get_session
+from db import AsyncSessionDep
 from model.orders import Order, OrderItem, Transaction
 from model.product import Product
 from model.user import Client, Driver
 from model.delivery import Delivery
-from model.viewmodel import Invoice, ClientOrder, Product_map
+from model.viewmodel import Invoice, InvoiceLine, ClientOrder
 from model.warehouse import Warehouse
+from services import kpi, stock
+from services.forms import validated_form
+from services.pagination import PageDep, paginate
 
-SessionDep = Annotated[Session, Depends(get_session)]
 UserDep = Annotated[dict, Depends(get_current_user)]
 
 sales_router = sr = APIRouter()
 
 
 @sr.get("/orders")
-async def get_orders(session: SessionDep, current_user: UserDep):
+async def get_orders(session: AsyncSessionDep, current_user: UserDep, page: PageDep):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales")
-    return session.exec(select(Order).where(Order.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+    return await paginate(session, select(Order).where(Order.organization_id == current_user.get("user_metadata").get("organization_id")),
+                          page, Order.id, sort_keys={"order_date": Order.order_date, "created_at": Order.created_at},
+                          status_column=Order.status, date_column=Order.order_date)
 
 
 @sr.post("/create_order")
-async def create_order(session: SessionDep, current_user: UserDep, new_order: Order = Form(...)):
+async def create_order(session: AsyncSessionDep, current_user: UserDep, new_order: Order = validated_form(Order)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a sales order")
     try:
@@ -35,128 +40,162 @@ async def create_order(session: SessionDep, current_user: UserDep, new_order: Or
         new_order.organization_id = current_user.get(
             "user_metadata").get("organization_id")
         session.add(new_order)
-        session.commit()
-        session.refresh(new_order)
+        await session.flush()
+        await kpi.bump(session, new_order.organization_id, total_orders=1)
+        await kpi.bump_day(session, new_order.organization_id, new_order.order_date, orders=1)
+        await session.commit()
+        await session.refresh(new_order)
         return new_order
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @sr.post("/update_order")
-async def update_order(session: SessionDep, current_user: UserDep, new_order: Order = Form(...)):
+async def update_order(session: AsyncSessionDep, current_user: UserDep, new_order: Order = validated_form(Order)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a sales order")
-    db_order = session.exec(select(Order).where(Order.id == new_order.id).where(
-        Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    db_order = (await session.exec(select(Order).where(Order.id == new_order.id).where(
+        Order.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not db_order:
         return HTTPException(status_code=400, detail="Order does not exist.")
     try:
+        old_order_date = db_order.order_date
         db_order.client_id = new_order.client_id
         db_order.order_date = new_order.order_date
         db_order.updated_at = new_order.updated_at
         db_order.status = new_order.status
         session.add(db_order)
-        session.commit()
-        session.refresh(db_order)
+        await session.flush()
+        await kpi.move_day(session, db_order.organization_id, old_order_date, db_order.order_date, "orders")
+        await session.commit()
+        await session.refresh(db_order)
         return db_order
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @sr.delete("/delete_order")
-async def delete_order(session: SessionDep, current_user: UserDep, order_id: int = Form(...)):
+async def delete_order(session: AsyncSessionDep, current_user: UserDep, order_id: int = Form(...)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a sales order")
-    db_order = session.exec(select(Order).where(Order.id == order_id).where(
-        Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    db_order = (await session.exec(select(Order).where(Order.id == order_id).where(
+        Order.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not db_order:
         return HTTPException(status_code=400, detail="Order does not exist.")
     try:
-        session.delete(db_order)
-        session.commit()
+        items = (await session.exec(select(OrderItem).where(OrderItem.order_id == db_order.id))).all()
+        await stock.release(session, db_order.organization_id, items, reference_id=db_order.id,
+                            user_id=current_user.get("sub"))
+        await session.exec(delete(OrderItem).where(OrderItem.order_id == db_order.id))
+        await session.delete(db_order)
+        await kpi.bump(session, db_order.organization_id, total_orders=-1)
+        await kpi.bump_day(session, db_order.organization_id, db_order.order_date, orders=-1)
+        await session.commit()
         return {"message": "Order deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @sr.get("/order_id")
-async def get_order_by_id(session: SessionDep, current_user: UserDep, order_id: int):
+async def get_order_by_id(session: AsyncSessionDep, current_user: UserDep, order_id: int):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales order items")
-    return session.exec(select(Order).where(Order.id == order_id).where(Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    return (await session.exec(select(Order).where(Order.id == order_id).where(Order.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
 
 
 @sr.get("/order_items")
-async def get_order_items(session: SessionDep, current_user: UserDep, order_id: int):
+async def get_order_items(session: AsyncSessionDep, current_user: UserDep, order_id: int):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales order items")
-    if not session.exec(select(Order).where(Order.id == order_id).where(Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first():
+    if not (await session.exec(select(Order).where(Order.id == order_id).where(Order.organization_id == current_user.get("user_metadata").get("organization_id")))).first():
         return HTTPException(status_code=400, detail="Order does not exist.")
-    return session.exec(select(OrderItem).where(OrderItem.order_id == order_id)).all()
+    return (await session.exec(select(OrderItem).where(OrderItem.order_id == order_id))).all()
 
 
 @sr.post("/create_order_item")
-async def create_order_item(session: SessionDep, current_user: UserDep, new_order_item: OrderItem = Form(...)):
+async def create_order_item(session: AsyncSessionDep, current_user: UserDep, new_order_item: OrderItem = validated_form(OrderItem)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a sales order item")
-    if not session.exec(select(Order).where(Order.id == new_order_item.order_id).where(Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first():
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    if not (await session.exec(select(Order).where(Order.id == new_order_item.order_id).where(Order.organization_id == organization_id))).first():
         return HTTPException(status_code=400, detail="Order does not exist.")
+    if new_order_item.quantity <= 0:
+        return HTTPException(status_code=400, detail="Quantities must be positive.")
+    try:
+        prices = await stock.reserve(session, organization_id, {new_order_item.product_id: new_order_item.quantity},
+                                     reference_id=new_order_item.order_id, user_id=current_user.get("sub"))
+    except (stock.InsufficientStock, stock.UnknownProduct) as e:
+        await session.rollback()
+        return HTTPException(status_code=400, detail=str(e))
     try:
         new_order_item.id = None
-        new_order_item.price = session.exec(select(Product).where(
-            Product.id == new_order_item.product_id)).first().sales_price
+        new_order_item.price = prices[new_order_item.product_id]
         session.add(new_order_item)
-        session.commit()
-        session.refresh(new_order_item)
+        await session.commit()
+        await session.refresh(new_order_item)
         return new_order_item
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @sr.post("/update_order_item")
-async def update_order_item(session: SessionDep, current_user: UserDep, new_order_item: OrderItem = Form(...)):
+async def update_order_item(session: AsyncSessionDep, current_user: UserDep, new_order_item: OrderItem = validated_form(OrderItem)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a sales order item")
-    if not session.exec(select(Order).where(Order.id == new_order_item.order_id).where(Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first():
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    if not (await session.exec(select(Order).where(Order.id == new_order_item.order_id).where(Order.organization_id == organization_id))).first():
         return HTTPException(status_code=400, detail="Order does not exist.")
-    db_order_item = session.exec(select(OrderItem).where(OrderItem.id == new_order_item.id).where(
-        OrderItem.order_id == new_order_item.order_id)).first()
+    db_order_item = (await session.exec(select(OrderItem).where(OrderItem.id == new_order_item.id).where(
+        OrderItem.order_id == new_order_item.order_id))).first()
     if not db_order_item:
         return HTTPException(status_code=400, detail="Order item does not exist.")
+    if new_order_item.quantity <= 0:
+        return HTTPException(status_code=400, detail="Quantities must be positive.")
+    # stock moves by the difference between the new and the old line
+    changes = stock.quantities([new_order_item])
+    changes[db_order_item.product_id] -= db_order_item.quantity
+    try:
+        prices = await stock.reserve(session, organization_id,
+                                     {product_id: quantity for product_id, quantity in changes.items() if quantity},
+                                     reference_id=db_order_item.order_id, user_id=current_user.get("sub"))
+    except (stock.InsufficientStock, stock.UnknownProduct) as e:
+        await session.rollback()
+        return HTTPException(status_code=400, detail=str(e))
     try:
+        if new_order_item.product_id != db_order_item.product_id:
+            db_order_item.price = prices[new_order_item.product_id]
         db_order_item.product_id = new_order_item.product_id
         db_order_item.quantity = new_order_item.quantity
-        new_order_item.price = session.exec(select(Product).where(
-            Product.id == new_order_item.product_id)).first().sales_price
 
         session.add(db_order_item)
-        session.commit()
-        session.refresh(db_order_item)
+        await session.commit()
+        await session.refresh(db_order_item)
         return db_order_item
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @sr.delete("/delete_order_item")
-async def delete_order_item(session: SessionDep, current_user: UserDep, order_item_id: int = Form(...)):
+async def delete_order_item(session: AsyncSessionDep, current_user: UserDep, order_item_id: int = Form(...)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a sales order item")
-    if not session.exec(select(OrderItem).where(OrderItem.id == order_item_id)).first():
-        return HTTPException(status_code=400, detail="Order item does not exist.")
-    db_order_item = session.exec(select(OrderItem).where(
-        OrderItem.id == order_item_id)).first()
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    db_order_item = (await session.exec(select(OrderItem).join(Order, Order.id == OrderItem.order_id).where(
+        OrderItem.id == order_item_id).where(Order.organization_id == organization_id))).first()
     if not db_order_item:
         return HTTPException(status_code=400, detail="Order item does not exist.")
     try:
-        session.delete(db_order_item)
-        session.commit()
+        await stock.release(session, organization_id, [db_order_item], reference_id=db_order_item.order_id,
+                            user_id=current_user.get("sub"))
+        await session.delete(db_order_item)
+        await session.commit()
         return {"message": "Order item deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @sr.post("/create_client_order")
-async def gets_client_information_and_returns_the_order_id(session: SessionDep, current_user: UserDep, new_clientOrder: ClientOrder = Form(...)):
+async def gets_client_information_and_returns_the_order_id(session: AsyncSessionDep, current_user: UserDep, new_clientOrder: ClientOrder = validated_form(ClientOrder)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a sales order")
     try:
@@ -169,8 +208,8 @@ async def gets_client_information_and_returns_the_order_id(session: SessionDep,
         client.client_type = new_clientOrder.client_type
 
         session.add(client)
-        session.commit()
-        session.refresh(client)
+        await session.commit()
+        await session.refresh(client)
 
         order = Order()
         order.id = None
@@ -181,8 +220,10 @@ async def gets_client_information_and_returns_the_order_id(session: SessionDep,
         order.order_date = new_clientOrder.order_date
 
         session.add(order)
-        session.commit()
-        session.refresh(order)
+        await kpi.bump(session, order.organization_id, total_orders=1)
+        await kpi.bump_day(session, order.organization_id, order.order_date, orders=1)
+        await session.commit()
+        await session.refresh(order)
 
         return order.id
     except Exception as e:
@@ -190,100 +231,143 @@ async def gets_client_information_and_returns_the_order_id(session: SessionDep,
 
 
 @sr.post("/create_multiple_order_items")
-async def add_multiple_order_items_for_an_order(session: SessionDep, current_user: UserDep, order_items: list[OrderItem] = Annotated[list[OrderItem], Form(...)]):
+async def add_multiple_order_items_for_an_order(session: AsyncSessionDep, current_user: UserDep, order_items: list[OrderItem] = Annotated[list[OrderItem], Form(...)]):
     if current_user.get("user_role") not in ["admin", "sales", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales order total")
-    for i in range(len(order_items)):
-        order_items[i].id = None
-        product: Product = session.exec(select(Product).where(
-            Product.id == order_items[i].product_id)).first()
-        order_items[i].price = product.sales_price
-        session.add(order_items[i])
-        session.commit()
-        
-        product.quantity -= order_items[i].quantity
-        session.add(product)
-        session.commit()
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    order_ids = {item.order_id for item in order_items}
+    if len(order_ids) != 1:
+        return HTTPException(status_code=400, detail="All items must belong to one order.")
+    if not (await session.exec(select(Order).where(Order.id == order_ids.pop()).where(Order.organization_id == organization_id))).first():
+        return HTTPException(status_code=400, detail="Order does not exist.")
+    if any(item.quantity <= 0 for item in order_items):
+        return HTTPException(status_code=400, detail="Quantities must be positive.")
+    # all lines and stock changes are one transaction, if any product is short nothing is written
+    try:
+        prices = await stock.reserve(session, organization_id, stock.quantities(order_items),
+                                     reference_id=order_items[0].order_id, user_id=current_user.get("sub"))
+    except (stock.InsufficientStock, stock.UnknownProduct) as e:
+        await session.rollback()
+        return HTTPException(status_code=400, detail=str(e))
+    for item in order_items:
+        item.id = None
+        item.price = prices[item.product_id]
+    session.add_all(order_items)
+    try:
+        await session.commit()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return "Items Added Successfully"
 
 
 @sr.post("/update_multiple_order_items")
-async def add_multiple_order_items_for_an_order(session: SessionDep, current_user: UserDep, order_items: list[OrderItem] = Annotated[list[OrderItem], Form(...)]):
+async def update_multiple_order_items_for_an_order(session: AsyncSessionDep, current_user: UserDep, order_items: list[OrderItem] = Annotated[list[OrderItem], Form(...)]):
     if current_user.get("user_role") not in ["admin", "sales", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view sales order total")
-    old_list: [order_items] = session.exec(select(OrderItem).where(
-        OrderItem.order_id == order_items[0].order_id)).all()
-    # check if item is missing to delete it
-    for item in old_list:
-        if item not in order_items:
-            session.delete(item)
-            session.commit()
-
-    # update item if it exists or add new item
-    for item in order_items:
-        update_item = session.exec(select(OrderItem).where(
-            OrderItem.id == item.id)).first()
-        if update_item:
-            update_item.product_id = item.product_id
-            update_item.quantity = item.quantity
-            update_item.price = session.exec(select(Product).where(
-                Product.id == item.product_id)).first().sales_price
-            session.add(update_item)
-            session.commit()
-        else:
-            item.id = None
-            session.add(item)
-            session.commit()
-
-    return session.exec(select(OrderItem).where(
-        OrderItem.order_id == order_items[0].order_id)).all()
-
-
-@sr.get("/invoice")
-async def get_order_total(session: SessionDep, current_user: UserDep, order_id: int):
-    if current_user.get("user_role") not in ["admin", "sales", "warehouse", "driver"]:
-        return HTTPException(status_code=400, detail="You do not have the required permissions to view sales order total")
-    invoice: Invoice = Invoice()
-    invoice.order_details = session.exec(select(Order).where(Order.id == order_id).where(
-        Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
-    if not invoice.order_details:
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    order_ids = {item.order_id for item in order_items}
+    if len(order_ids) != 1:
+        return HTTPException(status_code=400, detail="All items must belong to one order.")
+    order_id = order_ids.pop()
+    if not (await session.exec(select(Order).where(Order.id == order_id).where(Order.organization_id == organization_id))).first():
         return HTTPException(status_code=400, detail="Order does not exist.")
-    invoice.order_items = session.exec(
-        select(OrderItem).where(OrderItem.order_id == order_id)).all()
-    invoice.total = 0
-    for item in invoice.order_items:
+    if any(item.quantity <= 0 for item in order_items):
+        return HTTPException(status_code=400, detail="Quantities must be positive.")
+
+    # diff the submitted list against the stored one and apply it with one statement per kind of change
+    old_items = {item.id: item for item in (await session.exec(select(OrderItem).where(OrderItem.order_id == order_id))).all()}
+    new_ids = {item.id for item in order_items}
+    deleted = [item_id for item_id in old_items if item_id not in new_ids]
+    updated = [item for item in order_items if item.id in old_items]
+    inserted = [item for item in order_items if item.id not in old_items]
+
+    prices = dict((await session.exec(select(Product.id, Product.sales_price)
+                                       .where(Product.id.in_({item.product_id for item in order_items}))
+                                       .where(Product.organization_id == organization_id))).all())
+    if any(item.product_id not in prices for item in order_items):
+        return HTTPException(status_code=400, detail="Product does not exist.")
+
+    # stock moves by the difference between the new and the old quantities
+    changes = stock.quantities(order_items)
+    for product_id, quantity in stock.quantities(old_items.values()).items():
+        changes[product_id] -= quantity
+    try:
+        await stock.reserve(session, organization_id,
+                            {product_id: quantity for product_id, quantity in changes.items() if quantity},
+                            reference_id=order_id, user_id=current_user.get("sub"))
+    except (stock.InsufficientStock, stock.UnknownProduct) as e:
+        await session.rollback()
+        return HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if deleted:
+            await session.exec(delete(OrderItem).where(OrderItem.id.in_(deleted)))
+        if updated:
+            await session.exec(update(OrderItem), params=[
+                {"id": item.id, "product_id": item.product_id, "quantity": item.quantity, "price": prices[item.product_id]}
+                for item in updated])
+        if inserted:
+            await session.exec(insert(OrderItem), params=[
+                {"order_id": order_id, "product_id": item.product_id, "quantity": item.quantity, "price": prices[item.product_id]}
+                for item in inserted])
+        await session.commit()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return (await session.exec(select(OrderItem).where(OrderItem.order_id == order_id)
+                               .order_by(OrderItem.id).execution_options(populate_existing=True))).all()
+
+
+async def build_invoice(session, order_id, organization_id):
+    # order, client, items, products and warehouses in a single round trip
+    rows = (await session.exec(
+        select(Order, Client, OrderItem, Product, Warehouse)
+        .join(Client, Client.id == Order.client_id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .outerjoin(Warehouse, Warehouse.id == Product.warehouse_id)
+        .where(Order.id == order_id)
+        .where(Order.organization_id == organization_id)
+        .order_by(OrderItem.id))).all()
+    if not rows:
+        return None
+    order, client = rows[0][0], rows[0][1]
+    invoice = Invoice(order_details=order, client_details=client)
+    for _, _, item, product, warehouse in rows:
+        if item is None:
+            continue
+        invoice.order_items.append(item)
         invoice.total += item.price * item.quantity
-    invoice.client_details = session.exec(select(Client).where(
-        Client.id == invoice.order_details.client_id)).first()
-    if invoice.client_details.client_type == "Distributor":
+        invoice.product_map.append(InvoiceLine(
+            order_item_id=item.id,
+            product_id=item.product_id,
+            product_name=product.name,
+            warehouse_id=product.warehouse_id,
+            warehouse_name=warehouse.name if warehouse else None,
+            quantity=item.quantity,
+            price=item.price))
+    if client.client_type == "Distributor":
         invoice.total *= 0.9
         # 10% discount for distributors
-    invoice.product_map = []
-    for item in invoice.order_items:
-        pm: Product_map = Product_map()
-
-        product: Product = session.exec(
-            select(Product).where(Product.id == item.product_id)).first()
-        warehouse: Warehouse = session.exec(
-            select(Warehouse).where(Warehouse.id == product.warehouse_id)).first()
-        pm.product_id = item.id
-        pm.product_name = product.name
-        pm.warehouse_id = product.warehouse_id
-        pm.warehouse_name = warehouse.name
-        pm.quantity = item.quantity
-        pm.price = item.price
-
-        invoice.product_map.append(pm)
+    return invoice
 
+
+@sr.get("/invoice", responses={200: {"model": Invoice}})
+async def get_order_total(session: AsyncSessionDep, current_user: UserDep, order_id: int):
+    if current_user.get("user_role") not in ["admin", "sales", "warehouse", "driver"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view sales order total")
+    invoice = await build_invoice(session, order_id, current_user.get("user_metadata").get("organization_id"))
+    if not invoice:
+        return HTTPException(status_code=400, detail="Order does not exist.")
     return invoice
 
 
 @sr.post("/paid")
-async def order_successfully_paid_and_ready_for_delivery(session: SessionDep, current_user: UserDep, order_id: int):
+async def order_successfully_paid_and_ready_for_delivery(session: AsyncSessionDep, current_user: UserDep, order_id: int):
     if current_user.get("user_role") not in ["admin", "sales", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to mark an order as paid")
-    order = session.exec(select(Order).where(Order.id == order_id).where(
-        Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
+    order = (await session.exec(select(Order).where(Order.id == order_id).where(
+        Order.organization_id == current_user.get("user_metadata").get("organization_id")))).first()
     if not order:
         return HTTPException(status_code=400, detail="Order does not exist.")
     if order.status == "Succeeded":
@@ -291,7 +375,7 @@ async def order_successfully_paid_and_ready_for_delivery(session: SessionDep, cu
 
     order.status = "Succeeded"
     session.add(order)
-    session.commit()
+    await session.commit()
 
     delivery: Delivery = Delivery()
     delivery.order_id = order_id
@@ -300,22 +384,12 @@ async def order_successfully_paid_and_ready_for_delivery(session: SessionDep, cu
     delivery.created_by = current_user.get("sub")
 
     session.add(delivery)
-    session.commit()
+    await kpi.bump(session, delivery.organization_id, total_shipments=1)
+    await session.commit()
 
-    invoice: Invoice = Invoice()
-    invoice.order_details = session.exec(select(Order).where(Order.id == order_id).where(
-        Order.organization_id == current_user.get("user_metadata").get("organization_id"))).first()
-    if not invoice.order_details:
+    invoice = await build_invoice(session, order_id, current_user.get("user_metadata").get("organization_id"))
+    if not invoice:
         return HTTPException(status_code=400, detail="Order does not exist.")
-    invoice.order_items = session.exec(
-        select(OrderItem).where(OrderItem.order_id == order_id)).all()
-    invoice.total = 0
-    for item in invoice.order_items:
-        invoice.total += item.price * item.quantity
-    invoice.client_details = session.exec(select(Client).where(
-        Client.id == invoice.order_details.client_id)).first()
-    if invoice.client_details.client_type == "Distributor":
-        invoice.total *= 0.9
 
     transaction: Transaction = Transaction()
     transaction.order_id = order_id
@@ -325,22 +399,26 @@ async def order_successfully_paid_and_ready_for_delivery(session: SessionDep, cu
     transaction.payment_method = "Cash"
 
     session.add(transaction)
-    session.commit()
+    await kpi.bump(session, transaction.organization_id, total_revenue=transaction.payment_amount)
+    await kpi.bump_day(session, transaction.organization_id, transaction.time, revenue=transaction.payment_amount)
+    await session.commit()
 
-    session.refresh(order)
+    await session.refresh(order)
 
     return order
 
 
 @sr.get("/transactions")
-async def get_transactions(session: SessionDep, current_user: UserDep):
+async def get_transactions(session: AsyncSessionDep, current_user: UserDep, page: PageDep):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view transactions")
-    return session.exec(select(Transaction).where(Transaction.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+    return await paginate(session, select(Transaction).where(Transaction.organization_id == current_user.get("user_metadata").get("organization_id")),
+                          page, Transaction.id, sort_keys={"time": Transaction.time, "payment_amount": Transaction.payment_amount},
+                          date_column=Transaction.time)
 
 
 @sr.post("/create_transaction")
-async def create_transaction(session: SessionDep, current_user: UserDep, new_transaction: Transaction = Form(...)):
+async def create_transaction(session: AsyncSessionDep, current_user: UserDep, new_transaction: Transaction = validated_form(Transaction)):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a transaction")
     try:
@@ -348,34 +426,38 @@ async def create_transaction(session: SessionDep, current_user: UserDep, new_tra
         new_transaction.organization_id = current_user.get(
             "user_metadata").get("organization_id")
         session.add(new_transaction)
-        session.commit()
-        session.refresh(new_transaction)
+        await session.flush()
+        await kpi.bump(session, new_transaction.organization_id, total_revenue=new_transaction.payment_amount)
+        await kpi.bump_day(session, new_transaction.organization_id, new_transaction.time,
+                           revenue=new_transaction.payment_amount)
+        await session.commit()
+        await session.refresh(new_transaction)
         return new_transaction
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @sr.get("/warehouse_orders")
-async def get_orders_of_warehouse(session: SessionDep, current_user: UserDep, warehouse_id: int):
+async def get_orders_of_warehouse(session: AsyncSessionDep, current_user: UserDep, warehouse_id: int):
     if current_user.get("user_role") not in ["admin", "delivery", "sales", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view drivers.")
-    return session.exec(
+    return (await session.exec(
         select(Order).where(
             Order.organization_id == current_user.get("user_metadata").get("organization_id"))
         .distinct()
         .join(OrderItem)
         .join(Product)
         .where(Product.warehouse_id == warehouse_id)
-    ).all()
+    )).all()
 
 
 @sr.get("/driver_order")
-async def get_orders_assigned_driver(session: SessionDep, current_user: UserDep, order_id: int):
+async def get_orders_assigned_driver(session: AsyncSessionDep, current_user: UserDep, order_id: int):
     if current_user.get("user_role") not in ["admin", "delivery", "sales", "warehouse"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view drivers.")
-    return session.exec(
+    return (await session.exec(
         select(Driver)
         .distinct()
         .join(Delivery)
         .where(Delivery.order_id == order_id)
-    ).all()
+    )).all()
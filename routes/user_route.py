@@ -1,23 +1,25 @@
 from uuid import UUID
 
-from fastapi import Depends, HTTPException, Form
+from fastapi import Depends, HTTPException, Query
 from typing import Annotated
 from fastapi.routing import APIRouter
-from sqlmodel import select, Session
+from sqlmodel import select
 
 from auth import get_current_user
-from db import get_session
+from db import AsyncSessionDep
 from model.user import Supplier, Client, Driver
 from model.organization import UserOrganization
+from services.forms import validated_form
+from services.pagination import PageDep, paginate
+from services.search import SEARCH_LIMIT, SEARCH_THRESHOLD, fuzzy_search
 
-SessionDep = Annotated[Session, Depends(get_session)]
 UserDep = Annotated[dict, Depends(get_current_user)]
 
 user_router = ur = APIRouter()
 
 
 @ur.post("/create_supplier")
-async def create_supplier(session: SessionDep, current_user: UserDep, new_supplier: Supplier = Form(...)):
+async def create_supplier(session: AsyncSessionDep, current_user: UserDep, new_supplier: Supplier = validated_form(Supplier)):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a warehouse.")
     try:
@@ -25,11 +27,9 @@ async def create_supplier(session: SessionDep, current_user: UserDep, new_suppli
         if current_user.get("user_metadata").get("organization_id") == "":
             raise HTTPException(
                 status_code=400, detail="User does not have an organization_id")
-        if new_supplier.user_id == "":
-            new_supplier.user_id = None
         session.add(new_supplier)
-        session.commit()
-        session.refresh(new_supplier)
+        await session.commit()
+        await session.refresh(new_supplier)
 
         return new_supplier
 
@@ -38,38 +38,38 @@ async def create_supplier(session: SessionDep, current_user: UserDep, new_suppli
 
 
 @ur.get("/suppliers")
-async def get_suppliers(session: SessionDep, current_user: UserDep):
+async def get_suppliers(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin", "procurement"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view suppliers.")
-    return session.exec(
+    return (await session.exec(
         select(Supplier)
         .distinct()
         .join(UserOrganization)
         .where(Supplier.user_id == UserOrganization.user_id)
         .where(
-            UserOrganization.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+            UserOrganization.organization_id == current_user.get("user_metadata").get("organization_id")))).all()
 
 
 @ur.get("/supplier_by_id")
-async def get_supplier_by_id(session: SessionDep, current_user: UserDep, supplier_id: int):
+async def get_supplier_by_id(session: AsyncSessionDep, current_user: UserDep, supplier_id: int):
     if current_user.get("user_role") not in ["admin", "procurement"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view suppliers.")
-    return session.exec(select(Supplier).where(Supplier.id == supplier_id)).first()
+    return (await session.exec(select(Supplier).where(Supplier.id == supplier_id))).first()
 
 
 @ur.get("/supplier_by_userid")
-async def get_supplier_by_id(session: SessionDep, current_user: UserDep, supplier_id: UUID):
+async def get_supplier_by_id(session: AsyncSessionDep, current_user: UserDep, supplier_id: UUID):
     if current_user.get("user_role") not in ["admin", "procurement"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view suppliers.")
-    return session.exec(select(Supplier).where(Supplier.user_id == supplier_id)).first()
+    return (await session.exec(select(Supplier).where(Supplier.user_id == supplier_id))).first()
 
 
 @ur.post("/update_supplier")
-async def update_supplier(session: SessionDep, current_user: UserDep, new_supplier: Supplier = Form(...)):
+async def update_supplier(session: AsyncSessionDep, current_user: UserDep, new_supplier: Supplier = validated_form(Supplier)):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a supplier.")
-    db_supplier = session.exec(select(Supplier).where(
-        Supplier.id == new_supplier.id)).first()
+    db_supplier = (await session.exec(select(Supplier).where(
+        Supplier.id == new_supplier.id))).first()
     if not db_supplier:
         return HTTPException(status_code=400, detail="Supplier does not exist.")
     try:
@@ -79,19 +79,19 @@ async def update_supplier(session: SessionDep, current_user: UserDep, new_suppli
         db_supplier.phone = new_supplier.phone
 
         session.add(db_supplier)
-        session.commit()
-        session.refresh(db_supplier)
+        await session.commit()
+        await session.refresh(db_supplier)
         return db_supplier
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.post("/update_supplier_userid")
-async def update_supplier_by_userID(session: SessionDep, current_user: UserDep, new_supplier: Supplier = Form(...)):
+async def update_supplier_by_userID(session: AsyncSessionDep, current_user: UserDep, new_supplier: Supplier = validated_form(Supplier)):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a supplier.")
-    db_supplier = session.exec(select(Supplier).where(
-        Supplier.user_id == new_supplier.user_id)).first()
+    db_supplier = (await session.exec(select(Supplier).where(
+        Supplier.user_id == new_supplier.user_id))).first()
     if not db_supplier:
         return HTTPException(status_code=400, detail="Supplier does not exist.")
     try:
@@ -101,54 +101,56 @@ async def update_supplier_by_userID(session: SessionDep, current_user: UserDep,
         db_supplier.phone = new_supplier.phone
 
         session.add(db_supplier)
-        session.commit()
-        session.refresh(db_supplier)
+        await session.commit()
+        await session.refresh(db_supplier)
         return db_supplier
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.delete("/delete_supplier")
-async def delete_supplier(session: SessionDep, current_user: UserDep, supplier_id: int):
+async def delete_supplier(session: AsyncSessionDep, current_user: UserDep, supplier_id: int):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a supplier.")
-    db_supplier = session.exec(select(Supplier).where(
-        Supplier.id == supplier_id)).first()
+    db_supplier = (await session.exec(select(Supplier).where(
+        Supplier.id == supplier_id))).first()
     if not db_supplier:
         return HTTPException(status_code=400, detail="Supplier does not exist.")
     try:
-        session.delete(db_supplier)
-        session.commit()
+        await session.delete(db_supplier)
+        await session.commit()
         return {"message": "Supplier deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.delete("/delete_supplier_userid")
-async def delete_supplier_by_userID(session: SessionDep, current_user: UserDep, user_id: UUID):
+async def delete_supplier_by_userID(session: AsyncSessionDep, current_user: UserDep, user_id: UUID):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a supplier.")
-    db_supplier = session.exec(select(Supplier).where(
-        Supplier.user_id == user_id)).first()
+    db_supplier = (await session.exec(select(Supplier).where(
+        Supplier.user_id == user_id))).first()
     if not db_supplier:
         return HTTPException(status_code=400, detail="Supplier does not exist.")
     try:
-        session.delete(db_supplier)
-        session.commit()
+        await session.delete(db_supplier)
+        await session.commit()
         return {"message": "Supplier deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.get("/supplier_name")
-async def search_supplier_by_name(session: SessionDep, current_user: UserDep, supplier_name: str):
+async def search_supplier_by_name(session: AsyncSessionDep, current_user: UserDep, supplier_name: str,
+                                  limit: int = Query(SEARCH_LIMIT, ge=1, le=100),
+                                  threshold: float = Query(SEARCH_THRESHOLD, ge=0, le=1)):
     if current_user.get("user_role") not in ["admin", "procurement"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view suppliers.")
-    return session.exec(select(Supplier).where(Supplier.company_name.ilike(f"%{supplier_name}%"))).all()
+    return await fuzzy_search(session, Supplier, Supplier.company_name, supplier_name, threshold=threshold, limit=limit)
 
 
 @ur.post("/create_client")
-async def create_client(session: SessionDep, current_user: UserDep, new_client: Client = Form(...)):
+async def create_client(session: AsyncSessionDep, current_user: UserDep, new_client: Client = validated_form(Client)):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a warehouse.")
     try:
@@ -156,8 +158,8 @@ async def create_client(session: SessionDep, current_user: UserDep, new_client:
         new_client.organization_id = current_user.get(
             "user_metadata").get("organization_id")
         session.add(new_client)
-        session.commit()
-        session.refresh(new_client)
+        await session.commit()
+        await session.refresh(new_client)
 
         return new_client
 
@@ -166,26 +168,27 @@ async def create_client(session: SessionDep, current_user: UserDep, new_client:
 
 
 @ur.get("/clients")
-async def get_clients(session: SessionDep, current_user: UserDep):
+async def get_clients(session: AsyncSessionDep, current_user: UserDep, page: PageDep):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view clients.")
-    return session.exec(select(Client).where(
-        Client.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+    return await paginate(session, select(Client).where(
+        Client.organization_id == current_user.get("user_metadata").get("organization_id")),
+        page, Client.id, sort_keys={"company_name": Client.company_name})
 
 
 @ur.get("/client_by_id")
-async def get_client_by_id(session: SessionDep, current_user: UserDep, client_id: int):
+async def get_client_by_id(session: AsyncSessionDep, current_user: UserDep, client_id: int):
     if current_user.get("user_role") not in ["admin", "sales"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view clients.")
-    return session.exec(select(Client).where(Client.id == client_id)).first()
+    return (await session.exec(select(Client).where(Client.id == client_id))).first()
 
 
 @ur.post("/update_client")
-async def update_client(session: SessionDep, current_user: UserDep, new_client: Client = Form(...)):
+async def update_client(session: AsyncSessionDep, current_user: UserDep, new_client: Client = validated_form(Client)):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a client.")
-    db_client = session.exec(select(Client).where(
-        Client.id == new_client.id)).first()
+    db_client = (await session.exec(select(Client).where(
+        Client.id == new_client.id))).first()
     if not db_client:
         return HTTPException(status_code=400, detail="Client does not exist.")
     try:
@@ -195,63 +198,63 @@ async def update_client(session: SessionDep, current_user: UserDep, new_client:
         db_client.phone = new_client.phone
 
         session.add(db_client)
-        session.commit()
-        session.refresh(db_client)
+        await session.commit()
+        await session.refresh(db_client)
         return db_client
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.delete("/delete_client")
-async def delete_client(session: SessionDep, current_user: UserDep, client_id: int):
+async def delete_client(session: AsyncSessionDep, current_user: UserDep, client_id: int):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a client.")
-    db_client = session.exec(select(Client).where(
-        Client.id == client_id)).first()
+    db_client = (await session.exec(select(Client).where(
+        Client.id == client_id))).first()
     if not db_client:
         return HTTPException(status_code=400, detail="Client does not exist.")
     try:
-        session.delete(db_client)
-        session.commit()
+        await session.delete(db_client)
+        await session.commit()
         return {"message": "Client deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.get("/driver")
-async def get_drivers(session: SessionDep, current_user: UserDep):
+async def get_drivers(session: AsyncSessionDep, current_user: UserDep):
     if current_user.get("user_role") not in ["admin", "delivery"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view drivers.")
-    return session.exec(select(Driver).distinct()
+    return (await session.exec(select(Driver).distinct()
                         .join(UserOrganization)
                         .where(Driver.driver_id == UserOrganization.user_id)
                         .where(
-        UserOrganization.organization_id == current_user.get("user_metadata").get("organization_id"))).all()
+        UserOrganization.organization_id == current_user.get("user_metadata").get("organization_id")))).all()
 
 
 @ur.get("/driver_by_id")
-async def get_driver_by_id(session: SessionDep, current_user: UserDep, driver_id: int):
+async def get_driver_by_id(session: AsyncSessionDep, current_user: UserDep, driver_id: int):
     if current_user.get("user_role") not in ["admin", "delivery"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view drivers.")
-    return session.exec(select(Driver).where(Driver.id == driver_id)).first()
+    return (await session.exec(select(Driver).where(Driver.id == driver_id))).first()
 
 
 @ur.get("/driver_by_userid")
-async def get_driver_by_id(session: SessionDep, current_user: UserDep, user_id: UUID):
+async def get_driver_by_id(session: AsyncSessionDep, current_user: UserDep, user_id: UUID):
     if current_user.get("user_role") not in ["admin", "delivery"]:
         return HTTPException(status_code=400, detail="You do not have the required permissions to view drivers.")
-    return session.exec(select(Driver).where(Driver.driver_id == user_id)).first()
+    return (await session.exec(select(Driver).where(Driver.driver_id == user_id))).first()
 
 
 @ur.post("/create_driver")
-async def create_driver(session: SessionDep, current_user: UserDep, new_driver: Driver = Form(...)):
+async def create_driver(session: AsyncSessionDep, current_user: UserDep, new_driver: Driver = validated_form(Driver)):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to create a driver.")
     try:
         new_driver.id = None
         session.add(new_driver)
-        session.commit()
-        session.refresh(new_driver)
+        await session.commit()
+        await session.refresh(new_driver)
         return new_driver
 
     except Exception as e:
@@ -259,11 +262,11 @@ async def create_driver(session: SessionDep, current_user: UserDep, new_driver:
 
 
 @ur.post("/update_driver")
-async def update_driver(session: SessionDep, current_user: UserDep, new_driver: Driver = Form(...)):
+async def update_driver(session: AsyncSessionDep, current_user: UserDep, new_driver: Driver = validated_form(Driver)):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to update a driver.")
-    db_driver = session.exec(select(Driver).where(
-        Driver.driver_id == new_driver.driver_id)).first()
+    db_driver = (await session.exec(select(Driver).where(
+        Driver.driver_id == new_driver.driver_id))).first()
     if not db_driver:
         return HTTPException(status_code=400, detail="Driver does not exist.")
     try:
@@ -272,42 +275,44 @@ async def update_driver(session: SessionDep, current_user: UserDep, new_driver:
         db_driver.driver_license_id = new_driver.driver_license_id
         db_driver.email = new_driver.email
         db_driver.phone = new_driver.phone
+        db_driver.capacity_kg = new_driver.capacity_kg
+        db_driver.capacity_m3 = new_driver.capacity_m3
 
         session.add(db_driver)
-        session.commit()
-        session.refresh(db_driver)
+        await session.commit()
+        await session.refresh(db_driver)
         return db_driver
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.delete("/delete_driver")
-async def delete_driver(session: SessionDep, current_user: UserDep, driver_id: int):
+async def delete_driver(session: AsyncSessionDep, current_user: UserDep, driver_id: int):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a driver.")
-    db_driver = session.exec(select(Driver).where(
-        Driver.id == driver_id)).first()
+    db_driver = (await session.exec(select(Driver).where(
+        Driver.id == driver_id))).first()
     if not db_driver:
         return HTTPException(status_code=400, detail="Driver does not exist.")
     try:
-        session.delete(db_driver)
-        session.commit()
+        await session.delete(db_driver)
+        await session.commit()
         return {"message": "Driver deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @ur.delete("/delete_driver_userid")
-async def delete_driver_by_userID(session: SessionDep, current_user: UserDep, user_id: UUID):
+async def delete_driver_by_userID(session: AsyncSessionDep, current_user: UserDep, user_id: UUID):
     if current_user.get("user_role") != "admin":
         return HTTPException(status_code=400, detail="You do not have the required permissions to delete a driver.")
-    db_driver = session.exec(select(Driver).where(
-        Driver.driver_id == user_id)).first()
+    db_driver = (await session.exec(select(Driver).where(
+        Driver.driver_id == user_id))).first()
     if not db_driver:
         return HTTPException(status_code=400, detail="Driver does not exist.")
     try:
-        session.delete(db_driver)
-        session.commit()
+        await session.delete(db_driver)
+        await session.commit()
         return {"message": "Driver deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
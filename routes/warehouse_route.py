@@ -0,0 +1,53 @@
+from datetime import datetime
+from fastapi import Depends, HTTPException, Query
+from typing import Annotated, Optional
+from fastapi.routing import APIRouter
+from sqlmodel import select
+
+from auth import get_current_user
+from db import AsyncSessionDep, naive_utc
+from model.inventory import InventoryMovement
+from model.product import Product
+from model.warehouse import Warehouse
+from services import inventory, picking
+from services.pagination import PageDep, paginate
+
+UserDep = Annotated[dict, Depends(get_current_user)]
+
+warehouse_router = wr = APIRouter()
+
+
+@wr.get("/pick_waves", description="The open orders of the warehouse batched into waves, each a list of picks in walking order through the bins")
+async def get_pick_waves(session: AsyncSessionDep, current_user: UserDep, warehouse_id: int,
+                         wave_size: int = Query(picking.WAVE_SIZE, ge=1, le=500)):
+    if current_user.get("user_role") not in ["admin", "warehouse"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view warehouse orders")
+    organization_id = current_user.get("user_metadata").get("organization_id")
+    if not (await session.exec(select(Warehouse).where(Warehouse.id == warehouse_id)
+                               .where(Warehouse.organization_id == organization_id))).first():
+        return HTTPException(status_code=400, detail="Warehouse does not exist.")
+    lines, bins = await picking.open_lines(session, organization_id, warehouse_id)
+    waves = picking.build_waves(lines, bins, wave_size)
+    return {"warehouse_id": warehouse_id, "orders": sum(len(wave["order_ids"]) for wave in waves), "waves": waves}
+
+
+@wr.get("/stock", description="On hand quantity of a product now or at the time at, from the inventory ledger")
+async def get_stock_of_a_product(session: AsyncSessionDep, current_user: UserDep, product_id: int,
+                                 at: Optional[datetime] = None):
+    if current_user.get("user_role") not in ["admin", "warehouse", "sales"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view products")
+    if not (await session.exec(select(Product.id).where(Product.id == product_id).where(
+            Product.organization_id == current_user.get("user_metadata").get("organization_id")))).first():
+        return HTTPException(status_code=400, detail="Product does not exist.")
+    at = naive_utc(at)
+    return {"product_id": product_id, "at": at, "quantity": await inventory.on_hand(session, product_id, at)}
+
+
+@wr.get("/stock_movements")
+async def get_stock_movements_of_a_product(session: AsyncSessionDep, current_user: UserDep, page: PageDep, product_id: int):
+    if current_user.get("user_role") not in ["admin", "warehouse", "sales"]:
+        return HTTPException(status_code=400, detail="You do not have the required permissions to view products")
+    return await paginate(session, select(InventoryMovement)
+                          .where(InventoryMovement.organization_id == current_user.get("user_metadata").get("organization_id"))
+                          .where(InventoryMovement.product_id == product_id),
+                          page, InventoryMovement.id, date_column=InventoryMovement.created_at)
@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from sqlalchemy import DateTime, func, literal, union_all
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlmodel import select
+
+from model.delivery import Delivery
+from model.orders import Order, Transaction
+from model.rfq import RFQ, Quotation
+
+BUCKETS = ("hour", "day", "week", "month")
+MAX_BUCKETS = 5000
+
+SQLITE_BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00', {})",
+    "day": "date({})",
+    "week": "date({}, 'weekday 0', '-6 days')",  # Monday, like date_trunc('week')
+    "month": "strftime('%Y-%m-01', {})",
+}
+
+
+class date_bucket(FunctionElement):
+    # date_trunc on Postgres, strftime on SQLite so the same query runs in the tests
+    type = DateTime()
+    inherit_cache = True
+    _traverse_internals = FunctionElement._traverse_internals + [("unit", InternalTraversal.dp_string)]
+
+    def __init__(self, unit, column):
+        self.unit = unit
+        super().__init__(column)
+
+
+@compiles(date_bucket)
+def compile_date_bucket(element, compiler, **kw):
+    return "date_trunc('%s', %s)" % (element.unit, compiler.process(element.clauses, **kw))
+
+
+@compiles(date_bucket, "sqlite")
+def compile_date_bucket_sqlite(element, compiler, **kw):
+    return SQLITE_BUCKETS[element.unit].format(compiler.process(element.clauses, **kw))
+
+
+def truncate(moment, unit):
+    if unit == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "week":
+        return moment - timedelta(days=moment.weekday())
+    if unit == "month":
+        return moment.replace(day=1)
+    return moment
+
+
+def next_bucket(moment, unit):
+    if unit == "hour":
+        return moment + timedelta(hours=1)
+    if unit == "day":
+        return moment + timedelta(days=1)
+    if unit == "week":
+        return moment + timedelta(weeks=1)
+    return (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def bucket_range(start, end, unit):
+    moment = truncate(start, unit)
+    while moment < end:
+        yield moment
+        moment = next_bucket(moment, unit)
+
+
+def timeseries_statement(organization_id, unit, start, end):
+    # one UNION ALL so all four series come back in a single round trip
+    revenue_bucket = date_bucket(unit, Transaction.time)
+    orders_bucket = date_bucket(unit, Order.order_date)
+    delivered_bucket = date_bucket(unit, Delivery.delivered_at)
+    spend_bucket = date_bucket(unit, Quotation.created_at)
+    return union_all(
+        select(literal("revenue").label("metric"), revenue_bucket.label("bucket"),
+               func.sum(Transaction.payment_amount).label("value"))
+        .where(Transaction.organization_id == organization_id)
+        .where(Transaction.time >= start).where(Transaction.time < end)
+        .group_by(revenue_bucket),
+        select(literal("orders"), orders_bucket, func.count(Order.id))
+        .where(Order.organization_id == organization_id)
+        .where(Order.order_date >= start).where(Order.order_date < end)
+        .group_by(orders_bucket),
+        select(literal("delivered"), delivered_bucket, func.count(Delivery.id))
+        .where(Delivery.organization_id == organization_id)
+        .where(Delivery.delivered_at >= start).where(Delivery.delivered_at < end)
+        .group_by(delivered_bucket),
+        select(literal("procurement_spend"), spend_bucket, func.sum(Quotation.price * Quotation.quantity))
+        .join(RFQ, Quotation.rfq_id == RFQ.id)
+        .where(RFQ.organization_id == organization_id).where(Quotation.selected == True)
+        .where(Quotation.created_at >= start).where(Quotation.created_at < end)
+        .group_by(spend_bucket),
+    )
+
+
+async def timeseries(session, organization_id, unit, start, end):
+    series = {moment: {"bucket": moment, "revenue": 0.0, "orders": 0, "delivered": 0, "procurement_spend": 0.0}
+              for moment in bucket_range(start, end, unit)}
+    for metric, bucket, value in (await session.exec(timeseries_statement(organization_id, unit, start, end))).all():
+        if bucket.tzinfo is not None:
+            bucket = bucket.replace(tzinfo=None)
+        if bucket in series:
+            series[bucket][metric] = value or 0
+    return list(series.values())
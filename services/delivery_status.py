@@ -0,0 +1,94 @@
+"""Current status of each delivery.
+
+``delivery_current_status`` holds the newest ``delivery_status_update`` of every delivery, so status
+filtered listings are index lookups instead of scans over the whole history. The status endpoints
+update it in the same transaction as the history row, which also publishes the update to the
+organization's event feed once it commits. The table can be recomputed with:
+
+    python -m services.delivery_status rebuild
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import and_, delete, func, literal, or_, update
+from sqlmodel import select
+
+from db import async_engine, async_session_maker, dialect_insert, require_migrated
+from model.delivery import Delivery, DeliveryCurrentStatus, DeliveryStatusUpdate
+from services.pubsub import publish_on_commit
+
+ACTIVE = ("Packed", "In Transit", "Delayed")
+COLUMNS = ["delivery_id", "organization_id", "driver_id", "status", "timestamp", "status_update_id"]
+
+
+async def record_status(session, status_update):
+    # status_update must be flushed; an older update (e.g. a late offline sync) never replaces a newer one
+    await session.flush()
+    table = DeliveryCurrentStatus.__table__
+    statement = dialect_insert(session, DeliveryCurrentStatus).from_select(COLUMNS, select(
+        Delivery.id, Delivery.organization_id, Delivery.driver_id, literal(status_update.delivery_status),
+        literal(status_update.timestamp), literal(status_update.id)).where(Delivery.id == status_update.delivery_id))
+    excluded = statement.excluded
+    await session.exec(statement.on_conflict_do_update(
+        index_elements=[table.c.delivery_id],
+        set_={"status": excluded.status, "timestamp": excluded.timestamp, "status_update_id": excluded.status_update_id},
+        where=or_(table.c.timestamp < excluded.timestamp,
+                  and_(table.c.timestamp == excluded.timestamp, table.c.status_update_id < excluded.status_update_id))))
+    organization_id = (await session.exec(select(Delivery.organization_id)
+                                          .where(Delivery.id == status_update.delivery_id))).first()
+    if organization_id is not None:
+        publish_on_commit(session, organization_id, "delivery_status", status_update)
+
+
+async def set_driver(session, delivery_id, driver_id):
+    await session.exec(update(DeliveryCurrentStatus).where(DeliveryCurrentStatus.delivery_id == delivery_id)
+                       .values(driver_id=driver_id))
+
+
+async def forget(session, delivery_id):
+    await session.exec(delete(DeliveryCurrentStatus).where(DeliveryCurrentStatus.delivery_id == delivery_id))
+
+
+def latest_statuses():
+    rank = func.row_number().over(partition_by=DeliveryStatusUpdate.delivery_id,
+                                  order_by=(DeliveryStatusUpdate.timestamp.desc(), DeliveryStatusUpdate.id.desc()))
+    return select(DeliveryStatusUpdate.id, DeliveryStatusUpdate.delivery_id, DeliveryStatusUpdate.delivery_status,
+                  DeliveryStatusUpdate.timestamp, rank.label("rank"))
+
+
+def insert_latest(latest):
+    return DeliveryCurrentStatus.__table__.insert().from_select(COLUMNS, select(
+        Delivery.id, Delivery.organization_id, Delivery.driver_id, latest.c.delivery_status, latest.c.timestamp,
+        latest.c.id).join(latest, latest.c.delivery_id == Delivery.id).where(latest.c.rank == 1))
+
+
+async def refresh(session, delivery_id):
+    # recompute from the history, e.g. after a status update was deleted. The current row points at
+    # the status update, so it goes before a pending delete of that update is flushed.
+    with session.no_autoflush:
+        await forget(session, delivery_id)
+    await session.flush()
+    latest = latest_statuses().where(DeliveryStatusUpdate.delivery_id == delivery_id).subquery()
+    await session.exec(insert_latest(latest))
+
+
+async def rebuild(session):
+    await session.exec(delete(DeliveryCurrentStatus))
+    await session.exec(insert_latest(latest_statuses().subquery()))
+    await session.commit()
+    return (await session.exec(select(func.count()).select_from(DeliveryCurrentStatus))).one()
+
+
+async def main():
+    await require_migrated()
+    async with async_session_maker() as session:
+        count = await rebuild(session)
+    await async_engine.dispose()
+    print(f"Rebuilt the current status of {count} deliveries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Current delivery status projection")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""Automatic driver assignment.
+
+Open deliveries (no driver yet, destination known) are matched to the organization's drivers so
+the total distance driven is minimal. A driver's cost for a delivery is the distance from their
+last known position to the source warehouse plus the warehouse to destination leg; drivers
+without a position start at the warehouse. Every driver offers ``capacity`` slots minus the
+deliveries they already have that are not delivered yet, and the slots are matched with the Hungarian algorithm
+(``scipy.optimize.linear_sum_assignment``) over a haversine cost matrix.
+"""
+from collections import namedtuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sqlalchemy import func, or_, update
+from sqlmodel import select
+
+from model.delivery import Delivery, DeliveryCurrentStatus, DeliveryStatusUpdate, DriverLastPosition
+from model.orders import OrderItem
+from model.organization import UserOrganization
+from model.product import Product
+from model.user import Driver
+from model.warehouse import Warehouse
+from services import delivery_status
+from services.pubsub import publish_on_commit
+
+EARTH_RADIUS_KM = 6371.0088
+# cost of a pair that must not be matched, e.g. a pickup beyond max_pickup_km
+FORBIDDEN = 1e9
+
+OpenDelivery = namedtuple("OpenDelivery", "id latitude longitude source_latitude source_longitude")
+AvailableDriver = namedtuple("AvailableDriver", "id latitude longitude slots")
+Assignment = namedtuple("Assignment", "delivery_id driver_id pickup_km distance_km")
+
+
+def haversine(a, b):
+    # great circle km between (latitude, longitude) degree pairs in the last axis, broadcasting like numpy
+    a, b = np.radians(a), np.radians(b)
+    dlat, dlon = b[..., 0] - a[..., 0], b[..., 1] - a[..., 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[..., 0]) * np.cos(b[..., 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def assign(deliveries, drivers, max_pickup_km=None):
+    # returns the assignments and the ids of the deliveries that got no driver
+    drivers = [driver for driver in drivers if driver.slots > 0]
+    if not deliveries or not drivers:
+        return [], [delivery.id for delivery in deliveries]
+    destinations = np.array([(d.latitude, d.longitude) for d in deliveries], dtype=float)
+    sources = np.array([(d.source_latitude, d.source_longitude) for d in deliveries], dtype=float)
+    sources = np.where(np.isnan(sources), destinations, sources)
+    positions = np.array([(d.latitude, d.longitude) for d in drivers], dtype=float)
+
+    leg = haversine(sources, destinations)
+    pickup = np.nan_to_num(haversine(sources[:, None, :], positions[None, :, :]), nan=0.0)
+    cost = pickup + leg[:, None]
+    if max_pickup_km is not None:
+        cost[pickup > max_pickup_km] = FORBIDDEN
+    # one column per free slot, a driver with three slots can take three deliveries
+    slots = np.repeat(np.arange(len(drivers)), [driver.slots for driver in drivers])
+    rows, columns = linear_sum_assignment(cost[:, slots])
+    matched = cost[rows, slots[columns]] < FORBIDDEN
+    rows, columns = rows[matched], slots[columns[matched]]
+    assignments = [Assignment(deliveries[row].id, drivers[column].id, round(float(pickup[row, column]), 3),
+                              round(float(cost[row, column]), 3))
+                   for row, column in zip(rows.tolist(), columns.tolist())]
+    assigned = set(rows.tolist())
+    return assignments, [delivery.id for i, delivery in enumerate(deliveries) if i not in assigned]
+
+
+async def open_deliveries(session, organization_id, lock=False):
+    statement = (select(Delivery.id, Delivery.destination_latitude, Delivery.destination_longitude)
+                 .outerjoin(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+                 .where(Delivery.organization_id == organization_id)
+                 .where(Delivery.driver_id.is_(None))
+                 .where(Delivery.destination_latitude.is_not(None))
+                 .where(Delivery.destination_longitude.is_not(None))
+                 .where(or_(DeliveryCurrentStatus.status.is_(None), DeliveryCurrentStatus.status != "Delivered"))
+                 .order_by(Delivery.id))
+    if lock:
+        # a second dispatcher running at the same time plans without the rows this one holds
+        statement = statement.with_for_update(skip_locked=True, of=Delivery)
+    rows = (await session.exec(statement)).all()
+    if not rows:
+        return []
+    sources = await source_warehouses(session, [row.id for row in rows])
+    return [OpenDelivery(row.id, row.destination_latitude, row.destination_longitude,
+                         *(sources[row.id][1:] if row.id in sources else (None, None))) for row in rows]
+
+
+async def source_warehouses(session, delivery_ids):
+    # delivery id to (warehouse id, latitude, longitude) of the warehouse the fulfilment planner chose, else of
+    # the first warehouse with coordinates that stocks a line of the order, as in /delivery/delivery_source
+    sources = {delivery_id: (warehouse_id, latitude, longitude)
+               for delivery_id, warehouse_id, latitude, longitude in (await session.exec(
+                   select(Delivery.id, Warehouse.id, Warehouse.latitude, Warehouse.longitude)
+                   .join(Warehouse, Warehouse.id == Delivery.warehouse_id)
+                   .where(Delivery.id.in_(delivery_ids))
+                   .where(Warehouse.latitude.is_not(None))
+                   .where(Warehouse.longitude.is_not(None)))).all()}
+    for delivery_id, warehouse_id, latitude, longitude in (await session.exec(
+            select(Delivery.id, Warehouse.id, Warehouse.latitude, Warehouse.longitude)
+            .join(OrderItem, OrderItem.order_id == Delivery.order_id)
+            .join(Product, Product.id == OrderItem.product_id)
+            .join(Warehouse, Warehouse.id == Product.warehouse_id)
+            .where(Delivery.id.in_(delivery_ids))
+            .where(Warehouse.latitude.is_not(None))
+            .where(Warehouse.longitude.is_not(None))
+            .order_by(Delivery.id, Warehouse.id))).all():
+        sources.setdefault(delivery_id, (warehouse_id, latitude, longitude))
+    return sources
+
+
+async def available_drivers(session, organization_id, capacity):
+    active = (select(DeliveryCurrentStatus.driver_id, func.count().label("active"))
+              .where(DeliveryCurrentStatus.organization_id == organization_id)
+              .where(DeliveryCurrentStatus.status != "Delivered")
+              .group_by(DeliveryCurrentStatus.driver_id)).subquery()
+    rows = (await session.exec(
+        select(Driver.id, DriverLastPosition.latitude, DriverLastPosition.longitude, func.coalesce(active.c.active, 0))
+        .join(UserOrganization, UserOrganization.user_id == Driver.driver_id)
+        .outerjoin(DriverLastPosition, DriverLastPosition.driver_id == Driver.id)
+        .outerjoin(active, active.c.driver_id == Driver.id)
+        .where(UserOrganization.organization_id == organization_id)
+        .order_by(Driver.id))).all()
+    return [AvailableDriver(driver_id, latitude, longitude, capacity - carrying)
+            for driver_id, latitude, longitude, carrying in rows]
+
+
+async def apply(session, organization_id, assignments):
+    # sets the drivers like /delivery/update_delivery does, the caller commits
+    if not assignments:
+        return
+    delivery_ids = [assignment.delivery_id for assignment in assignments]
+    await session.exec(update(Delivery), params=[{"id": a.delivery_id, "driver_id": a.driver_id} for a in assignments])
+    tracked = set((await session.exec(select(DeliveryCurrentStatus.delivery_id)
+                                      .where(DeliveryCurrentStatus.delivery_id.in_(delivery_ids)))).all())
+    if tracked:
+        await session.exec(update(DeliveryCurrentStatus), params=[
+            {"delivery_id": a.delivery_id, "driver_id": a.driver_id} for a in assignments if a.delivery_id in tracked])
+    # deliveries without any status get a Pending one, their current status is inserted in one statement
+    pending = [DeliveryStatusUpdate(delivery_id=delivery_id, delivery_status="Pending")
+               for delivery_id in delivery_ids if delivery_id not in tracked]
+    if pending:
+        session.add_all(pending)
+        await session.flush()
+        latest = delivery_status.latest_statuses().where(
+            DeliveryStatusUpdate.delivery_id.in_([status_update.delivery_id for status_update in pending])).subquery()
+        await session.exec(delivery_status.insert_latest(latest))
+        for status_update in pending:
+            publish_on_commit(session, organization_id, "delivery_status", status_update)
@@ -0,0 +1,55 @@
+"""Form-bound table models.
+
+FastAPI builds a ``table=True`` model from ``Form(...)`` without validating it, so its fields still
+hold the submitted text. ``validated_form`` binds the model from the form like ``Form(...)`` and
+then validates every submitted field against its annotation before the handler runs, so a bad
+value is a 422 naming the field instead of a failure while the session flushes:
+
+    async def create_delivery(..., new_delivery: Delivery = validated_form(Delivery)):
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Annotated
+
+from fastapi import Depends, Form
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+
+from db import naive_utc
+
+
+@lru_cache(maxsize=None)
+def field_adapter(model, name):
+    return TypeAdapter(model.model_fields[name].annotation)
+
+
+def validate_submitted(instance):
+    # converts the submitted text of instance to the field types in place, the timestamps to naive UTC
+    model = type(instance)
+    errors = []
+    for name in sorted(instance.model_fields_set):
+        value = getattr(instance, name)
+        if not isinstance(value, str) or name not in model.model_fields:
+            continue
+        adapter = field_adapter(model, name)
+        try:
+            value = adapter.validate_python(value)
+        except ValidationError as e:
+            # an empty field of an optional value was left blank
+            if value == "" and adapter.validator.isinstance_python(None):
+                setattr(instance, name, None)
+                continue
+            errors.extend({**error, "loc": ("body", name, *error["loc"])} for error in e.errors(include_url=False))
+            continue
+        if isinstance(value, datetime):
+            value = naive_utc(value)
+        setattr(instance, name, value)
+    if errors:
+        raise RequestValidationError(errors)
+    return instance
+
+
+def validated_form(model):
+    def submitted(form: Annotated[model, Form()]):
+        return validate_submitted(form)
+    return Depends(submitted)
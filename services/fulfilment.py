@@ -0,0 +1,216 @@
+"""Order fulfilment planning.
+
+A product row belongs to one warehouse, so the same item stocked in several warehouses is several
+products of the organization with the same name and unit of measurement. For every paid order that
+has not been planned yet the planner picks the warehouses to ship from: greedily the warehouse that
+can send the most complete lines, then the most quantity, then the one nearest to the destination,
+until every line is covered. One warehouse that holds everything therefore always wins, and an
+order is only split when no single warehouse can fill it. Orders are planned oldest first against
+the stock left by the ones before, an order that can not be filled completely is left alone.
+
+The ordered product's stock was already reserved when the lines were added. Shipping from another
+warehouse's product moves that reservation with ``services.stock.reserve``.
+"""
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from sqlalchemy import exists, func
+from sqlmodel import select
+
+from model.delivery import Delivery, DeliveryLine
+from model.orders import Order, OrderItem
+from model.product import Product
+from model.warehouse import Warehouse
+from services import kpi, stock
+from services.dispatch import haversine
+
+Line = namedtuple("Line", "order_item_id product_id item quantity")
+Shipment = namedtuple("Shipment", "warehouse_id distance_km lines")
+ShipmentLine = namedtuple("ShipmentLine", "order_item_id product_id quantity")
+OrderPlan = namedtuple("OrderPlan", "order_id destination shipments")
+
+
+def item_key(name, unit_of_measurement):
+    return (name or "").strip().lower(), (unit_of_measurement or "").strip().lower()
+
+
+class StockLevels:
+    # available quantity of every product with a warehouse, grouped by warehouse and item
+    def __init__(self, products, warehouses):
+        # products: (id, warehouse_id, item, quantity), warehouses: {id: (latitude, longitude)}
+        self.available = {}
+        self.products = defaultdict(lambda: defaultdict(list))
+        for product_id, warehouse_id, item, quantity in products:
+            self.available[product_id] = max(quantity or 0.0, 0.0)
+            self.products[warehouse_id][item].append(product_id)
+        self.warehouses = warehouses
+
+    def distances(self, destination):
+        # km from every warehouse to destination, 0 where either position is unknown
+        ids = list(self.products)
+        if destination is None or None in destination:
+            return dict.fromkeys(ids, 0.0)
+        positions = np.array([self.warehouses.get(i, (None, None)) for i in ids], dtype=float)
+        return dict(zip(ids, np.nan_to_num(haversine(positions, np.array(destination, dtype=float)), nan=0.0).tolist()))
+
+    def take(self, warehouse_id, line, wanted):
+        # what warehouse_id can send of line, the ordered product first; nothing is taken yet
+        product_ids = sorted(self.products[warehouse_id].get(line.item, ()), key=lambda p: (p != line.product_id, p))
+        taken = []
+        for product_id in product_ids:
+            quantity = min(wanted, self.available[product_id])
+            if quantity > 0:
+                taken.append(ShipmentLine(line.order_item_id, product_id, quantity))
+                wanted -= quantity
+            if wanted <= 0:
+                break
+        return taken
+
+
+def plan_order(lines, levels, destination=None):
+    # returns the shipments of an order and takes their stock from levels, or None if it can not be filled
+    for line in lines:
+        # the order's own reservation is free to be moved
+        if line.product_id in levels.available:
+            levels.available[line.product_id] += line.quantity
+    distances = levels.distances(destination)
+    ordered = {line.order_item_id: line.product_id for line in lines}
+    remaining = {line.order_item_id: line.quantity for line in lines}
+    candidates = set(levels.products)
+    shipments = []
+    while any(quantity > 1e-9 for quantity in remaining.values()) and candidates:
+        best, best_key = None, None
+        for warehouse_id in candidates:
+            offer = [levels.take(warehouse_id, line, remaining[line.order_item_id])
+                     for line in lines if remaining[line.order_item_id] > 1e-9]
+            sent = [sum(part.quantity for part in parts) for parts in offer]
+            if not any(sent):
+                continue
+            complete = sum(quantity >= remaining[parts[0].order_item_id] - 1e-9
+                           for parts, quantity in zip(offer, sent) if parts)
+            # without a destination the warehouse that already holds the reservation is preferred
+            home = sum(part.product_id == ordered[part.order_item_id] for parts in offer for part in parts)
+            key = (complete, sum(sent), -distances[warehouse_id], home, -warehouse_id)
+            if best_key is None or key > best_key:
+                best, best_key = (warehouse_id, [part for parts in offer for part in parts]), key
+        if best is None:
+            break
+        warehouse_id, parts = best
+        candidates.discard(warehouse_id)
+        for part in parts:
+            levels.available[part.product_id] -= part.quantity
+            remaining[part.order_item_id] -= part.quantity
+        shipments.append(Shipment(warehouse_id, round(distances[warehouse_id], 3), parts))
+    if any(quantity > 1e-9 for quantity in remaining.values()):
+        for shipment in shipments:
+            for part in shipment.lines:
+                levels.available[part.product_id] += part.quantity
+        for line in lines:
+            if line.product_id in levels.available:
+                levels.available[line.product_id] -= line.quantity
+        return None
+    return shipments
+
+
+def unplanned_orders(organization_id):
+    # paid orders (see /delivery/orders_unassigned) that no planned or delivered delivery belongs to yet
+    shipped = exists().where(Delivery.order_id == Order.id).where(
+        (Delivery.warehouse_id.is_not(None)) | (Delivery.delivered_at.is_not(None)))
+    return (select(Order).where(Order.organization_id == organization_id)
+            .where(Order.status == "Succeeded").where(~shipped)
+            .order_by(Order.order_date, Order.id))
+
+
+async def plan(session, organization_id, lock=False):
+    # returns the plans and the ids of the orders that can not be filled from the current stock
+    statement = unplanned_orders(organization_id)
+    if lock:
+        statement = statement.with_for_update(skip_locked=True, of=Order)
+    orders = (await session.exec(statement)).all()
+    if not orders:
+        return [], []
+    order_ids = [order.id for order in orders]
+    lines = defaultdict(list)
+    for item_id, order_id, product_id, quantity, name, unit in (await session.exec(
+            select(OrderItem.id, OrderItem.order_id, OrderItem.product_id, OrderItem.quantity,
+                   Product.name, Product.unit_of_measurement)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id.in_(order_ids))
+            .order_by(OrderItem.id))).all():
+        lines[order_id].append(Line(item_id, product_id, item_key(name, unit), quantity))
+    destinations = {}
+    for order_id, latitude, longitude in (await session.exec(
+            select(Delivery.order_id, Delivery.destination_latitude, Delivery.destination_longitude)
+            .where(Delivery.order_id.in_(order_ids))
+            .where(Delivery.destination_latitude.is_not(None))
+            .where(Delivery.destination_longitude.is_not(None))
+            .order_by(Delivery.id))).all():
+        destinations.setdefault(order_id, (latitude, longitude))
+    items = {line.item for order_lines in lines.values() for line in order_lines}
+    products = [(product_id, warehouse_id, item_key(name, unit), quantity)
+                for product_id, warehouse_id, name, unit, quantity in (await session.exec(
+                    select(Product.id, Product.warehouse_id, Product.name, Product.unit_of_measurement, Product.quantity)
+                    .where(Product.organization_id == organization_id)
+                    .where(Product.warehouse_id.is_not(None))
+                    .where(func.lower(func.trim(Product.name)).in_({name for name, _ in items})))).all()
+                if item_key(name, unit) in items]
+    warehouses = {warehouse_id: (latitude, longitude) for warehouse_id, latitude, longitude in (await session.exec(
+        select(Warehouse.id, Warehouse.latitude, Warehouse.longitude)
+        .where(Warehouse.id.in_({product[1] for product in products})))).all()}
+    levels = StockLevels(products, warehouses)
+    plans, short = [], []
+    for order in orders:
+        shipments = plan_order(lines[order.id], levels, destinations.get(order.id)) if lines[order.id] else None
+        if shipments is None:
+            short.append(order.id)
+        else:
+            plans.append(OrderPlan(order.id, destinations.get(order.id), shipments))
+    return plans, short
+
+
+async def apply(session, organization_id, plans, created_by=None):
+    # creates the deliveries and lines and moves the reservations, the caller commits. The delivery
+    # /sales/paid created for the order is reused for its first shipment. Returns {order id: [delivery ids]}.
+    if not plans:
+        return {}
+    order_ids = [p.order_id for p in plans]
+    existing = defaultdict(list)
+    for delivery in (await session.exec(select(Delivery).where(Delivery.order_id.in_(order_ids))
+                                        .where(Delivery.warehouse_id.is_(None)).order_by(Delivery.id))).all():
+        existing[delivery.order_id].append(delivery)
+    # every route that writes order lines reserves their stock (services.stock), the shipments take
+    # the reservation over
+    changes = defaultdict(float)
+    for product_id, quantity in (await session.exec(select(OrderItem.product_id, OrderItem.quantity)
+                                                    .where(OrderItem.order_id.in_(order_ids)))).all():
+        changes[product_id] -= quantity
+    created, deliveries = 0, {}
+    for order_plan in plans:
+        reusable = existing[order_plan.order_id]
+        template = reusable[0] if reusable else Delivery(order_id=order_plan.order_id, organization_id=organization_id,
+                                                         created_by=created_by)
+        deliveries[order_plan.order_id] = []
+        for index, shipment in enumerate(order_plan.shipments):
+            if index < len(reusable):
+                delivery = reusable[index]
+            else:
+                delivery = Delivery(order_id=order_plan.order_id, organization_id=organization_id, created_by=created_by,
+                                    destination_latitude=template.destination_latitude,
+                                    destination_longitude=template.destination_longitude,
+                                    destination_name=template.destination_name,
+                                    delivery_instructions=template.delivery_instructions)
+                created += 1
+            delivery.warehouse_id = shipment.warehouse_id
+            session.add(delivery)
+            deliveries[order_plan.order_id].append((delivery, shipment))
+            for part in shipment.lines:
+                changes[part.product_id] += part.quantity
+    await session.flush()
+    session.add_all(DeliveryLine(delivery_id=delivery.id, order_item_id=part.order_item_id, product_id=part.product_id,
+                                 quantity=part.quantity)
+                    for shipped in deliveries.values() for delivery, shipment in shipped for part in shipment.lines)
+    # raises stock.InsufficientStock (or UnknownProduct) when someone took (or removed) the stock since it was planned
+    await stock.reserve(session, organization_id, {product_id: quantity for product_id, quantity in changes.items()
+                                                   if abs(quantity) > 1e-9}, "fulfilment", user_id=created_by)
+    await kpi.bump(session, organization_id, total_shipments=created)
+    return {order_id: [delivery.id for delivery, _ in shipped] for order_id, shipped in deliveries.items()}
@@ -0,0 +1,75 @@
+"""Delivery tracks for the map view.
+
+A trip is a few thousand GPS fixes. ``simplify`` drops the ones that would not move the drawn line
+by more than ``tolerance`` metres (Douglas-Peucker, each pass splitting every open segment at once
+with NumPy), and ``encode_polyline`` packs what is left in the Google encoded polyline format.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # metres
+# metres covered by one 256 px web mercator tile pixel at the equator, zoom 0
+EQUATOR_METRES_PER_PIXEL = 156543.03392
+
+
+def project(coordinates):
+    # (latitude, longitude) degrees to local x/y metres, accurate enough over a city
+    coordinates = np.asarray(coordinates, dtype=float)
+    radians = np.radians(coordinates)
+    scale = math.cos(radians[:, 0].mean())
+    return np.column_stack((radians[:, 1] * scale, radians[:, 0])) * EARTH_RADIUS
+
+
+def metres_per_pixel(zoom, latitude):
+    return EQUATOR_METRES_PER_PIXEL * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def segment_distances(points, a, b):
+    # distance of every point to the segment between the matching a and b
+    ab = b - a
+    length = (ab ** 2).sum(axis=1)
+    t = np.divide(((points - a) * ab).sum(axis=1), length, out=np.zeros_like(length), where=length > 0)
+    nearest = a + np.clip(t, 0, 1)[:, None] * ab
+    return np.hypot(*(points - nearest).T)
+
+
+def simplify(points, tolerance):
+    # returns the indexes of the points to keep, always including the first and last
+    count = len(points)
+    if count < 3 or tolerance <= 0:
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, -1]] = True
+    starts, ends = np.array([0]), np.array([count - 1])
+    while len(starts):
+        inside = ends - starts - 1
+        open_ = inside > 0
+        starts, ends, inside = starts[open_], ends[open_], inside[open_]
+        if not len(starts):
+            break
+        segment = np.repeat(np.arange(len(starts)), inside)
+        index = starts[segment] + 1 + np.arange(inside.sum()) - np.repeat(np.cumsum(inside) - inside, inside)
+        distances = segment_distances(points[index], points[starts[segment]], points[ends[segment]])
+        # farthest point of every segment, the first one on ties
+        order = np.lexsort((-distances, segment))
+        farthest = order[np.unique(segment[order], return_index=True)[1]]
+        split = distances[farthest] > tolerance
+        farthest = farthest[split]
+        splitting = segment[farthest]
+        keep[index[farthest]] = True
+        starts = np.concatenate((starts[splitting], index[farthest]))
+        ends = np.concatenate((index[farthest], ends[splitting]))
+    return np.flatnonzero(keep)
+
+
+def encode_polyline(coordinates, precision=5):
+    values = np.floor(np.asarray(coordinates, dtype=float).reshape(-1, 2) * 10 ** precision + 0.5).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    chunks = []
+    for value in np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist():
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
@@ -0,0 +1,131 @@
+"""GPS breadcrumbs from the driver app.
+
+The app buffers fixes while offline and uploads them in batches. A batch is written with multi-row
+INSERTs that skip fixes already stored for the same (delivery_status_id, timestamp), so an upload
+that is retried after a dropped connection does not duplicate the trail.
+
+The newest fix of every driver is also kept in ``driver_last_position`` for the fleet map. It can
+be recomputed from the history with:
+
+    python -m services.gps rebuild
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+
+from db import async_engine, async_session_maker, dialect_insert, naive_utc, require_migrated
+from model.delivery import Delivery, DeliveryStatusUpdate, DriverLastPosition, GPSCoordinates
+
+# 4 parameters per fix, well below the bind parameter limits of asyncpg and SQLite
+CHUNK_SIZE = 1000
+POSITION_COLUMNS = ["driver_id", "organization_id", "delivery_id", "delivery_status_id", "latitude", "longitude",
+                    "timestamp"]
+
+
+class UnknownStatusUpdate(Exception):
+    def __init__(self, status_update_ids):
+        self.status_update_ids = sorted(status_update_ids)
+        super().__init__(f"Delivery status updates {self.status_update_ids} do not exist.")
+
+
+def status_deliveries(status_update_ids):
+    return (select(DeliveryStatusUpdate.id, DeliveryStatusUpdate.delivery_id, Delivery.driver_id, Delivery.organization_id)
+            .join(Delivery, Delivery.id == DeliveryStatusUpdate.delivery_id)
+            .where(DeliveryStatusUpdate.id.in_(status_update_ids)))
+
+
+async def status_updates(session, organization_id, status_update_ids, driver_id=None):
+    # the status updates among status_update_ids of the organization's deliveries, or only of the
+    # deliveries of driver_id when it is given, by id
+    statement = status_deliveries(status_update_ids).where(Delivery.organization_id == organization_id)
+    if driver_id is not None:
+        statement = statement.where(Delivery.driver_id == driver_id)
+    return {status.id: status for status in (await session.exec(statement)).all()}
+
+
+async def ingest_fixes(session, organization_id, fixes, skip_unknown=False, driver_id=None):
+    # Returns the number of fixes stored, the caller commits. Fixes for status updates outside the
+    # organization, or of another driver's deliveries when driver_id is given, raise UnknownStatusUpdate,
+    # or are dropped with skip_unknown.
+    rows = {}
+    for fix in fixes:
+        timestamp = naive_utc(fix.timestamp)
+        rows.setdefault((fix.delivery_status_id, timestamp), {
+            "delivery_status_id": fix.delivery_status_id, "latitude": fix.latitude,
+            "longitude": fix.longitude, "timestamp": timestamp})
+    status_update_ids = {status_update_id for status_update_id, _ in rows}
+    if not status_update_ids:
+        return 0
+    statuses = await status_updates(session, organization_id, status_update_ids, driver_id)
+    if statuses.keys() != status_update_ids and not skip_unknown:
+        raise UnknownStatusUpdate(status_update_ids - statuses.keys())
+    table = GPSCoordinates.__table__
+    values = [row for row in rows.values() if row["delivery_status_id"] in statuses]
+    accepted = 0
+    for start in range(0, len(values), CHUNK_SIZE):
+        statement = (dialect_insert(session, GPSCoordinates).values(values[start:start + CHUNK_SIZE])
+                     .on_conflict_do_nothing(index_elements=[table.c.delivery_status_id, table.c.timestamp])
+                     .returning(table.c.id))
+        accepted += len((await session.exec(statement)).all())
+    await update_positions(session, values, statuses)
+    return accepted
+
+
+async def update_positions(session, rows, statuses=None):
+    # rows hold gps_coordinates values; statuses maps their status update ids to the delivery and
+    # driver, it is loaded when not given. Fixes older than the stored position are ignored.
+    if statuses is None:
+        statuses = {status.id: status for status in (await session.exec(
+            status_deliveries({row["delivery_status_id"] for row in rows}))).all()}
+    latest = {}
+    for row in rows:
+        status = statuses.get(row["delivery_status_id"])
+        if status is None or status.driver_id is None:
+            continue
+        if status.driver_id not in latest or latest[status.driver_id]["timestamp"] < row["timestamp"]:
+            latest[status.driver_id] = {
+                "driver_id": status.driver_id, "organization_id": status.organization_id, "delivery_id": status.delivery_id,
+                "delivery_status_id": row["delivery_status_id"], "latitude": row["latitude"],
+                "longitude": row["longitude"], "timestamp": row["timestamp"]}
+    if not latest:
+        return
+    table = DriverLastPosition.__table__
+    statement = dialect_insert(session, DriverLastPosition).values([latest[driver] for driver in sorted(latest)])
+    excluded = statement.excluded
+    await session.exec(statement.on_conflict_do_update(
+        index_elements=[table.c.driver_id],
+        set_={column: excluded[column] for column in POSITION_COLUMNS if column != "driver_id"},
+        where=table.c.timestamp < excluded.timestamp))
+
+
+async def rebuild(session):
+    rank = func.row_number().over(partition_by=Delivery.driver_id,
+                                  order_by=(GPSCoordinates.timestamp.desc(), GPSCoordinates.id.desc()))
+    latest = (select(Delivery.driver_id, Delivery.organization_id, Delivery.id.label("delivery_id"),
+                     GPSCoordinates.delivery_status_id, GPSCoordinates.latitude, GPSCoordinates.longitude,
+                     GPSCoordinates.timestamp, rank.label("rank"))
+              .join(DeliveryStatusUpdate, DeliveryStatusUpdate.id == GPSCoordinates.delivery_status_id)
+              .join(Delivery, Delivery.id == DeliveryStatusUpdate.delivery_id)
+              .where(Delivery.driver_id.is_not(None))).subquery()
+    await session.exec(delete(DriverLastPosition))
+    await session.exec(DriverLastPosition.__table__.insert().from_select(
+        POSITION_COLUMNS, select(*(latest.c[column] for column in POSITION_COLUMNS)).where(latest.c.rank == 1)))
+    await session.commit()
+    return (await session.exec(select(func.count()).select_from(DriverLastPosition))).one()
+
+
+async def main():
+    await require_migrated()
+    async with async_session_maker() as session:
+        count = await rebuild(session)
+    await async_engine.dispose()
+    print(f"Rebuilt the last position of {count} drivers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Last known driver positions")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    asyncio.run(main())
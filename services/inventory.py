@@ -0,0 +1,153 @@
+"""Inventory ledger.
+
+Every stock change is appended to ``inventory_movement`` as a signed quantity; rows are never
+updated, so writers only ever insert. ``Product.quantity`` is a cache of the sum, changed in the same
+transaction with an atomic ``quantity = quantity + delta`` (sales keep their ``quantity >= wanted``
+guard in ``services.stock.reserve`` so stock can not go below zero). ``compact`` writes a snapshot of
+every product with a long tail of movements, so the on hand quantity at any time is the last
+snapshot before it plus the few movements after. Deleting a product deletes its ledger with it
+(``forget``). A snapshot only covers movements older than
+``--min-age-minutes``: a movement id is drawn when the row is inserted but the row is only visible once
+its transaction commits, so a recent snapshot could step over a lower id that is still in flight and
+leave it out of every later sum. ``rebuild`` recomputes the cache from the ledger:
+
+    python -m services.inventory compact --min-tail 100 --min-age-minutes 10
+    python -m services.inventory rebuild --organization-id 3
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, insert, update
+from sqlmodel import select
+
+from db import async_engine, async_session_maker, require_migrated
+from model.inventory import InventoryMovement, InventorySnapshot
+from model.product import Product
+
+COMPACT_MIN_TAIL = 100
+COMPACT_MIN_AGE = timedelta(minutes=10)
+
+
+async def append(session, organization_id, deltas, reason, reference_id=None, user_id=None):
+    # one insert for all the products, zero deltas are skipped
+    rows = [{"organization_id": organization_id, "product_id": product_id, "quantity": quantity, "reason": reason,
+             "reference_id": reference_id, "user_id": user_id}
+            for product_id, quantity in sorted(deltas.items()) if quantity]
+    if rows:
+        await session.exec(insert(InventoryMovement), params=rows)
+
+
+async def adjust(session, organization_id, deltas, reason, reference_id=None, user_id=None):
+    # records the movements and moves the cache with them, the caller commits
+    await append(session, organization_id, deltas, reason, reference_id, user_id)
+    for product_id, quantity in sorted(deltas.items()):
+        if quantity:
+            await session.exec(update(Product).where(Product.id == product_id)
+                               .values(quantity=Product.quantity + quantity))
+
+
+async def count(session, organization_id, product_id, quantity, user_id=None):
+    # a stock count: records the difference to the cached quantity, read under a row lock
+    current = (await session.exec(select(Product.quantity).where(Product.id == product_id)
+                                  .where(Product.organization_id == organization_id).with_for_update())).first()
+    if current is None:
+        return
+    await adjust(session, organization_id, {product_id: quantity - (current or 0.0)}, "count", user_id=user_id)
+
+
+async def forget(session, product_id):
+    # deletes the snapshots and movements of a product that is being deleted, the caller commits
+    await session.exec(delete(InventorySnapshot).where(InventorySnapshot.product_id == product_id))
+    await session.exec(delete(InventoryMovement).where(InventoryMovement.product_id == product_id))
+
+
+def latest_snapshots(at=None):
+    # the newest snapshot of every product, taken at or before at
+    statement = select(InventorySnapshot.product_id, func.max(InventorySnapshot.movement_id).label("movement_id"))
+    if at is not None:
+        statement = statement.where(InventorySnapshot.taken_at <= at)
+    latest = statement.group_by(InventorySnapshot.product_id).subquery()
+    return (select(InventorySnapshot.product_id, InventorySnapshot.movement_id, InventorySnapshot.quantity)
+            .join(latest, and_(latest.c.product_id == InventorySnapshot.product_id,
+                               latest.c.movement_id == InventorySnapshot.movement_id))).subquery()
+
+
+def on_hand_statement(at=None):
+    # product id, on hand quantity, last movement id, its created_at and the number of movements summed,
+    # for every product with movements since its snapshot
+    base = latest_snapshots(at)
+    statement = (select(InventoryMovement.product_id,
+                        (func.coalesce(func.max(base.c.quantity), 0.0) + func.sum(InventoryMovement.quantity)).label("quantity"),
+                        func.max(InventoryMovement.id).label("movement_id"),
+                        func.max(InventoryMovement.created_at).label("taken_at"),
+                        func.count().label("tail"))
+                 .outerjoin(base, base.c.product_id == InventoryMovement.product_id)
+                 .where(InventoryMovement.id > func.coalesce(base.c.movement_id, 0)))
+    if at is not None:
+        statement = statement.where(InventoryMovement.created_at <= at)
+    return statement.group_by(InventoryMovement.product_id)
+
+
+async def on_hand(session, product_id, at=None):
+    # quantity of the product at the time at (now if None): the snapshot plus the movements after it
+    row = (await session.exec(on_hand_statement(at).where(InventoryMovement.product_id == product_id))).first()
+    if row is not None:
+        return row.quantity
+    snapshot = latest_snapshots(at)
+    quantity = (await session.exec(select(snapshot.c.quantity).where(snapshot.c.product_id == product_id))).first()
+    return quantity or 0.0
+
+
+async def compact(session, organization_id=None, min_tail=COMPACT_MIN_TAIL, min_age=COMPACT_MIN_AGE):
+    # snapshots every product with at least min_tail movements older than min_age since its last
+    # snapshot, returns how many
+    statement = on_hand_statement(datetime.utcnow() - min_age).having(func.count() >= min_tail)
+    if organization_id is not None:
+        statement = statement.where(InventoryMovement.organization_id == organization_id)
+    statement = statement.subquery()
+    result = await session.exec(insert(InventorySnapshot).from_select(
+        ["product_id", "movement_id", "quantity", "taken_at"],
+        select(statement.c.product_id, statement.c.movement_id, statement.c.quantity, statement.c.taken_at)))
+    await session.commit()
+    return result.rowcount
+
+
+async def rebuild(session, organization_id=None):
+    # sets Product.quantity from the ledger for every product that has movements, returns how many
+    statement = on_hand_statement()
+    if organization_id is not None:
+        statement = statement.where(InventoryMovement.organization_id == organization_id)
+    totals = (await session.exec(statement)).all()
+    snapshots = latest_snapshots()
+    untouched = select(snapshots.c.product_id, snapshots.c.quantity).where(
+        snapshots.c.product_id.not_in([row.product_id for row in totals]))
+    if organization_id is not None:
+        untouched = untouched.join(Product, Product.id == snapshots.c.product_id).where(
+            Product.organization_id == organization_id)
+    params = [{"id": row.product_id, "quantity": row.quantity} for row in totals]
+    params += [{"id": product_id, "quantity": quantity} for product_id, quantity in (await session.exec(untouched)).all()]
+    if params:
+        await session.exec(update(Product), params=params)
+    await session.commit()
+    return len(params)
+
+
+async def main(command, organization_id=None, min_tail=COMPACT_MIN_TAIL, min_age=COMPACT_MIN_AGE):
+    await require_migrated()
+    async with async_session_maker() as session:
+        if command == "compact":
+            print(f"Wrote {await compact(session, organization_id, min_tail, min_age)} inventory snapshot(s)")
+        else:
+            print(f"Rebuilt the stock of {await rebuild(session, organization_id)} product(s)")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inventory ledger")
+    parser.add_argument("command", choices=["compact", "rebuild"])
+    parser.add_argument("--organization-id", type=int, default=None)
+    parser.add_argument("--min-tail", type=int, default=COMPACT_MIN_TAIL)
+    parser.add_argument("--min-age-minutes", type=int, default=COMPACT_MIN_AGE // timedelta(minutes=1))
+    args = parser.parse_args()
+    asyncio.run(main(args.command, args.organization_id, args.min_tail, timedelta(minutes=args.min_age_minutes)))
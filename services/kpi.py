@@ -0,0 +1,163 @@
+"""Per-organization dashboard KPI projection.
+
+The write endpoints call ``bump``/``bump_day`` in the same transaction as the row they change,
+so the dashboard reads one row instead of scanning order, delivery, transaction and quotation.
+If the projection drifts it can be recomputed from the source tables:
+
+    python -m services.kpi rebuild [--organization-id ID]
+"""
+import argparse
+import asyncio
+from datetime import date, datetime
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+
+from db import async_engine, async_session_maker, dialect_insert, require_migrated
+from model.dashboard import OrganizationKpi, OrganizationKpiDaily
+from model.delivery import Delivery
+from model.orders import Order, Transaction
+from model.organization import Organization, UserOrganization
+from model.product import Product
+from model.rfq import RFQ, Quotation
+from model.user import Driver
+from model.warehouse import Warehouse
+
+
+async def bump(session, organization_id, **deltas):
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if organization_id is None or not deltas:
+        return
+    table = OrganizationKpi.__table__
+    statement = dialect_insert(session, OrganizationKpi).values(organization_id=organization_id, **deltas)
+    set_ = {column: table.c[column] + statement.excluded[column] for column in deltas}
+    set_["updated_at"] = datetime.utcnow()
+    await session.exec(statement.on_conflict_do_update(index_elements=[table.c.organization_id], set_=set_))
+
+
+async def bump_day(session, organization_id, day, **deltas):
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if organization_id is None or day is None or not deltas:
+        return
+    if isinstance(day, datetime):
+        day = day.date()
+    table = OrganizationKpiDaily.__table__
+    statement = dialect_insert(session, OrganizationKpiDaily).values(organization_id=organization_id, day=day, **deltas)
+    set_ = {column: table.c[column] + statement.excluded[column] for column in deltas}
+    await session.exec(statement.on_conflict_do_update(
+        index_elements=[table.c.organization_id, table.c.day], set_=set_))
+
+
+async def move_day(session, organization_id, old_day, new_day, column, amount=1):
+    # either day may be None, e.g. a delivery that is not delivered yet
+    if isinstance(old_day, datetime):
+        old_day = old_day.date()
+    if isinstance(new_day, datetime):
+        new_day = new_day.date()
+    if old_day == new_day:
+        return
+    await bump_day(session, organization_id, old_day, **{column: -amount})
+    await bump_day(session, organization_id, new_day, **{column: amount})
+
+
+async def rfq_organization(session, rfq_id):
+    return (await session.exec(select(RFQ.organization_id).where(RFQ.id == rfq_id))).first()
+
+
+def quotation_expense(quotation):
+    if not quotation.selected:
+        return 0.0
+    return (quotation.price or 0.0) * (quotation.quantity or 0.0)
+
+
+async def bump_expense(session, quotation, delta):
+    if not delta:
+        return
+    organization_id = await rfq_organization(session, quotation.rfq_id)
+    await bump(session, organization_id, total_expense=delta)
+    await bump_day(session, organization_id, quotation.created_at, expense=delta)
+
+
+# Drivers are not projected, the driver table is small and shared through user_organization
+def total_drivers(organization_id):
+    return (select(func.count(func.distinct(Driver.id)))
+            .join(UserOrganization, Driver.driver_id == UserOrganization.user_id)
+            .where(UserOrganization.organization_id == organization_id)
+            .scalar_subquery())
+
+
+def organization_totals(organization_id):
+    return select(
+        select(func.count(Order.id)).where(Order.organization_id == organization_id)
+        .scalar_subquery().label("total_orders"),
+        select(func.count(Delivery.id)).where(Delivery.organization_id == organization_id)
+        .scalar_subquery().label("total_shipments"),
+        select(func.coalesce(func.sum(Transaction.payment_amount), 0.0))
+        .where(Transaction.organization_id == organization_id)
+        .scalar_subquery().label("total_revenue"),
+        select(func.coalesce(func.sum(Quotation.price * Quotation.quantity), 0.0))
+        .join(RFQ, Quotation.rfq_id == RFQ.id)
+        .where(Quotation.selected == True).where(RFQ.organization_id == organization_id)
+        .scalar_subquery().label("total_expense"),
+        select(func.count(Product.id)).where(Product.organization_id == organization_id)
+        .scalar_subquery().label("total_products"),
+        select(func.count(Warehouse.id)).where(Warehouse.organization_id == organization_id)
+        .scalar_subquery().label("total_warehouse"),
+    )
+
+
+def daily_totals(organization_id):
+    orders_day = func.date(Order.order_date)
+    shipments_day = func.date(Delivery.delivered_at)
+    revenue_day = func.date(Transaction.time)
+    expense_day = func.date(Quotation.created_at)
+    return {
+        "orders": select(orders_day, func.count(Order.id))
+        .where(Order.organization_id == organization_id).group_by(orders_day),
+        "shipments": select(shipments_day, func.count(Delivery.id))
+        .where(Delivery.organization_id == organization_id).where(Delivery.delivered_at.is_not(None))
+        .group_by(shipments_day),
+        "revenue": select(revenue_day, func.sum(Transaction.payment_amount))
+        .where(Transaction.organization_id == organization_id).group_by(revenue_day),
+        "expense": select(expense_day, func.sum(Quotation.price * Quotation.quantity))
+        .join(RFQ, Quotation.rfq_id == RFQ.id)
+        .where(Quotation.selected == True).where(RFQ.organization_id == organization_id)
+        .group_by(expense_day),
+    }
+
+
+async def rebuild(session, organization_id=None):
+    if organization_id is None:
+        organization_ids = (await session.exec(select(Organization.id))).all()
+    else:
+        organization_ids = [organization_id]
+    for org_id in organization_ids:
+        await session.exec(delete(OrganizationKpi).where(OrganizationKpi.organization_id == org_id))
+        await session.exec(delete(OrganizationKpiDaily).where(OrganizationKpiDaily.organization_id == org_id))
+        totals = (await session.exec(organization_totals(org_id))).one()._asdict()
+        session.add(OrganizationKpi(organization_id=org_id, **totals))
+        days = {}
+        for column, statement in daily_totals(org_id).items():
+            for day, value in (await session.exec(statement)).all():
+                if isinstance(day, str):  # SQLite returns date() as text
+                    day = date.fromisoformat(day)
+                days.setdefault(day, {})[column] = value or 0
+        session.add_all(OrganizationKpiDaily(organization_id=org_id, day=day, **values) for day, values in days.items())
+    await session.commit()
+    return len(organization_ids)
+
+
+async def main(organization_id=None):
+    await require_migrated()
+    async with async_session_maker() as session:
+        count = await rebuild(session, organization_id)
+    await async_engine.dispose()
+    print(f"Rebuilt dashboard KPIs for {count} organization(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dashboard KPI projection")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--organization-id", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.organization_id))
@@ -0,0 +1,94 @@
+"""Vehicle load planning.
+
+The weight and volume of a delivery are summed in SQL from the quantities of its delivery lines
+(or of its order lines where the fulfilment planner did not split the order) and the products' ``weight`` (kg) and parsed dimensions (``width_cm`` x ``height_cm`` x ``length_cm``).
+The deliveries of a day are then packed into the drivers' vehicles first fit decreasing: a delivery
+that already has a driver stays in that vehicle, the others are taken largest first and go into the
+first vehicle with enough weight and volume left.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from sqlalchemy import and_, case, func, or_
+from sqlmodel import select
+
+from model.delivery import Delivery, DeliveryCurrentStatus, DeliveryLine
+from model.orders import OrderItem
+from model.organization import UserOrganization
+from model.product import Product
+from model.user import Driver
+
+DeliveryLoad = namedtuple("DeliveryLoad", "id driver_id weight_kg volume_m3 incomplete_lines")
+Vehicle = namedtuple("Vehicle", "driver_id capacity_kg capacity_m3")
+
+
+def pack(loads, vehicles):
+    # returns {driver id: [loads]} in vehicle order and the loads that fit in no vehicle
+    manifests = {vehicle.driver_id: [] for vehicle in vehicles}
+    if not vehicles:
+        return manifests, list(loads)
+    index = {vehicle.driver_id: i for i, vehicle in enumerate(vehicles)}
+    capacity = np.array([(v.capacity_kg, v.capacity_m3) for v in vehicles], dtype=float)
+    used = np.zeros_like(capacity)
+    free = []
+    for load in loads:
+        if load.driver_id in index:
+            used[index[load.driver_id]] += (load.weight_kg, load.volume_m3)
+            manifests[load.driver_id].append(load)
+        else:
+            free.append(load)
+    # largest first, measured against the largest vehicle so weight and volume count alike
+    largest = np.maximum(capacity.max(axis=0), 1e-9)
+    free.sort(key=lambda load: (-max(load.weight_kg / largest[0], load.volume_m3 / largest[1]), load.id))
+    unplaced = []
+    for load in free:
+        fits = np.flatnonzero(((used + (load.weight_kg, load.volume_m3)) <= capacity).all(axis=1))
+        if not len(fits):
+            unplaced.append(load)
+            continue
+        used[fits[0]] += (load.weight_kg, load.volume_m3)
+        manifests[vehicles[fits[0]].driver_id].append(load)
+    return manifests, unplaced
+
+
+def day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+async def delivery_loads(session, organization_id, day):
+    # the undelivered deliveries started on day with their weight and volume; lines of products without a
+    # weight or parsable dimensions count as zero and are reported in incomplete_lines
+    start, end = day_bounds(day)
+    volume = Product.width_cm * Product.height_cm * Product.length_cm / 1e6
+    quantity = func.coalesce(DeliveryLine.quantity, OrderItem.quantity)
+    missing = and_(func.coalesce(DeliveryLine.id, OrderItem.id).is_not(None),
+                   or_(Product.weight.is_(None), Product.width_cm.is_(None),
+                       Product.height_cm.is_(None), Product.length_cm.is_(None)))
+    rows = (await session.exec(
+        select(Delivery.id, Delivery.driver_id,
+               func.coalesce(func.sum(quantity * func.coalesce(Product.weight, 0)), 0),
+               func.coalesce(func.sum(quantity * func.coalesce(volume, 0)), 0),
+               func.coalesce(func.sum(case((missing, 1), else_=0)), 0))
+        .outerjoin(DeliveryLine, DeliveryLine.delivery_id == Delivery.id)
+        .outerjoin(OrderItem, and_(OrderItem.order_id == Delivery.order_id, DeliveryLine.id.is_(None)))
+        .outerjoin(Product, Product.id == func.coalesce(DeliveryLine.product_id, OrderItem.product_id))
+        .outerjoin(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+        .where(Delivery.organization_id == organization_id)
+        .where(Delivery.started_at >= start, Delivery.started_at < end)
+        .where(or_(DeliveryCurrentStatus.status.is_(None), DeliveryCurrentStatus.status != "Delivered"))
+        .group_by(Delivery.id, Delivery.driver_id)
+        .order_by(Delivery.id))).all()
+    return [DeliveryLoad(delivery_id, driver_id, float(weight), float(volume), int(incomplete))
+            for delivery_id, driver_id, weight, volume, incomplete in rows]
+
+
+async def organization_vehicles(session, organization_id, capacity_kg, capacity_m3):
+    rows = (await session.exec(
+        select(Driver.id, func.coalesce(Driver.capacity_kg, capacity_kg), func.coalesce(Driver.capacity_m3, capacity_m3))
+        .join(UserOrganization, UserOrganization.user_id == Driver.driver_id)
+        .where(UserOrganization.organization_id == organization_id)
+        .distinct()
+        .order_by(Driver.id))).all()
+    return [Vehicle(driver_id, float(kg), float(m3)) for driver_id, kg, m3 in rows]
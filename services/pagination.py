@@ -0,0 +1,98 @@
+"""Keyset pagination for the list endpoints.
+
+A page is fetched with ``WHERE (sort_key, id) > (:last_sort_value, :last_id) ORDER BY sort_key, id LIMIT n``.
+Every page therefore costs the same however deep the client has scrolled, unlike OFFSET. The cursor
+returned as ``next_cursor`` is an opaque token holding the sort key and the last row's values:
+
+    GET /sales/orders?limit=50&sort=-order_date&status=Pending
+    GET /sales/orders?limit=50&sort=-order_date&status=Pending&after=<next_cursor>
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import Depends, HTTPException, Query
+from sqlalchemy import DateTime, tuple_
+
+from db import naive_utc
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class PageParams:
+    def __init__(self,
+                 limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                 after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+                 sort: Optional[str] = Query(None, description="Sort key, prefix with - for descending"),
+                 status: Optional[str] = None,
+                 start: Optional[datetime] = Query(None, description="Only rows on or after this time"),
+                 end: Optional[datetime] = Query(None, description="Only rows before this time")):
+        self.limit = limit
+        self.after = after
+        self.sort = sort
+        self.status = status
+        self.start = naive_utc(start)
+        self.end = naive_utc(end)
+
+
+PageDep = Annotated[PageParams, Depends()]
+
+
+def encode_cursor(sort, value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort, column):
+    try:
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(column.type, DateTime) and value is not None:
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="The cursor was issued for a different sort")
+    return value, row_id
+
+
+async def paginate(session, statement, page, id_column, sort_keys=None, status_column=None, date_column=None):
+    # sort_keys maps the names accepted in ?sort= to non-nullable columns, id is always allowed
+    sort_keys = {"id": id_column, **(sort_keys or {})}
+    sort = page.sort or "id"
+    descending = sort.startswith("-")
+    if sort.lstrip("-") not in sort_keys:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(sorted(sort_keys))}")
+    column = sort_keys[sort.lstrip("-")]
+
+    if page.status is not None:
+        if status_column is None:
+            raise HTTPException(status_code=400, detail="This list can not be filtered by status")
+        statement = statement.where(status_column == page.status)
+    if page.start is not None or page.end is not None:
+        if date_column is None:
+            raise HTTPException(status_code=400, detail="This list can not be filtered by date")
+        if page.start is not None:
+            statement = statement.where(date_column >= page.start)
+        if page.end is not None:
+            statement = statement.where(date_column < page.end)
+
+    # id breaks ties so rows sharing a sort value are neither skipped nor repeated
+    columns = [column, id_column] if column is not id_column else [id_column]
+    if page.after is not None:
+        value, row_id = decode_cursor(page.after, sort, column)
+        key, last = (tuple_(column, id_column), tuple_(value, row_id)) if len(columns) == 2 else (id_column, row_id)
+        statement = statement.where(key < last if descending else key > last)
+    statement = statement.order_by(*(c.desc() if descending else c for c in columns))
+
+    # one extra row tells whether there is a next page without a COUNT(*)
+    rows = (await session.exec(statement.limit(page.limit + 1))).all()
+    items = rows[:page.limit]
+    next_cursor = None
+    if len(rows) > page.limit:
+        last_row = items[-1]
+        next_cursor = encode_cursor(sort, getattr(last_row, column.key), getattr(last_row, id_column.key))
+    return {"items": items, "next_cursor": next_cursor}
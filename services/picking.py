@@ -0,0 +1,106 @@
+"""Wave picking.
+
+The open orders of a warehouse are batched into waves so one walk through the aisles fills many
+orders. A ``location`` such as ``"B-04-2"`` or ``"B4 L2"`` reads as aisle ``B``, bay ``4``, level ``2``.
+Within a wave the lines are summed per product and visited aisle by aisle in a serpentine: up the
+bays of the first aisle, down the bays of the next. Products without a readable location come
+last. Orders are put into waves in the order of the first bin they need, so orders picked from
+the same part of the warehouse share a wave.
+"""
+import re
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import exists, or_
+from sqlmodel import select
+
+from model.delivery import Delivery, DeliveryCurrentStatus, DeliveryLine
+from model.orders import Order, OrderItem
+from model.product import Product
+
+PickLine = namedtuple("PickLine", "order_id product_id quantity")
+Bin = namedtuple("Bin", "name location unit_of_measurement")
+WAVE_SIZE = 20
+
+
+def location_key(location):
+    # "B-04-2" to ((1, 0, "B"), (0, 4, ""), (0, 2, "")), numbers compare as numbers; None if unreadable
+    parts = re.findall(r"\d+|[^\W\d_]+", location or "")
+    if not parts:
+        return None
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part.upper()) for part in parts)
+
+
+def walk(product_ids, bins):
+    # product_ids in serpentine order through the aisles
+    aisles = defaultdict(list)
+    unlocated = []
+    for product_id in product_ids:
+        key = location_key(bins[product_id].location)
+        if key is None:
+            unlocated.append(product_id)
+        else:
+            aisles[key[:1]].append((key[1:], product_id))
+    path = []
+    for rank, aisle in enumerate(sorted(aisles)):
+        stops = sorted(aisles[aisle], reverse=rank % 2 == 1)
+        path.extend(product_id for _, product_id in stops)
+    return path + sorted(unlocated, key=lambda product_id: (bins[product_id].name or "", product_id))
+
+
+def build_waves(lines, bins, wave_size=WAVE_SIZE):
+    by_order = defaultdict(list)
+    for line in lines:
+        by_order[line.order_id].append(line)
+    # the position of every product on one walk through the whole warehouse orders the orders
+    position = {product_id: i for i, product_id in enumerate(walk({line.product_id for line in lines}, bins))}
+    orders = sorted(by_order, key=lambda order_id: (min(position[line.product_id] for line in by_order[order_id]), order_id))
+    waves = []
+    for start in range(0, len(orders), wave_size):
+        order_ids = orders[start:start + wave_size]
+        quantities = defaultdict(lambda: defaultdict(float))
+        for order_id in order_ids:
+            for line in by_order[order_id]:
+                quantities[line.product_id][order_id] += line.quantity
+        waves.append({"wave": len(waves) + 1,
+                      "order_ids": sorted(order_ids),
+                      "picks": [{"product_id": product_id,
+                                 "name": bins[product_id].name,
+                                 "location": bins[product_id].location,
+                                 "unit_of_measurement": bins[product_id].unit_of_measurement,
+                                 "quantity": sum(quantities[product_id].values()),
+                                 "orders": [{"order_id": order_id, "quantity": quantity}
+                                            for order_id, quantity in sorted(quantities[product_id].items())]}
+                                for product_id in walk(quantities, bins)]})
+    return waves
+
+
+async def open_lines(session, organization_id, warehouse_id):
+    # what is still to be picked at the warehouse: the lines of the orders of /sales/warehouse_orders whose
+    # delivery is not packed yet, taken from delivery_line where the fulfilment planner split the order
+    bin_columns = (Product.name, Product.location, Product.unit_of_measurement)
+    planned = (select(Delivery.order_id, DeliveryLine.product_id, DeliveryLine.quantity, *bin_columns)
+               .join(Delivery, Delivery.id == DeliveryLine.delivery_id)
+               .join(Product, Product.id == DeliveryLine.product_id)
+               .outerjoin(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+               .where(Delivery.organization_id == organization_id)
+               .where(Delivery.warehouse_id == warehouse_id)
+               .where(Delivery.delivered_at.is_(None))
+               .where(or_(DeliveryCurrentStatus.status.is_(None), DeliveryCurrentStatus.status == "Pending")))
+    shipped = (select(Delivery.id)
+               .outerjoin(DeliveryCurrentStatus, DeliveryCurrentStatus.delivery_id == Delivery.id)
+               .where(Delivery.order_id == OrderItem.order_id)
+               .where(or_(DeliveryCurrentStatus.status != "Pending", Delivery.delivered_at.is_not(None)))
+               .exists())
+    unplanned = (select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, *bin_columns)
+                 .join(Order, Order.id == OrderItem.order_id)
+                 .join(Product, Product.id == OrderItem.product_id)
+                 .where(Order.organization_id == organization_id)
+                 .where(Product.warehouse_id == warehouse_id)
+                 .where(~exists().where(DeliveryLine.order_item_id == OrderItem.id))
+                 .where(~shipped))
+    lines, bins = [], {}
+    for statement in (planned, unplanned):
+        for order_id, product_id, quantity, name, location, unit in (await session.exec(statement)).all():
+            lines.append(PickLine(order_id, product_id, quantity))
+            bins[product_id] = Bin(name, location, unit)
+    return lines, bins
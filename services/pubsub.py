@@ -0,0 +1,123 @@
+"""Organization event feed.
+
+Writers queue events on their session with ``publish_on_commit``; they reach the broker only if the
+transaction commits. Every subscriber of this worker shares one subscription per channel on the
+broker and gets its own bounded queue, so N dashboard tabs cost one listener instead of N polling
+loops.
+
+``InProcessBroker`` delivers within the worker that committed. A broker over Postgres
+``LISTEN/NOTIFY`` only has to implement ``publish`` (NOTIFY) and ``_listen``/``_unlisten``
+(LISTEN/UNLISTEN on one connection whose callback calls ``_deliver``).
+"""
+import asyncio
+import contextlib
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 15))
+QUEUE_SIZE = 100
+PENDING = "pubsub_pending"
+
+
+class Broker(ABC):
+    def __init__(self):
+        self._callbacks = defaultdict(set)
+
+    @abstractmethod
+    def publish(self, channel, message):
+        ...
+
+    def _listen(self, channel):
+        pass
+
+    def _unlisten(self, channel):
+        pass
+
+    def _deliver(self, channel, message):
+        for callback in list(self._callbacks.get(channel, ())):
+            callback(message)
+
+    def subscribe(self, channel, callback):
+        # returns the function that unsubscribes again
+        if not self._callbacks[channel]:
+            self._listen(channel)
+        self._callbacks[channel].add(callback)
+
+        def unsubscribe():
+            callbacks = self._callbacks.get(channel)
+            if callbacks is None:
+                return
+            callbacks.discard(callback)
+            if not callbacks:
+                del self._callbacks[channel]
+                self._unlisten(channel)
+        return unsubscribe
+
+    @contextlib.asynccontextmanager
+    async def listen(self, channel, maxsize=QUEUE_SIZE):
+        queue = asyncio.Queue(maxsize)
+
+        def put(message):
+            # a tab that stopped reading loses its oldest events instead of holding up the writers
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+        unsubscribe = self.subscribe(channel, put)
+        try:
+            yield queue
+        finally:
+            unsubscribe()
+
+    @property
+    def channels(self):
+        return len(self._callbacks)
+
+
+class InProcessBroker(Broker):
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+
+
+broker = InProcessBroker()
+
+
+def organization_channel(organization_id):
+    return f"organization:{organization_id}"
+
+
+def publish_on_commit(session, organization_id, name, data):
+    # data is encoded now, the objects may change before the commit
+    session.sync_session.info.setdefault(PENDING, []).append(
+        (organization_channel(organization_id), {"event": name, "data": jsonable_encoder(data)}))
+
+
+@event.listens_for(Session, "after_commit")
+def publish_pending(session):
+    for channel, message in session.info.pop(PENDING, ()):
+        broker.publish(channel, message)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING, None)
+
+
+async def event_stream(channel, is_disconnected, heartbeat=SSE_HEARTBEAT):
+    # text/event-stream body; the comment lines keep proxies from closing an idle connection
+    async with broker.listen(channel) as queue:
+        yield "retry: 3000\n\n"
+        while not await is_disconnected():
+            try:
+                message = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
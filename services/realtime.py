@@ -0,0 +1,139 @@
+"""Live channel to the driver app.
+
+Drivers keep one WebSocket open on ``/delivery/ws`` instead of polling. The app streams GPS fixes
+and status transitions over it, and the server pushes assignment and instruction changes made
+with ``/delivery/update_delivery``.
+
+Fixes from all connected drivers are buffered and written together every ``GPS_FLUSH_INTERVAL``
+seconds, or as soon as ``GPS_FLUSH_SIZE`` are waiting, so 300 drivers sending a fix every 5 s cost
+about one INSERT per second instead of 60 commits. Fixes whose insert fails stay buffered for the
+next flush, up to ``GPS_BUFFER_LIMIT`` fixes: during a longer database outage the oldest fixes are
+dropped. The application flushes the hub once more when it shuts down.
+
+The hub only knows the sockets connected to this worker.
+"""
+import asyncio
+import heapq
+import logging
+import os
+from collections import defaultdict
+from typing import Annotated
+
+from fastapi import Depends
+from fastapi.encoders import jsonable_encoder
+
+from db import async_session_maker, naive_utc
+from services.gps import ingest_fixes
+
+GPS_FLUSH_INTERVAL = float(os.getenv('GPS_FLUSH_INTERVAL', 1.0))
+GPS_FLUSH_SIZE = int(os.getenv('GPS_FLUSH_SIZE', 500))
+GPS_BUFFER_LIMIT = int(os.getenv('GPS_BUFFER_LIMIT', 50000))
+
+logger = logging.getLogger(__name__)
+
+
+class DriverHub:
+    def __init__(self, session_maker, flush_interval=GPS_FLUSH_INTERVAL, flush_size=GPS_FLUSH_SIZE,
+                 buffer_limit=GPS_BUFFER_LIMIT):
+        self.session_maker = session_maker
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.buffer_limit = buffer_limit
+        self.accepted = 0
+        self.dropped = 0
+        self._sockets = defaultdict(set)
+        self._pending = defaultdict(list)
+        self._pending_count = 0
+        self._flusher = None
+
+    @property
+    def connections(self):
+        return sum(len(sockets) for sockets in self._sockets.values())
+
+    def connect(self, driver_id, websocket):
+        self._sockets[driver_id].add(websocket)
+
+    def disconnect(self, driver_id, websocket):
+        self._sockets[driver_id].discard(websocket)
+        if not self._sockets[driver_id]:
+            del self._sockets[driver_id]
+
+    async def send(self, driver_id, message):
+        # a driver may be connected from several devices, or from none
+        message = jsonable_encoder(message)
+        for websocket in list(self._sockets.get(driver_id, ())):
+            try:
+                await websocket.send_json(message)
+            except Exception:
+                self.disconnect(driver_id, websocket)
+
+    async def add_fixes(self, organization_id, fixes):
+        self._pending[organization_id].extend(fixes)
+        self._pending_count += len(fixes)
+        if self._pending_count >= self.flush_size:
+            if self._flusher is not None:
+                self._flusher.cancel()
+                self._flusher = None
+            await self.flush()
+        elif self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flusher = None
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending, self._pending_count = self._pending, defaultdict(list), 0
+        failed = False
+        for organization_id, fixes in pending.items():
+            try:
+                async with self.session_maker() as session:
+                    self.accepted += await ingest_fixes(session, organization_id, fixes, skip_unknown=True)
+                    await session.commit()
+            except Exception:
+                logger.exception("could not store %d GPS fixes of organization %s, retrying", len(fixes), organization_id)
+                # the drivers were told the fixes were accepted, keep them ahead of the ones that came in meanwhile
+                self._pending[organization_id][:0] = fixes
+                self._pending_count += len(fixes)
+                failed = True
+        if failed:
+            self._trim()
+            if self._flusher is None:
+                self._flusher = asyncio.create_task(self._flush_later())
+
+    def _trim(self):
+        # keeps the newest buffer_limit fixes of all organizations
+        excess = self._pending_count - self.buffer_limit
+        if excess <= 0:
+            return
+        oldest = {id(fix) for fix in heapq.nsmallest(
+            excess, (fix for fixes in self._pending.values() for fix in fixes), key=lambda fix: naive_utc(fix.timestamp))}
+        for organization_id, fixes in list(self._pending.items()):
+            self._pending[organization_id] = [fix for fix in fixes if id(fix) not in oldest]
+        self._pending_count -= excess
+        self.dropped += excess
+        logger.error("GPS buffer is full, dropped the %d oldest fixes", excess)
+
+    async def close(self):
+        # writes what is still buffered, called when the application shuts down
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._pending_count:
+            await self.flush()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._pending_count:
+            logger.error("dropping %d GPS fixes that could not be stored at shutdown", self._pending_count)
+
+
+hub = DriverHub(async_session_maker)
+
+
+def get_driver_hub():
+    return hub
+
+
+DriverHubDep = Annotated[DriverHub, Depends(get_driver_hub)]
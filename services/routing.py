@@ -0,0 +1,112 @@
+"""Stop order for a driver's deliveries.
+
+``plan_route`` starts at the source warehouse, builds a tour with nearest neighbour and improves it
+with 2-opt, each move evaluated for all segment ends at once with NumPy. The route is open: it
+ends at the last stop instead of returning to the warehouse.
+
+Pairwise distances come from ``DistanceCache``, a bounded LRU keyed by coordinate pairs, so
+replanning after one stop is added or delivered only computes the new pairs. It holds great
+circle distances today; road distances from a routing service would slot in the same way.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from services.dispatch import haversine
+
+ROUTE_CACHE_SIZE = int(os.getenv('ROUTE_CACHE_SIZE', 200000))
+# about 1 m, fixes that close are the same place
+PRECISION = 5
+
+
+class DistanceCache:
+    def __init__(self, maxsize=ROUTE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, points):
+        # km between every pair of (latitude, longitude) points
+        points = [(round(latitude, PRECISION), round(longitude, PRECISION)) for latitude, longitude in points]
+        count = len(points)
+        distances = np.zeros((count, count))
+        missing = []
+        with self._lock:
+            for i in range(count):
+                for j in range(i + 1, count):
+                    key = (points[i], points[j]) if points[i] <= points[j] else (points[j], points[i])
+                    distance = self._entries.get(key)
+                    if distance is None:
+                        missing.append((i, j, key))
+                        continue
+                    self._entries.move_to_end(key)
+                    distances[i, j] = distances[j, i] = distance
+            self.hits += count * (count - 1) // 2 - len(missing)
+            self.misses += len(missing)
+        if missing:
+            rows, columns, keys = zip(*missing)
+            array = np.array(points, dtype=float)
+            computed = haversine(array[list(rows)], array[list(columns)])
+            distances[rows, columns] = distances[columns, rows] = computed
+            with self._lock:
+                self._entries.update(zip(keys, computed.tolist()))
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return distances
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+distance_cache = DistanceCache()
+
+
+def nearest_neighbour(distances):
+    # tour over the matrix indexes starting at 0
+    count = len(distances)
+    visited = np.zeros(count, dtype=bool)
+    visited[0] = True
+    tour = [0]
+    for _ in range(count - 1):
+        remaining = np.where(visited, np.inf, distances[tour[-1]])
+        nearest = int(np.argmin(remaining))
+        visited[nearest] = True
+        tour.append(nearest)
+    return tour
+
+
+def two_opt(distances, tour):
+    # reverses tour[i:j + 1] while that shortens the open path, tour[0] stays first
+    tour = np.array(tour)
+    count = len(tour)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, count - 1):
+            j = np.arange(i + 1, count)
+            before, first, last = tour[i - 1], tour[i], tour[j]
+            after = tour[np.minimum(j + 1, count - 1)]
+            # reversing up to the end of the route drops the edge after it
+            open_end = j == count - 1
+            delta = (distances[before, last] - distances[before, first]
+                     + np.where(open_end, 0, distances[first, after] - distances[last, after]))
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                tour[i:j[best] + 1] = tour[i:j[best] + 1][::-1].copy()
+                improved = True
+    return tour.tolist()
+
+
+def plan_route(start, stops, cache=distance_cache):
+    # stops are (latitude, longitude) points; returns their order and the km of every leg
+    if not stops:
+        return [], []
+    distances = cache.matrix([start, *stops])
+    tour = two_opt(distances, nearest_neighbour(distances))
+    legs = [float(distances[a, b]) for a, b in zip(tour, tour[1:])]
+    return [index - 1 for index in tour[1:]], legs
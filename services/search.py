@@ -0,0 +1,78 @@
+"""Fuzzy name search.
+
+On Postgres the ``pg_trgm`` GIN indexes on ``product.name`` and ``supplier.company_name`` answer
+both the ``%`` similarity operator and ``ILIKE '%term%'``, so a search is an index lookup ranked by
+``similarity()``. Other databases (SQLite in the tests) get the same trigram ranking from
+``TrigramIndex``, built in process over the candidate rows.
+"""
+import os
+import re
+from collections import defaultdict
+
+from sqlalchemy import func, or_
+from sqlmodel import select
+
+SEARCH_THRESHOLD = float(os.getenv('SEARCH_THRESHOLD', 0.3))
+SEARCH_LIMIT = 20
+
+
+def trigrams(text):
+    # the same trigrams pg_trgm extracts: lower-cased words padded with two spaces in front and one behind
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TrigramIndex:
+    def __init__(self, entries=()):
+        self._grams = {}
+        self._texts = {}
+        self._postings = defaultdict(set)
+        for key, text in entries:
+            self.add(key, text)
+
+    def add(self, key, text):
+        grams = trigrams(text or "")
+        self._grams[key] = grams
+        self._texts[key] = (text or "").lower()
+        for gram in grams:
+            self._postings[gram].add(key)
+
+    def search(self, term, threshold=SEARCH_THRESHOLD, limit=SEARCH_LIMIT):
+        # returns (key, score) pairs, best first; a substring match always qualifies like ILIKE does
+        wanted = trigrams(term)
+        needle = term.lower()
+        candidates = set().union(*(self._postings.get(gram, ()) for gram in wanted)) if wanted else set()
+        candidates.update(key for key, text in self._texts.items() if needle and needle in text)
+        results = []
+        for key in candidates:
+            grams = self._grams[key]
+            score = len(wanted & grams) / len(wanted | grams) if wanted and grams else 0.0
+            if score >= threshold or needle in self._texts[key]:
+                results.append((key, score))
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results[:limit]
+
+
+async def fuzzy_search(session, model, column, term, *filters, threshold=SEARCH_THRESHOLD, limit=SEARCH_LIMIT):
+    if session.bind.dialect.name == "postgresql":
+        # % compares against pg_trgm.similarity_threshold, set for this transaction only
+        await session.exec(select(func.set_config("pg_trgm.similarity_threshold", str(threshold), True)))
+        return (await session.exec(
+            select(model).where(*filters)
+            .where(or_(column.op("%")(term), column.icontains(term, autoescape=True)))
+            .order_by(func.similarity(column, term).desc(), model.id)
+            .limit(limit))).all()
+    index = TrigramIndex((await session.exec(select(model.id, column).where(*filters))).all())
+    ranked = [key for key, _ in index.search(term, threshold, limit)]
+    rows = {row.id: row for row in (await session.exec(select(model).where(model.id.in_(ranked)))).all()}
+    return [rows[key] for key in ranked]
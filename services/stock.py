@@ -0,0 +1,63 @@
+from collections import defaultdict
+
+from sqlalchemy import update
+from sqlmodel import select
+
+from model.product import Product
+from services import inventory
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f"Insufficient stock for product {product_id}")
+
+
+class UnknownProduct(Exception):
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f"Product {product_id} does not exist.")
+
+
+def quantities(items):
+    totals = defaultdict(float)
+    for item in items:
+        totals[item.product_id] += item.quantity
+    return totals
+
+
+async def reserve(session, organization_id, product_quantities, reason="sale", reference_id=None, user_id=None):
+    # Decrement stock with conditional UPDATEs, the row lock makes concurrent clerks queue instead of
+    # overwriting each other. Products are locked in id order so two orders can not deadlock.
+    # The movements are appended to the inventory ledger.
+    # Returns the sales price of every product; raises UnknownProduct for a product that is not the
+    # organization's, InsufficientStock otherwise, and leaves rolling back to the caller.
+    if not product_quantities:
+        return {}
+    known = set((await session.exec(select(Product.id).where(Product.id.in_(product_quantities))
+                                    .where(Product.organization_id == organization_id))).all())
+    missing = sorted(set(product_quantities) - known)
+    if missing:
+        raise UnknownProduct(missing[0])
+    prices = {}
+    for product_id in sorted(product_quantities):
+        quantity = product_quantities[product_id]
+        statement = (update(Product)
+                     .where(Product.id == product_id)
+                     .where(Product.organization_id == organization_id)
+                     .values(quantity=Product.quantity - quantity))
+        if quantity > 0:
+            statement = statement.where(Product.quantity >= quantity)
+        price = (await session.exec(statement.returning(Product.sales_price))).first()
+        if price is None:
+            raise InsufficientStock(product_id)
+        prices[product_id] = price[0]
+    await inventory.append(session, organization_id, {product_id: -quantity for product_id, quantity in product_quantities.items()},
+                           reason, reference_id, user_id)
+    return prices
+
+
+async def release(session, organization_id, items, reference_id=None, user_id=None):
+    # gives the stock reserved by order lines that are being deleted back, the caller commits
+    await reserve(session, organization_id, {product_id: -quantity for product_id, quantity in quantities(items).items()},
+                  reference_id=reference_id, user_id=user_id)
@@ -1,7 +1,98 @@
+import asyncio
+import uuid
+
 import pytest
+import sqlalchemy as sa
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from auth import get_current_user
+from db import get_async_session
 from main import app
+from services.realtime import DriverHub, get_driver_hub
+
+ORGANIZATION_ID = 1
+USER_ID = uuid.UUID("00000000-0000-0000-0000-000000000001")
+
+# Supabase keeps its users in auth.users, SQLite only needs the table to exist in the metadata
+if "auth.users" not in SQLModel.metadata.tables:
+    sa.Table("users", SQLModel.metadata, sa.Column("id", sa.Uuid, primary_key=True), schema="auth")
+
 
 @pytest.fixture
 def client():
     return TestClient(app)
+
+
+@pytest.fixture
+def db_engine():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool,
+                                 connect_args={"check_same_thread": False})
+    tables = [t for t in SQLModel.metadata.sorted_tables if t.schema is None]
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all, tables=tables)
+
+    asyncio.run(create_tables())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def db_session_maker(db_engine):
+    return async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+def current_user():
+    return {"sub": USER_ID, "user_role": "admin", "user_metadata": {"organization_id": ORGANIZATION_ID}}
+
+
+@pytest.fixture
+def hub(db_session_maker):
+    # fixes are written once three are waiting, the timer never fires during a test
+    return DriverHub(db_session_maker, flush_interval=60, flush_size=3)
+
+
+@pytest.fixture
+def api(db_session_maker, current_user, hub):
+    async def override_session():
+        async with db_session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = override_session
+    app.dependency_overrides[get_current_user] = lambda: current_user
+    app.dependency_overrides[get_driver_hub] = lambda: hub
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def seed(db_session_maker):
+    def add(*rows):
+        async def insert():
+            async with db_session_maker() as session:
+                session.add_all(rows)
+                await session.commit()
+                for row in rows:
+                    await session.refresh(row)
+        asyncio.run(insert())
+        return rows
+    return add
+
+
+@pytest.fixture
+def queries(db_engine):
+    # statements sent to the database while the test runs
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa.event.listen(db_engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    sa.event.remove(db_engine.sync_engine, "before_cursor_execute", record)
@@ -0,0 +1,63 @@
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import auth
+from db import SUPABASE_JWT_SECRET
+
+
+def credentials(**claims):
+    token = jwt.encode({"sub": "driver-1", **claims}, SUPABASE_JWT_SECRET, algorithm="HS256")
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    auth.token_cache.clear()
+    yield
+    auth.token_cache.clear()
+
+
+def test_second_request_is_served_from_cache():
+    creds = credentials(exp=int(time.time()) + 3600)
+    assert auth.get_current_user(creds)["sub"] == "driver-1"
+    assert auth.get_current_user(creds)["sub"] == "driver-1"
+    assert auth.token_cache.stats()["hits"] == 1
+    assert auth.token_cache.stats()["misses"] == 1
+
+
+def test_changing_a_payload_does_not_change_the_cache():
+    creds = credentials(exp=int(time.time()) + 3600, user_metadata={"organization_id": 1})
+    auth.get_current_user(creds)["user_metadata"]["organization_id"] = 2
+    cached = auth.get_current_user(creds)
+    cached["user_metadata"]["organization_id"] = 3
+    assert auth.get_current_user(creds)["user_metadata"] == {"organization_id": 1}
+
+
+def test_cached_token_is_dropped_at_exp(monkeypatch):
+    exp = int(time.time()) + 3600
+    creds = credentials(exp=exp)
+    auth.get_current_user(creds)
+    monkeypatch.setattr(auth.time, "time", lambda: exp)
+    assert auth.token_cache.get(next(iter(auth.token_cache._entries))) is None
+    assert auth.token_cache.stats()["size"] == 0
+
+
+def test_expired_and_forged_tokens_are_rejected():
+    with pytest.raises(HTTPException) as expired:
+        auth.get_current_user(credentials(exp=int(time.time()) - 10))
+    assert expired.value.detail == "Token has expired"
+    forged = jwt.encode({"sub": "driver-1", "exp": int(time.time()) + 60}, "not-the-secret", algorithm="HS256")
+    with pytest.raises(HTTPException):
+        auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=forged))
+    assert auth.token_cache.stats()["size"] == 0
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth.token_cache, "maxsize", 2)
+    for i in range(3):
+        auth.get_current_user(credentials(exp=int(time.time()) + 3600, n=i))
+    assert auth.token_cache.stats()["size"] == 2
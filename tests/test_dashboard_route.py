@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from model.delivery import Delivery
+from model.orders import Order, Transaction
+from model.product import Product
+from model.rfq import RFQ, Quotation
+from model.user import Client, Supplier
+from model.warehouse import Warehouse
+from services import kpi
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+def seed_organization(seed):
+    warehouse, = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID))
+    product, client, supplier = seed(
+        Product(name="Teff", unit_of_measurement="kg", warehouse_id=warehouse.id, organization_id=ORGANIZATION_ID),
+        Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", organization_id=ORGANIZATION_ID),
+        Supplier(company_name="Abyssinia Mills", contact_person_name="Almaz", email="mills@example.com", phone="0912"))
+    last_week = datetime.now() - timedelta(days=7)
+    today, old, _ = seed(Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID),
+                         Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID, order_date=last_week),
+                         Order(client_id=client.id, user_id=USER_ID, organization_id=2))
+    rfq, = seed(RFQ(product_id=product.id, required_quantity=10, organization_id=ORGANIZATION_ID))
+    seed(Transaction(order_id=today.id, payment_amount=120, payment_method="Cash", organization_id=ORGANIZATION_ID),
+         Transaction(order_id=old.id, payment_amount=80, payment_method="Cash", organization_id=ORGANIZATION_ID),
+         Delivery(order_id=today.id, organization_id=ORGANIZATION_ID, delivered_at=datetime.now()),
+         Delivery(order_id=old.id, organization_id=ORGANIZATION_ID, delivered_at=last_week),
+         Quotation(supplier_id=supplier.id, rfq_id=rfq.id, price=5, quantity=10, selected=True),
+         Quotation(supplier_id=supplier.id, rfq_id=rfq.id, price=4, quantity=10, selected=False))
+    return client, rfq, supplier
+
+
+def rebuild(db_session_maker):
+    async def run():
+        async with db_session_maker() as session:
+            await kpi.rebuild(session, ORGANIZATION_ID)
+    asyncio.run(run())
+
+
+def test_summary_after_rebuild(api, seed, db_session_maker):
+    seed_organization(seed)
+    rebuild(db_session_maker)
+    assert api.get("/dashboard/summary").json() == {
+        "total_revenue": 200.0,
+        "total_expense": 50.0,
+        "total_orders": 2,
+        "total_orders_today": 1,
+        "total_shipments": 2,
+        "total_shipments_today": 1,
+        "total_products": 1,
+        "total_warehouse": 1,
+        "total_drivers": 0,
+    }
+
+
+def test_write_endpoints_keep_counters_in_step_with_rebuild(api, seed, db_session_maker):
+    client, rfq, supplier = seed_organization(seed)
+    rebuild(db_session_maker)
+
+    order = api.post("/sales/create_order", data={"client_id": client.id}).json()
+    api.post("/sales/create_transaction", data={"order_id": order["id"], "payment_amount": 30, "payment_method": "Cash"})
+    quotation = api.post("/procurement/create_quotation",
+                         data={"supplier_id": supplier.id, "rfq_id": rfq.id, "price": 2, "quantity": 5}).json()
+    api.post("/procurement/select_quotation", params={"quotation_id": quotation["id"]})
+    api.post("/admin/create_warehouse", data={"name": "Merkato"})
+    delivery = api.post("/delivery/create_delivery", data={"order_id": order["id"]}).json()
+    api.post("/delivery/update_delivery", data={"id": delivery["id"], "delivered_at": datetime.now().isoformat()})
+    api.request("DELETE", "/sales/delete_order", data={"order_id": order["id"]})
+
+    incremental = api.get("/dashboard/summary").json()
+    assert incremental["total_revenue"] == 230.0
+    assert incremental["total_expense"] == 60.0
+    assert incremental["total_warehouse"] == 2
+    assert incremental["total_shipments_today"] == 2
+    rebuild(db_session_maker)
+    assert api.get("/dashboard/summary").json() == incremental
+
+
+def test_selected_quotations_count_as_expense(api, seed):
+    client, rfq, supplier = seed_organization(seed)
+    quotation = api.post("/procurement/create_quotation", data={
+        "supplier_id": supplier.id, "rfq_id": rfq.id, "price": 3, "quantity": 4, "selected": "true"}).json()
+    assert quotation["selected"] is True
+    assert api.get("/dashboard/total_expense").json() == 12.0
+
+    quotation = api.post("/procurement/update_quotation", data={
+        "id": quotation["id"], "rfq_id": rfq.id, "price": 3, "quantity": 5, "selected": "false"}).json()
+    assert quotation["selected"] is False
+    assert api.get("/dashboard/total_expense").json() == 0.0
+
+
+def test_timeseries_buckets(api, seed):
+    client, rfq, supplier = seed_organization(seed)
+    march_2, march_9 = datetime(2024, 3, 2, 10, 30), datetime(2024, 3, 9, 16)
+    first, second = seed(Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID, order_date=march_2),
+                         Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID, order_date=march_9))
+    seed(Transaction(order_id=first.id, payment_amount=40, payment_method="Cash", organization_id=ORGANIZATION_ID,
+                     time=march_2),
+         Transaction(order_id=first.id, payment_amount=60, payment_method="Cash", organization_id=ORGANIZATION_ID,
+                     time=march_2 + timedelta(hours=1)),
+         Transaction(order_id=second.id, payment_amount=25, payment_method="Cash", organization_id=2, time=march_9),
+         Delivery(order_id=first.id, organization_id=ORGANIZATION_ID, delivered_at=march_9),
+         Quotation(supplier_id=supplier.id, rfq_id=rfq.id, price=3, quantity=10, selected=True, created_at=march_9))
+
+    days = api.get("/dashboard/timeseries", params={"bucket": "day", "start": "2024-03-01", "end": "2024-03-10"}).json()
+    assert len(days) == 9
+    assert days[1] == {"bucket": "2024-03-02T00:00:00", "revenue": 100.0, "orders": 1, "delivered": 0,
+                       "procurement_spend": 0.0}
+    assert days[8] == {"bucket": "2024-03-09T00:00:00", "revenue": 0.0, "orders": 1, "delivered": 1,
+                       "procurement_spend": 30.0}
+
+    weeks = api.get("/dashboard/timeseries", params={"bucket": "week", "start": "2024-03-01", "end": "2024-03-10"}).json()
+    assert [(w["bucket"], w["orders"], w["revenue"]) for w in weeks] == [
+        ("2024-02-26T00:00:00", 1, 100.0), ("2024-03-04T00:00:00", 1, 0.0)]
+
+    hours = api.get("/dashboard/timeseries",
+                    params={"bucket": "hour", "start": "2024-03-02T10:00", "end": "2024-03-02T12:00"}).json()
+    assert [h["revenue"] for h in hours] == [40.0, 60.0]
+
+    months = api.get("/dashboard/timeseries", params={"bucket": "month", "start": "2024-01-15", "end": "2024-04-01"}).json()
+    assert [(m["bucket"], m["orders"]) for m in months] == [
+        ("2024-01-01T00:00:00", 0), ("2024-02-01T00:00:00", 0), ("2024-03-01T00:00:00", 2)]
+
+    assert api.get("/dashboard/timeseries", params={"bucket": "year"}).json()["status_code"] == 400
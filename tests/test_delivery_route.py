@@ -0,0 +1,167 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from model.delivery import Delivery, DeliveryStatusUpdate
+from model.organization import Organization
+from model.user import Driver
+from services import delivery_status, gps
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+def test_form_values_are_stored_with_column_types(api):
+    delivery = api.post("/delivery/create_delivery", data={"order_id": "1"}).json()
+    response = api.post("/delivery/update_delivery",
+                        data={"id": delivery["id"], "driver_id": "4", "delivered_at": "2026-10-18T11:30:00+03:00"})
+    assert response.status_code == 200, response.text
+    assert response.json()["driver_id"] == 4
+    assert response.json()["delivered_at"] == "2026-10-18T08:30:00"
+
+
+def test_bad_form_values_are_rejected_before_the_handler(api):
+    response = api.post("/delivery/create_delivery", data={"order_id": "1", "driver_id": "four"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "driver_id"]
+
+
+def rebuild(db_session_maker):
+    async def run():
+        async with db_session_maker() as session:
+            await delivery_status.rebuild(session)
+    asyncio.run(run())
+
+
+def test_deliveries_driver_is_one_query(api, seed, queries, db_session_maker):
+    start = datetime(2024, 3, 1, 8)
+    deliveries = seed(*[Delivery(organization_id=ORGANIZATION_ID, driver_id=7, destination_name=f"Stop {i}")
+                        for i in range(5)], Delivery(organization_id=ORGANIZATION_ID, driver_id=8))
+    history = {0: ["Pending", "Packed"], 1: ["Packed", "In Transit"], 2: ["Packed", "In Transit", "Delivered"],
+               3: ["Pending"], 4: ["Packed", "Delayed"], 5: ["Packed"]}
+    seed(*[DeliveryStatusUpdate(delivery_id=deliveries[i].id, delivery_status=status, timestamp=start + timedelta(hours=h))
+           for i, statuses in history.items() for h, status in enumerate(statuses)])
+
+    rebuild(db_session_maker)
+
+    queries.clear()
+    response = api.get("/delivery/deliveries_driver", params={"driver_id": 7}).json()
+    assert len(queries) == 1
+    assert [(d["id"], d["delivery_status"]) for d in response] == [
+        (deliveries[0].id, "Packed"), (deliveries[1].id, "In Transit"), (deliveries[4].id, "Delayed")]
+    assert response[0]["destination_name"] == "Stop 0"
+    history = api.get("/delivery/deliveries_driver_history", params={"driver_id": 7}).json()
+    assert [d["id"] for d in history] == [deliveries[2].id]
+
+
+def test_status_endpoints_keep_current_status(api, db_session_maker):
+    delivery = api.post("/delivery/create_delivery", data={"order_id": 1}).json()
+    api.post("/delivery/update_delivery", data={"id": delivery["id"], "driver_id": 3})
+    api.post("/delivery/delivery_packed", params={"delivery_id": delivery["id"]})
+    api.post("/delivery/delivery_picked_up", params={"delivery_id": delivery["id"]})
+    # a status synced late from an offline phone does not replace the newer one
+    api.post("/delivery/create_delivery_status", data={"delivery_id": delivery["id"], "delivery_status": "Packed",
+                                                        "timestamp": "2020-01-01T00:00:00"})
+    assert api.get("/delivery/deliveries_driver", params={"driver_id": 3}).json()[0]["delivery_status"] == "In Transit"
+
+    api.post("/delivery/update_delivery", data={"id": delivery["id"], "driver_id": 4})
+    assert api.get("/delivery/deliveries_driver", params={"driver_id": 3}).json() == []
+    delivered = api.post("/delivery/delivery_delivered", params={"delivery_id": delivery["id"]}).json()
+    assert api.get("/delivery/get_latest_delivery_status_update",
+                   params={"delivery_id": delivery["id"]}).json()["id"] == delivered["id"]
+    assert [d["id"] for d in api.get("/delivery/deliveries_driver_history", params={"driver_id": 4}).json()] == [delivery["id"]]
+
+    api.request("DELETE", "/delivery/delete_delivery_status", data={"delivery_status_update_id": delivered["id"]})
+    assert api.get("/delivery/deliveries_driver", params={"driver_id": 4}).json()[0]["delivery_status"] == "In Transit"
+
+    incremental = api.get("/delivery/get_latest_delivery_status_update", params={"delivery_id": delivery["id"]}).json()
+    rebuild(db_session_maker)
+    assert api.get("/delivery/get_latest_delivery_status_update", params={"delivery_id": delivery["id"]}).json() == incremental
+
+
+def test_deleting_the_current_status_falls_back_to_the_previous_one(api, seed, db_engine):
+    seed(Organization(id=ORGANIZATION_ID, org_name="Kaldis"))
+    delivery, = seed(Delivery(organization_id=ORGANIZATION_ID))
+    packed = api.post("/delivery/delivery_packed", params={"delivery_id": delivery.id}).json()
+    picked_up = api.post("/delivery/delivery_picked_up", params={"delivery_id": delivery.id}).json()
+
+    async def enforce_foreign_keys():
+        async with db_engine.connect() as conn:
+            await conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+    asyncio.run(enforce_foreign_keys())
+    assert api.request("DELETE", "/delivery/delete_delivery_status",
+                       data={"delivery_status_update_id": picked_up["id"]}).json() == {
+        "message": "Delivery status update deleted successfully"}
+    assert api.get("/delivery/get_latest_delivery_status_update",
+                   params={"delivery_id": delivery.id}).json()["id"] == packed["id"]
+
+
+def test_gps_batch_skips_fixes_already_stored(api, seed, queries):
+    delivery, other = seed(Delivery(organization_id=ORGANIZATION_ID), Delivery(organization_id=2))
+    status, foreign = seed(DeliveryStatusUpdate(delivery_id=delivery.id, delivery_status="In Transit"),
+                           DeliveryStatusUpdate(delivery_id=other.id, delivery_status="In Transit"))
+    fixes = [{"delivery_status_id": status.id, "latitude": 9.0 + i / 1000, "longitude": 38.7,
+              "timestamp": f"2024-03-01T08:{i:02d}:00"} for i in range(50)]
+
+    queries.clear()
+    assert api.post("/delivery/add_gps_batch", json=fixes[:30] + fixes[:5]).json() == {
+        "received": 35, "accepted": 30, "duplicates": 5}
+    assert len([q for q in queries if q.lstrip().upper().startswith("INSERT")]) == 1
+    # the same instant in another timezone is the same fix
+    retry = fixes[20:] + [{**fixes[0], "timestamp": "2024-03-01T11:00:00+03:00"}]
+    assert api.post("/delivery/add_gps_batch", json=retry).json() == {"received": 31, "accepted": 20, "duplicates": 11}
+    trail = api.get("/delivery/get_delivery_gps", params={"delivery_status_id": status.id}).json()
+    assert len(trail) == 50
+
+    response = api.post("/delivery/add_gps_batch", json=[{**fixes[0], "delivery_status_id": foreign.id}])
+    assert response.json()["detail"] == f"Delivery status updates [{foreign.id}] do not exist."
+    assert api.post("/delivery/add_gps_batch", json=[{**fixes[0], "latitude": 91}]).status_code == 422
+
+
+def test_drivers_only_report_fixes_for_their_own_deliveries(api, seed, current_user):
+    mine, theirs = seed(Driver(name="abebe", email="abebe@example.com", phone="0911", car_license_plate="AA-1",
+                               driver_license_id="DL-1", driver_id=USER_ID),
+                        Driver(name="kebede", email="kebede@example.com", phone="0912", car_license_plate="AA-2",
+                               driver_license_id="DL-2"))
+    own, other = seed(Delivery(organization_id=ORGANIZATION_ID, driver_id=mine.id),
+                      Delivery(organization_id=ORGANIZATION_ID, driver_id=theirs.id))
+    status, foreign = seed(DeliveryStatusUpdate(delivery_id=own.id, delivery_status="In Transit"),
+                           DeliveryStatusUpdate(delivery_id=other.id, delivery_status="In Transit"))
+    current_user["user_role"] = "driver"
+    fix = {"delivery_status_id": status.id, "latitude": 9.0, "longitude": 38.7, "timestamp": "2024-03-01T08:00:00"}
+
+    response = api.post("/delivery/add_gps_batch", json=[fix, {**fix, "delivery_status_id": foreign.id}])
+    assert response.json()["detail"] == f"Delivery status updates [{foreign.id}] do not exist."
+    assert "detail" in api.post("/delivery/add_gps", data={**fix, "delivery_status_id": foreign.id}).json()
+    # a retried single fix is stored once and answered with the stored row
+    stored = api.post("/delivery/add_gps", data=fix).json()
+    assert api.post("/delivery/add_gps", data=fix).json() == stored
+    assert [f["id"] for f in api.get("/delivery/get_delivery_gps", params={"delivery_status_id": status.id}).json()] == [stored["id"]]
+
+
+def test_fleet_shows_the_newest_fix_of_each_driver(api, seed, queries, db_session_maker):
+    drivers = seed(*[Driver(name=name, email=f"{name}@example.com", phone="0911", car_license_plate=f"AA-{i}",
+                            driver_license_id=f"DL-{i}") for i, name in enumerate(["abebe", "kebede"])])
+    first, second, other = seed(Delivery(organization_id=ORGANIZATION_ID, driver_id=drivers[0].id),
+                                Delivery(organization_id=ORGANIZATION_ID, driver_id=drivers[1].id),
+                                Delivery(organization_id=2, driver_id=drivers[1].id))
+    statuses = seed(*[DeliveryStatusUpdate(delivery_id=d.id, delivery_status="In Transit") for d in (first, second)])
+
+    def fix(status, minute, latitude):
+        return {"delivery_status_id": status.id, "latitude": latitude, "longitude": 38.7,
+                "timestamp": f"2024-03-01T08:{minute:02d}:00"}
+
+    api.post("/delivery/add_gps_batch", json=[fix(statuses[0], 5, 9.05), fix(statuses[0], 1, 9.01), fix(statuses[1], 3, 9.3)])
+    # an older fix arriving late does not move the driver back
+    api.post("/delivery/add_gps_batch", json=[fix(statuses[0], 2, 9.02)])
+    api.post("/delivery/add_gps", data={"delivery_status_id": statuses[1].id, "latitude": 9.4, "longitude": 38.8,
+                                        "timestamp": "2024-03-01T08:04:00"})
+
+    queries.clear()
+    fleet = api.get("/delivery/fleet").json()
+    assert len(queries) == 1
+    assert [(p["driver_name"], p["delivery_id"], p["latitude"], p["timestamp"]) for p in fleet] == [
+        ("abebe", first.id, 9.05, "2024-03-01T08:05:00"), ("kebede", second.id, 9.4, "2024-03-01T08:04:00")]
+
+    async def rebuild_positions():
+        async with db_session_maker() as session:
+            return await gps.rebuild(session)
+    assert asyncio.run(rebuild_positions()) == 2
+    assert api.get("/delivery/fleet").json() == fleet
@@ -0,0 +1,62 @@
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from model.delivery import Delivery, DriverLastPosition
+from model.organization import UserOrganization
+from model.user import Driver
+from services import dispatch
+from services.dispatch import AvailableDriver, OpenDelivery
+from tests.conftest import ORGANIZATION_ID
+
+
+def test_haversine_broadcasts():
+    assert dispatch.haversine(np.array([0.0, 0.0]), np.array([1.0, 0.0])) == pytest.approx(111.195, abs=0.001)
+    matrix = dispatch.haversine(np.zeros((3, 1, 2)), np.array([[[0.0, 1.0], [0.0, 2.0]]]))
+    assert matrix.shape == (3, 2)
+
+
+def test_assign_minimises_the_total_distance():
+    # nearest-first would give driver 1 the delivery at 0.1 and send driver 2 across to 0.0
+    deliveries = [OpenDelivery(10, 9.0, 38.70, None, None), OpenDelivery(11, 9.0, 38.80, None, None)]
+    drivers = [AvailableDriver(1, 9.0, 38.75, 1), AvailableDriver(2, 9.0, 38.90, 1)]
+    assignments, unassigned = dispatch.assign(deliveries, drivers)
+    assert sorted((a.delivery_id, a.driver_id) for a in assignments) == [(10, 1), (11, 2)]
+    assert unassigned == []
+
+    assignments, unassigned = dispatch.assign(deliveries, [AvailableDriver(1, 9.0, 38.75, 2), AvailableDriver(2, 9.0, 38.9, 0)])
+    assert {a.driver_id for a in assignments} == {1} and len(assignments) == 2
+    assignments, unassigned = dispatch.assign(deliveries, drivers[1:], max_pickup_km=15)
+    assert [(a.delivery_id, a.driver_id) for a in assignments] == [(11, 2)] and unassigned == [10]
+
+
+def test_auto_assign_dry_run_then_apply(api, seed):
+    users = [uuid.uuid4() for _ in range(2)]
+    seed(*[UserOrganization(user_id=user, organization_id=ORGANIZATION_ID) for user in users])
+    drivers = seed(*[Driver(name=f"driver {i}", driver_id=user, email=f"d{i}@example.com", phone="0911",
+                            car_license_plate=f"AA-{i}", driver_license_id=f"DL-{i}") for i, user in enumerate(users)])
+    seed(*[DriverLastPosition(driver_id=driver.id, organization_id=ORGANIZATION_ID, delivery_id=0, delivery_status_id=0,
+                              latitude=9.0, longitude=longitude, timestamp=datetime(2024, 3, 1, 8))
+           for driver, longitude in zip(drivers, (38.70, 38.90))])
+    deliveries = seed(*[Delivery(organization_id=ORGANIZATION_ID, destination_latitude=9.0, destination_longitude=longitude)
+                        for longitude in (38.71, 38.89, 38.72)], Delivery(organization_id=ORGANIZATION_ID))
+
+    plan = api.post("/delivery/auto_assign", params={"capacity": 2}).json()
+    expected = [(deliveries[0].id, drivers[0].id), (deliveries[1].id, drivers[1].id), (deliveries[2].id, drivers[0].id)]
+    assert plan["dry_run"] is True
+    assert sorted((a["delivery_id"], a["driver_id"]) for a in plan["assignments"]) == expected
+    assert api.get("/delivery/delivery", params={"delivery_id": deliveries[0].id}).json()["driver_id"] is None
+
+    applied = api.post("/delivery/auto_assign", params={"capacity": 2, "dry_run": False}).json()
+    assert applied["assignments"] == plan["assignments"]
+    for delivery_id, driver_id in expected:
+        assert api.get("/delivery/delivery", params={"delivery_id": delivery_id}).json()["driver_id"] == driver_id
+        assert api.get("/delivery/get_latest_delivery_status_update",
+                       params={"delivery_id": delivery_id}).json()["delivery_status"] == "Pending"
+
+    # driver 0 is full, the next delivery goes to driver 1 although it is nearer to driver 0
+    late, = seed(Delivery(organization_id=ORGANIZATION_ID, destination_latitude=9.0, destination_longitude=38.70))
+    plan = api.post("/delivery/auto_assign", params={"capacity": 2}).json()
+    assert [(a["delivery_id"], a["driver_id"]) for a in plan["assignments"]] == [(late.id, drivers[1].id)]
@@ -0,0 +1,89 @@
+from model.delivery import Delivery
+from model.orders import Order, OrderItem
+from model.product import Product
+from model.warehouse import Warehouse
+from services import fulfilment
+from services.fulfilment import Line, StockLevels
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+TEFF, OIL = ("teff", "kg"), ("oil", "l")
+
+
+def levels():
+    # warehouse 1 is far but has everything, 2 and 3 are near and hold one item each
+    return StockLevels([(10, 1, TEFF, 50), (11, 1, OIL, 20), (20, 2, TEFF, 100), (30, 3, OIL, 100)],
+                       {1: (9.10, 38.70), 2: (9.01, 38.75), 3: (9.01, 38.76)})
+
+
+def test_one_warehouse_is_preferred_over_a_nearer_split():
+    shipments = fulfilment.plan_order([Line(1, 20, TEFF, 30), Line(2, 30, OIL, 10)], levels(), (9.0, 38.75))
+    assert [(s.warehouse_id, [(p.order_item_id, p.product_id, p.quantity) for p in s.lines]) for s in shipments] == \
+        [(1, [(1, 10, 30), (2, 11, 10)])]
+
+
+def test_orders_are_split_when_no_warehouse_has_everything_and_short_orders_keep_their_stock():
+    stock = levels()
+    # the teff was reserved at warehouse 2, which sends it all; the oil reserved at 3 comes from 3
+    first = fulfilment.plan_order([Line(1, 20, TEFF, 80), Line(2, 30, OIL, 10)], stock, (9.0, 38.75))
+    assert [s.warehouse_id for s in first] == [2, 3]
+    assert stock.available == {10: 50, 11: 20, 20: 100, 30: 100}
+    # 99 has no warehouse, the 150 kg of teff elsewhere are not enough
+    assert fulfilment.plan_order([Line(3, 99, TEFF, 200)], stock) is None
+    assert stock.available == {10: 50, 11: 20, 20: 100, 30: 100}
+    # without a destination the warehouse that holds the reservation wins a tie
+    second, = fulfilment.plan_order([Line(4, 10, TEFF, 10)], stock)
+    assert second.warehouse_id == 1 and stock.available[10] == 50
+
+
+def test_plan_fulfilment_creates_a_delivery_per_warehouse(api, seed):
+    near, far = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID, latitude=9.01, longitude=38.75),
+                     Warehouse(name="Merkato", organization_id=ORGANIZATION_ID, latitude=9.10, longitude=38.70))
+    # quantities are what is left after the orders below reserved their lines
+    near_teff, near_oil, far_teff, salt = seed(
+        Product(name="Teff", unit_of_measurement="kg", warehouse_id=near.id, organization_id=ORGANIZATION_ID, quantity=5),
+        Product(name="Oil", unit_of_measurement="l", warehouse_id=near.id, organization_id=ORGANIZATION_ID, quantity=0),
+        Product(name="teff ", unit_of_measurement="KG", warehouse_id=far.id, organization_id=ORGANIZATION_ID, quantity=2),
+        Product(name="Salt", unit_of_measurement="kg", organization_id=ORGANIZATION_ID, quantity=0))
+    order, short = seed(Order(client_id=1, user_id=USER_ID, organization_id=ORGANIZATION_ID, status="Succeeded"),
+                        Order(client_id=1, user_id=USER_ID, organization_id=ORGANIZATION_ID, status="Succeeded"))
+    seed(OrderItem(order_id=order.id, product_id=far_teff.id, quantity=8, price=1),
+         OrderItem(order_id=order.id, product_id=near_oil.id, quantity=3, price=1),
+         OrderItem(order_id=short.id, product_id=salt.id, quantity=1, price=1))
+    paid, = seed(Delivery(order_id=order.id, organization_id=ORGANIZATION_ID, destination_name="Kaldis",
+                          destination_latitude=9.0, destination_longitude=38.75))
+
+    plan = api.post("/delivery/plan_fulfilment").json()
+    assert plan["dry_run"] is True and plan["short"] == [short.id] and plan["split_orders"] == 1
+    # neither warehouse has everything, the nearer one sends the oil and what teff it has
+    shipments = plan["orders"][0]["shipments"]
+    assert [(s["warehouse_id"], s["delivery_id"]) for s in shipments] == [(near.id, None), (far.id, None)]
+    assert [(line["product_id"], line["quantity"]) for line in shipments[0]["lines"]] == [(near_teff.id, 5), (near_oil.id, 3)]
+    assert [(line["product_id"], line["quantity"]) for line in shipments[1]["lines"]] == [(far_teff.id, 3)]
+    assert api.get("/delivery/delivery", params={"delivery_id": paid.id}).json()["warehouse_id"] is None
+
+    applied = api.post("/delivery/plan_fulfilment", params={"dry_run": False}).json()
+    first, second = (s["delivery_id"] for s in applied["orders"][0]["shipments"])
+    assert first == paid.id
+    split = api.get("/delivery/delivery", params={"delivery_id": second}).json()
+    assert (split["warehouse_id"], split["order_id"], split["destination_name"]) == (far.id, order.id, "Kaldis")
+    assert api.get("/delivery/delivery_source", params={"delivery_id": paid.id}).json()[0]["id"] == near.id
+    # the teff reservation moved from the far to the near warehouse
+    stock = {p.id: api.get("/product_id", params={"product_id": p.id}).json()[0]["quantity"] for p in (near_teff, near_oil, far_teff)}
+    assert stock == {near_teff.id: 0, near_oil.id: 0, far_teff.id: 7}
+    # planned orders are not planned again
+    assert api.post("/delivery/plan_fulfilment").json()["orders"] == []
+
+
+def test_lines_added_one_by_one_are_planned_without_creating_stock(api, seed):
+    warehouse, = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID, latitude=9.01, longitude=38.75))
+    teff, = seed(Product(name="Teff", unit_of_measurement="kg", warehouse_id=warehouse.id, organization_id=ORGANIZATION_ID,
+                         quantity=10, sales_price=5))
+    order, = seed(Order(client_id=1, user_id=USER_ID, organization_id=ORGANIZATION_ID, status="Succeeded"))
+    line = api.post("/sales/create_order_item", data={"order_id": order.id, "product_id": teff.id, "quantity": 2}).json()
+    api.post("/sales/update_order_item", data={"id": line["id"], "order_id": order.id, "product_id": teff.id, "quantity": 4})
+
+    applied = api.post("/delivery/plan_fulfilment", params={"dry_run": False}).json()
+    assert [line["quantity"] for line in applied["orders"][0]["shipments"][0]["lines"]] == [4]
+    assert api.get("/product_id", params={"product_id": teff.id}).json()[0]["quantity"] == 6
+    movements = api.get("/warehouse/stock_movements", params={"product_id": teff.id}).json()["items"]
+    assert sum(m["quantity"] for m in movements) == -4
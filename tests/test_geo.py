@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import numpy as np
+
+from model.delivery import Delivery, DeliveryStatusUpdate, GPSCoordinates
+from services import geo
+from tests.conftest import ORGANIZATION_ID
+
+
+def test_encode_polyline_matches_the_reference_example():
+    assert geo.encode_polyline([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_simplify_keeps_only_the_corners():
+    x = np.arange(0, 101, dtype=float)
+    # along the x axis, up the y axis, with 1 m of noise
+    points = np.concatenate((np.column_stack((x, np.where(x % 2, 1.0, 0.0))), np.column_stack((np.full(100, 100.0), x[1:]))))
+    assert geo.simplify(points, 5).tolist() == [0, 100, 200]
+    assert len(geo.simplify(points, 0.5)) > 100
+    assert geo.simplify(points[:2], 5).tolist() == [0, 1]
+
+
+def test_track_joins_every_status_segment(api, seed):
+    delivery, = seed(Delivery(organization_id=ORGANIZATION_ID))
+    packed, transit = seed(DeliveryStatusUpdate(delivery_id=delivery.id, delivery_status="Packed"),
+                           DeliveryStatusUpdate(delivery_id=delivery.id, delivery_status="In Transit"))
+    seed(*[GPSCoordinates(delivery_status_id=packed.id if i < 10 else transit.id, latitude=9.0 + i * 0.001,
+                          longitude=38.7, timestamp=datetime(2024, 3, 1, 8, i)) for i in range(30)])
+
+    full = api.get("/delivery/track", params={"delivery_id": delivery.id}).json()
+    assert (full["total_points"], full["returned_points"]) == (30, 30)
+    assert full["points"][0] == [9.0, 38.7] and full["started_at"] == "2024-03-01T08:00:00"
+    # a straight northbound trip is its two ends at any zoom
+    simplified = api.get("/delivery/track", params={"delivery_id": delivery.id, "zoom": 15, "encoding": "polyline"}).json()
+    assert simplified["returned_points"] == 2
+    assert simplified["polyline"] == geo.encode_polyline([(9.0, 38.7), (9.029, 38.7)])
+    assert api.get("/delivery/track", params={"delivery_id": delivery.id + 1}).json()["detail"] == "Delivery does not exist."
@@ -0,0 +1,30 @@
+from sqlalchemy import create_engine, text
+
+from db import InstrumentedQueuePool, pool_status
+
+
+def test_health_db_reports_pools(api):
+    response = api.get("/health/db")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ok"
+    assert {"checked_out", "idle", "overflow", "wait_avg_ms"} <= body["pools"]["async"].keys()
+
+
+def test_health_needs_an_admin(api, current_user):
+    current_user["user_role"] = "driver"
+    assert "pools" not in api.get("/health/db").json()
+    assert "hits" not in api.get("/health/auth_cache").json()
+
+
+def test_instrumented_pool_records_checkouts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+                           pool_size=2, max_overflow=1)
+    before = InstrumentedQueuePool.metrics.checkouts
+    with engine.connect() as first, engine.connect() as second, engine.connect() as third:
+        first.execute(text("SELECT 1"))
+        status = pool_status(engine.pool)
+        assert status["checked_out"] == 3
+        assert status["overflow"] == 1
+    assert pool_status(engine.pool)["idle"] == 2
+    assert InstrumentedQueuePool.metrics.checkouts == before + 3
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlmodel import select
+
+from model.inventory import InventoryMovement, InventorySnapshot
+from model.orders import Order
+from model.product import Product
+from services import inventory
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+def run(db_session_maker, work):
+    async def go():
+        async with db_session_maker() as session:
+            return await work(session)
+    return asyncio.run(go())
+
+
+def test_every_stock_change_is_a_movement(api, seed, db_session_maker):
+    product = api.post("/admin/create_product", data={"name": "Teff", "unit_of_measurement": "kg", "quantity": 10, "sales_price": 5}).json()
+    order, = seed(Order(client_id=1, user_id=USER_ID, organization_id=ORGANIZATION_ID))
+    api.post("/sales/create_multiple_order_items", json=[{"order_id": order.id, "product_id": product["id"], "quantity": 4, "price": 0}])
+    api.post("/admin/update_product", data={"id": product["id"], "name": "Teff", "unit_of_measurement": "kg", "quantity": 9})
+
+    movements = api.get("/warehouse/stock_movements", params={"product_id": product["id"]}).json()["items"]
+    assert [(m["reason"], m["quantity"], m["reference_id"]) for m in movements] == [
+        ("opening", 10, None), ("sale", -4, order.id), ("count", 3, None)]
+    assert api.get("/warehouse/stock", params={"product_id": product["id"]}).json()["quantity"] == 9
+    assert api.get("/product_id", params={"product_id": product["id"]}).json()[0]["quantity"] == 9
+
+
+def test_snapshots_keep_the_history_and_rebuild_restores_the_cache(seed, db_session_maker):
+    product, = seed(Product(name="Oil", unit_of_measurement="l", organization_id=ORGANIZATION_ID))
+    times = [datetime(2024, 3, day) for day in (1, 2, 3, 4)]
+    movements = seed(*[InventoryMovement(organization_id=ORGANIZATION_ID, product_id=product.id, quantity=quantity,
+                                         reason="sale", created_at=moment) for quantity, moment in zip((20, -5, -3, 7), times)])
+
+    assert run(db_session_maker, lambda s: inventory.compact(s, min_tail=5)) == 0
+    assert run(db_session_maker, lambda s: inventory.compact(s, min_tail=4)) == 1
+    snapshot = run(db_session_maker, lambda s: s.get(InventorySnapshot, (product.id, movements[-1].id)))
+    assert (snapshot.quantity, snapshot.taken_at) == (19, times[3])
+    seed(InventoryMovement(organization_id=ORGANIZATION_ID, product_id=product.id, quantity=-9, reason="sale",
+                           created_at=datetime(2024, 3, 5)))
+    assert run(db_session_maker, lambda s: inventory.on_hand(s, product.id)) == 10
+    # before the snapshot the movements are summed from the start
+    assert run(db_session_maker, lambda s: inventory.on_hand(s, product.id, datetime(2024, 3, 2, 12))) == 15
+    assert run(db_session_maker, lambda s: inventory.on_hand(s, product.id, datetime(2024, 3, 4, 12))) == 19
+    assert run(db_session_maker, lambda s: inventory.on_hand(s, product.id, datetime(2024, 2, 1))) == 0
+
+    async def clobber(session):
+        await session.exec(update(Product).where(Product.id == product.id).values(quantity=123))
+        await session.commit()
+    run(db_session_maker, clobber)
+    assert run(db_session_maker, lambda s: inventory.rebuild(s, ORGANIZATION_ID)) == 1
+    assert run(db_session_maker, lambda s: s.get(Product, product.id)).quantity == 10
+
+
+def test_deleting_a_product_deletes_its_ledger(api, db_engine, db_session_maker):
+    product = api.post("/admin/create_product", data={"name": "Teff", "unit_of_measurement": "kg", "quantity": 10}).json()
+    api.post("/admin/update_product", data={"id": product["id"], "name": "Teff", "unit_of_measurement": "kg", "quantity": 7})
+    assert run(db_session_maker, lambda s: inventory.compact(s, min_tail=1, min_age=timedelta(0))) == 1
+
+    async def enforce_foreign_keys():
+        async with db_engine.connect() as conn:
+            await conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+    asyncio.run(enforce_foreign_keys())
+    assert api.request("DELETE", "/admin/delete_product", params={"product_id": product["id"]}).json() == {
+        "message": "Product deleted successfully."}
+
+    async def ledger(session):
+        movements = (await session.exec(select(InventoryMovement))).all()
+        return movements + (await session.exec(select(InventorySnapshot))).all()
+    assert run(db_session_maker, ledger) == []
+
+
+def test_compact_leaves_out_recent_movements(seed, db_session_maker):
+    product, = seed(Product(name="Salt", unit_of_measurement="kg", organization_id=ORGANIZATION_ID))
+    old = seed(*[InventoryMovement(organization_id=ORGANIZATION_ID, product_id=product.id, quantity=quantity,
+                                   reason="sale", created_at=datetime(2024, 3, day)) for day, quantity in ((1, 8), (2, -2))])
+    seed(InventoryMovement(organization_id=ORGANIZATION_ID, product_id=product.id, quantity=-1, reason="sale"))
+
+    assert run(db_session_maker, lambda s: inventory.compact(s, min_tail=3)) == 0
+    assert run(db_session_maker, lambda s: inventory.compact(s, min_tail=2)) == 1
+    snapshot = run(db_session_maker, lambda s: s.get(InventorySnapshot, (product.id, old[-1].id)))
+    assert snapshot.quantity == 6
+    assert run(db_session_maker, lambda s: inventory.on_hand(s, product.id)) == 5
@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from model.delivery import Delivery
+from model.orders import Order, OrderItem
+from model.organization import UserOrganization
+from model.product import Product, parse_dimensions
+from model.user import Driver
+from services import loading
+from services.loading import DeliveryLoad, Vehicle
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("40 x 30 x 20", (40, 30, 20)),
+    ("40x30x20 cm", (40, 30, 20)),
+    ("0.4m * 0.3m * 0.2m", (40, 30, 20)),
+    ("400 × 300 × 200 mm", (40, 30, 20)),
+    ("1 m x 50 x 20 cm", (100, 50, 20)),
+    ("12,5 by 10 by 2 in", (31.75, 25.4, 5.08)),
+    ("40 x 30", None),
+    ("large", None),
+    (None, None),
+])
+def test_parse_dimensions(text, expected):
+    assert parse_dimensions(text) == (pytest.approx(expected) if expected else None)
+
+
+def test_pack_keeps_assignments_and_fills_largest_first():
+    vehicles = [Vehicle(1, 100, 1.0), Vehicle(2, 50, 1.0)]
+    loads = [DeliveryLoad(10, None, 40, 0.1, 0), DeliveryLoad(11, None, 60, 0.1, 0),
+             DeliveryLoad(12, 2, 30, 0.1, 0), DeliveryLoad(13, None, 10, 0.8, 0), DeliveryLoad(14, None, 500, 0.1, 0)]
+    manifests, unplaced = loading.pack(loads, vehicles)
+    # 13 is the bulkiest and takes vehicle 1, 11 then only fits there by weight, 10 is left for vehicle 2 ...
+    assert {driver_id: [load.id for load in carried] for driver_id, carried in manifests.items()} == {1: [13, 11], 2: [12]}
+    # ... which already carries 30 kg, so 10 fits nowhere
+    assert [load.id for load in unplaced] == [14, 10]
+    assert loading.pack(loads, []) == ({}, loads)
+
+
+def test_load_plan_packs_the_day_by_weight_and_volume(api, seed):
+    users = [uuid.uuid4() for _ in range(2)]
+    seed(*[UserOrganization(user_id=user, organization_id=ORGANIZATION_ID) for user in users])
+    small, large = seed(Driver(name="small", driver_id=users[0], email="s@example.com", phone="0911", car_license_plate="AA-1",
+                               driver_license_id="DL-1", capacity_kg=100),
+                        Driver(name="large", driver_id=users[1], email="l@example.com", phone="0912", car_license_plate="AA-2",
+                               driver_license_id="DL-2"))
+    cement, box, unknown = seed(
+        Product(name="Cement", unit_of_measurement="bag", organization_id=ORGANIZATION_ID, weight=50, dimensions="60 x 40 x 10 cm"),
+        Product(name="Box", unit_of_measurement="pcs", organization_id=ORGANIZATION_ID, weight=1, dimensions="1m x 1m x 1m"),
+        Product(name="Loose", unit_of_measurement="pcs", organization_id=ORGANIZATION_ID))
+    assert (cement.width_cm, cement.height_cm, cement.length_cm) == (60, 40, 10)
+    orders = seed(*[Order(client_id=1, user_id=USER_ID, organization_id=ORGANIZATION_ID) for _ in range(3)])
+    seed(OrderItem(order_id=orders[0].id, product_id=cement.id, quantity=4, price=1),
+         OrderItem(order_id=orders[1].id, product_id=box.id, quantity=3, price=1),
+         OrderItem(order_id=orders[1].id, product_id=unknown.id, quantity=1, price=1),
+         OrderItem(order_id=orders[2].id, product_id=cement.id, quantity=1, price=1))
+    deliveries = seed(Delivery(organization_id=ORGANIZATION_ID, order_id=orders[0].id, started_at=datetime(2024, 3, 1, 8)),
+                      Delivery(organization_id=ORGANIZATION_ID, order_id=orders[1].id, started_at=datetime(2024, 3, 1, 9)),
+                      Delivery(organization_id=ORGANIZATION_ID, order_id=orders[2].id, started_at=datetime(2024, 3, 1, 10),
+                               driver_id=small.id),
+                      Delivery(organization_id=ORGANIZATION_ID, order_id=orders[2].id, started_at=datetime(2024, 3, 2, 8)))
+
+    plan = api.get("/delivery/load_plan", params={"day": "2024-03-01", "capacity_kg": 1000, "capacity_m3": 2}).json()
+    manifests = {manifest["driver_id"]: manifest for manifest in plan["manifests"]}
+    assert [d["delivery_id"] for d in manifests[small.id]["deliveries"]] == [deliveries[2].id]
+    assert manifests[small.id]["weight_kg"] == 50 and manifests[small.id]["capacity_kg"] == 100
+    # 200 kg of cement does not fit next to the 50 kg already in the small vehicle
+    assert [d["delivery_id"] for d in manifests[large.id]["deliveries"]] == [deliveries[0].id]
+    assert manifests[large.id]["volume_m3"] == pytest.approx(4 * 0.024)
+    # 3 m³ of boxes fit in no vehicle
+    assert plan["unplaced"] == [deliveries[1].id]
+    assert plan["incomplete"] == [deliveries[1].id]
+
+    # dimensions are parsed again when a product is changed
+    api.post("/admin/update_product", data={"id": box.id, "name": "Box", "unit_of_measurement": "pcs", "quantity": 0,
+                                            "weight": 1, "dimensions": "50 x 50 x 50", "organization_id": ORGANIZATION_ID})
+    plan = api.get("/delivery/load_plan", params={"day": "2024-03-01", "capacity_kg": 1000, "capacity_m3": 2}).json()
+    assert plan["unplaced"] == []
@@ -0,0 +1,152 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+
+from model.delivery import Delivery, DeliveryCurrentStatus, DeliveryLine, DeliveryStatusUpdate, DriverLastPosition, GPSCoordinates
+from model.inventory import InventoryMovement
+from model.orders import Order, OrderItem, Transaction
+from model.product import Product
+from model.rfq import RFQ, Quotation
+from model.user import Client
+from db import require_migrated
+from tests.conftest import ORGANIZATION_ID
+
+ROOT = Path(__file__).resolve().parent.parent
+# set to a migrated Postgres database to check the plans there as well
+TEST_POSTGRES = os.getenv("TEST_POSTGRES")
+
+# the queries behind the busiest endpoints, each must be answered from an index
+HOT_QUERIES = {
+    "orders by status": select(Order).where(Order.organization_id == ORGANIZATION_ID).where(Order.status == "Succeeded"),
+    "orders by date": select(Order).where(Order.organization_id == ORGANIZATION_ID)
+    .where(Order.order_date >= "2024-01-01").where(Order.order_date < "2024-02-01"),
+    "order items": select(OrderItem).where(OrderItem.order_id == 1),
+    "transactions of an order": select(Transaction).where(Transaction.order_id == 1),
+    "deliveries of a driver": select(Delivery).where(Delivery.organization_id == ORGANIZATION_ID).where(Delivery.driver_id == 1),
+    "driver listing": select(DeliveryCurrentStatus).where(DeliveryCurrentStatus.organization_id == ORGANIZATION_ID)
+    .where(DeliveryCurrentStatus.driver_id == 1).where(DeliveryCurrentStatus.status.in_(["Packed", "In Transit"])),
+    "status history": select(DeliveryStatusUpdate).where(DeliveryStatusUpdate.delivery_id == 1)
+    .order_by(DeliveryStatusUpdate.timestamp.desc()),
+    "gps trail": select(GPSCoordinates).where(GPSCoordinates.delivery_status_id == 1).order_by(GPSCoordinates.timestamp),
+    "delivery track": select(GPSCoordinates.latitude, GPSCoordinates.longitude)
+    .join(DeliveryStatusUpdate, DeliveryStatusUpdate.id == GPSCoordinates.delivery_status_id)
+    .where(DeliveryStatusUpdate.delivery_id == 1),
+    "deliveries of a day": select(Delivery).where(Delivery.organization_id == ORGANIZATION_ID)
+    .where(Delivery.started_at >= "2024-03-01").where(Delivery.started_at < "2024-03-02"),
+    "lines of a delivery": select(DeliveryLine).where(DeliveryLine.delivery_id == 1),
+    "stock movements of a product": select(InventoryMovement).where(InventoryMovement.product_id == 1)
+    .where(InventoryMovement.id > 100),
+    "fleet": select(DriverLastPosition).where(DriverLastPosition.organization_id == ORGANIZATION_ID),
+    "products": select(Product).where(Product.organization_id == ORGANIZATION_ID),
+    "clients": select(Client).where(Client.organization_id == ORGANIZATION_ID),
+    "open rfqs": select(RFQ).where(RFQ.organization_id == ORGANIZATION_ID).where(RFQ.status == "Open"),
+    "quotations of an rfq": select(Quotation).where(Quotation.rfq_id == 1),
+}
+
+
+def alembic_config(url):
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def test_migrations_match_the_models(tmp_path):
+    config = alembic_config(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+    command.upgrade(config, "head")
+    command.check(config)  # raises if the models declare something no migration creates
+    command.downgrade(config, "base")
+
+
+def test_command_line_jobs_need_the_migrated_schema(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}"
+
+    async def check():
+        engine = create_async_engine(url)
+        try:
+            await require_migrated(engine)
+        finally:
+            await engine.dispose()
+    with pytest.raises(SystemExit, match="alembic upgrade head"):
+        asyncio.run(check())
+    command.upgrade(alembic_config(url), "head")
+    asyncio.run(check())
+
+
+def test_the_projections_are_filled_from_the_baseline_tables(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}"
+    config = alembic_config(url)
+    command.upgrade(config, "0001")
+
+    async def run(*statements):
+        engine = create_async_engine(url)
+        async with engine.begin() as conn:
+            rows = [(await conn.execute(text(statement))).all() if statement.startswith("SELECT")
+                    else await conn.execute(text(statement)) for statement in statements]
+        await engine.dispose()
+        return rows
+    asyncio.run(run(
+        "INSERT INTO organization (id, org_name, created_at, updated_at) "
+        "VALUES (1, 'Kaldis', '2024-03-01 00:00:00', '2024-03-01 00:00:00')",
+        "INSERT INTO \"order\" (id, client_id, user_id, organization_id, status, order_date, created_at, updated_at) "
+        "VALUES (1, 1, '00000000000000000000000000000001', 1, 'Succeeded', '2024-03-01 08:00:00', "
+        "'2024-03-01 08:00:00', '2024-03-01 08:00:00')",
+        "INSERT INTO delivery (id, order_id, organization_id, started_at, delivered_at) "
+        "VALUES (1, 1, 1, '2024-03-01 08:30:00', '2024-03-02 09:00:00')",
+        "INSERT INTO delivery_status_update (id, delivery_id, delivery_status, timestamp) VALUES "
+        "(1, 1, 'Packed', '2024-03-01 09:00:00'), (2, 1, 'Delivered', '2024-03-02 09:00:00')"))
+    command.upgrade(config, "head")
+    kpi, daily, current = asyncio.run(run(
+        "SELECT total_orders, total_shipments FROM organization_kpi",
+        "SELECT day, orders, shipments FROM organization_kpi_daily ORDER BY day",
+        "SELECT delivery_id, status, status_update_id FROM delivery_current_status"))
+    assert kpi == [(1, 1)]
+    assert daily == [("2024-03-01", 1, 0), ("2024-03-02", 0, 1)]
+    assert current == [(1, "Delivered", 2)]
+
+
+@pytest.fixture(scope="module")
+def migrated_engine(tmp_path_factory):
+    # the index checks run against the schema the migrations build, not the models' create_all
+    url = f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('migrations') / 'head.db'}"
+    command.upgrade(alembic_config(url), "head")
+    engine = create_async_engine(url)
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+def sqlite_plan(engine, statement):
+    async def explain():
+        async with engine.connect() as conn:
+            sql = str(statement.compile(conn.sync_engine, compile_kwargs={"literal_binds": True}))
+            return [row[-1] for row in (await conn.execute(text("EXPLAIN QUERY PLAN " + sql))).all()]
+    return asyncio.run(explain())
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_an_index_on_sqlite(migrated_engine, name):
+    plan = sqlite_plan(migrated_engine, HOT_QUERIES[name])
+    assert not [step for step in plan if step.startswith("SCAN")], plan
+
+
+@pytest.mark.skipif(not TEST_POSTGRES, reason="TEST_POSTGRES is not set")
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_an_index_on_postgres(name):
+    async def explain():
+        engine = create_async_engine(TEST_POSTGRES)
+        async with engine.connect() as conn:
+            # with seq scans priced out, a Seq Scan in the plan means there is no usable index
+            await conn.execute(text("SET enable_seqscan = off"))
+            sql = str(HOT_QUERIES[name].compile(conn.sync_engine, compile_kwargs={"literal_binds": True}))
+            plan = [row[0] for row in (await conn.execute(text("EXPLAIN " + sql))).all()]
+        await engine.dispose()
+        return plan
+    plan = asyncio.run(explain())
+    assert not [line for line in plan if "Seq Scan" in line], plan
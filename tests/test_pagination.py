@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from model.delivery import ShipmentDelivery, ShipmentTracking
+from model.orders import Order
+from model.user import Client
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+def pages(api, path, **params):
+    items, cursor = [], None
+    while True:
+        page = api.get(path, params={**params, **({"after": cursor} if cursor else {})}).json()
+        items.append([row["id"] for row in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_orders_are_paged_by_cursor(api, seed):
+    client, = seed(Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", organization_id=ORGANIZATION_ID))
+    day = datetime(2024, 3, 1)
+    # several orders share an order_date, the id keeps them in a stable order across pages
+    orders = seed(*[Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID,
+                          order_date=day + timedelta(days=i // 3), status="Pending" if i % 2 else "Succeeded")
+                    for i in range(10)])
+    seed(Order(client_id=client.id, user_id=USER_ID, organization_id=2, order_date=day))
+    ids = [o.id for o in orders]
+
+    assert pages(api, "/sales/orders", limit=4) == [ids[:4], ids[4:8], ids[8:]]
+    newest_first = sorted(orders, key=lambda o: (o.order_date, o.id), reverse=True)
+    assert sum(pages(api, "/sales/orders", limit=3, sort="-order_date"), []) == [o.id for o in newest_first]
+    assert sum(pages(api, "/sales/orders", limit=2, status="Pending", start="2024-03-02", end="2024-03-04"), []) == [
+        o.id for o in orders if o.status == "Pending" and day + timedelta(days=1) <= o.order_date < day + timedelta(days=3)]
+
+    cursor = api.get("/sales/orders", params={"limit": 1}).json()["next_cursor"]
+    assert api.get("/sales/orders", params={"after": cursor, "sort": "-order_date"}).status_code == 400
+    assert api.get("/sales/orders", params={"sort": "client_id"}).status_code == 400
+    assert api.get("/sales/orders", params={"after": "not a cursor"}).status_code == 400
+
+
+def test_shipment_tracking_is_scoped_to_the_organization(api, seed):
+    ours, theirs = seed(ShipmentDelivery(organization_id=ORGANIZATION_ID), ShipmentDelivery(organization_id=2))
+    tracking = seed(ShipmentTracking(shipment_delivery_id=ours.id, latitude=9.0, longitude=38.7),
+                    ShipmentTracking(shipment_delivery_id=theirs.id, latitude=9.1, longitude=38.8))
+    page = api.get("/delivery/get_shipment_tracking").json()
+    assert [row["id"] for row in page["items"]] == [tracking[0].id]
+    assert page["next_cursor"] is None
@@ -0,0 +1,79 @@
+import asyncio
+
+from sqlmodel import select
+
+from model.delivery import ShipmentDelivery
+from services.pubsub import InProcessBroker, broker, event_stream, organization_channel, publish_on_commit
+from tests.conftest import ORGANIZATION_ID
+
+
+def record(channel):
+    events = []
+    return events, broker.subscribe(channel, events.append)
+
+
+def test_listeners_share_one_subscription_per_channel():
+    local = InProcessBroker()
+
+    async def run():
+        async with local.listen("a", maxsize=2) as first, local.listen("a") as second:
+            assert local.channels == 1
+            for i in range(3):
+                local.publish("a", i)
+            local.publish("b", "nobody listens")
+            return [first.get_nowait() for _ in range(first.qsize())], second.qsize()
+
+    assert asyncio.run(run()) == ([1, 2], 3)
+    assert local.channels == 0
+
+
+def test_events_are_published_only_after_commit(db_session_maker):
+    events, unsubscribe = record(organization_channel(ORGANIZATION_ID))
+
+    async def run():
+        async with db_session_maker() as session:
+            await session.exec(select(1))
+            publish_on_commit(session, ORGANIZATION_ID, "delivery_status", {"id": 1})
+            await session.rollback()
+            publish_on_commit(session, ORGANIZATION_ID, "delivery_status", {"id": 2})
+            assert events == []
+            await session.commit()
+
+    asyncio.run(run())
+    unsubscribe()
+    assert events == [{"event": "delivery_status", "data": {"id": 2}}]
+
+
+def test_status_and_tracking_updates_reach_the_organization_feed(api, seed):
+    ours, theirs = seed(ShipmentDelivery(organization_id=ORGANIZATION_ID), ShipmentDelivery(organization_id=2))
+    events, unsubscribe = record(organization_channel(ORGANIZATION_ID))
+    delivery = api.post("/delivery/create_delivery", data={"order_id": 1}).json()
+    packed = api.post("/delivery/delivery_packed", params={"delivery_id": delivery["id"]}).json()
+    tracking = api.post("/delivery/create_shipment_tracking",
+                        data={"shipment_delivery_id": ours.id, "latitude": 9.0, "longitude": 38.7}).json()
+    api.post("/delivery/create_shipment_tracking", data={"shipment_delivery_id": theirs.id, "latitude": 9.0, "longitude": 38.7})
+    unsubscribe()
+    assert [(e["event"], e["data"]["id"]) for e in events] == [("delivery_status", packed["id"]),
+                                                              ("shipment_tracking", tracking["id"])]
+    assert events[0]["data"]["delivery_status"] == "Packed"
+
+
+def test_event_stream_formats_server_sent_events():
+    disconnected = False
+
+    async def is_disconnected():
+        return disconnected
+
+    async def run():
+        nonlocal disconnected
+        stream = event_stream("organization:9", is_disconnected, heartbeat=0.01)
+        assert await anext(stream) == "retry: 3000\n\n"
+        assert await anext(stream) == ": keep-alive\n\n"
+        broker.publish("organization:9", {"event": "delivery_status", "data": {"id": 4}})
+        chunk = await anext(stream)
+        disconnected = True
+        assert [chunk async for chunk in stream] == []
+        return chunk
+
+    assert asyncio.run(run()) == 'event: delivery_status\ndata: {"id": 4}\n\n'
+    assert broker.channels == 0
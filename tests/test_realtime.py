@@ -0,0 +1,129 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+import jwt
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from db import SUPABASE_JWT_SECRET
+from model.delivery import Delivery, DeliveryStatusUpdate
+from model.user import Driver
+from model.viewmodel import GPSFix
+from services.realtime import DriverHub
+from tests.conftest import ORGANIZATION_ID
+
+DRIVER_USER_ID = uuid.UUID("00000000-0000-0000-0000-000000000007")
+
+
+def token(role="driver", sub=DRIVER_USER_ID):
+    return jwt.encode({"sub": str(sub), "user_role": role, "user_metadata": {"organization_id": ORGANIZATION_ID},
+                       "exp": int(time.time()) + 600}, SUPABASE_JWT_SECRET, algorithm="HS256")
+
+
+@pytest.fixture
+def driver(seed):
+    driver, = seed(Driver(name="Abebe", driver_id=DRIVER_USER_ID, email="abebe@example.com", phone="0911",
+                          car_license_plate="AA-3-12345", driver_license_id="DL-1"))
+    return driver
+
+
+def test_ws_rejects_bad_tokens(api, driver):
+    for bad in ("not a token", token(role="sales"), token(sub=uuid.uuid4())):
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with api.websocket_connect(f"/delivery/ws?token={bad}"):
+                pass
+        assert closed.value.code == 1008
+
+
+def test_ws_streams_fixes_and_statuses(api, hub, driver, seed):
+    delivery, other = seed(Delivery(organization_id=ORGANIZATION_ID, driver_id=driver.id),
+                           Delivery(organization_id=ORGANIZATION_ID, driver_id=driver.id + 1))
+    status, foreign = seed(DeliveryStatusUpdate(delivery_id=delivery.id, delivery_status="In Transit"),
+                           DeliveryStatusUpdate(delivery_id=other.id, delivery_status="In Transit"))
+    fixes = [{"delivery_status_id": status.id, "latitude": 9.0, "longitude": 38.7 + i / 1000,
+              "timestamp": f"2024-03-01T08:00:0{i}"} for i in range(3)]
+
+    with api.websocket_connect("/delivery/ws", headers={"Authorization": f"Bearer {token()}"}) as ws:
+        assert hub.connections == 1
+        ws.send_json({"type": "gps", "fixes": fixes[:2]})
+        ws.send_json({"type": "status", "delivery_id": other.id, "delivery_status": "Delivered"})
+        assert ws.receive_json() == {"type": "error", "detail": "Delivery does not exist."}
+        # fixes on another driver's delivery are refused before they are buffered
+        ws.send_json({"type": "gps", "fixes": [{**fixes[0], "delivery_status_id": foreign.id}]})
+        assert ws.receive_json() == {"type": "error", "detail": f"Delivery status updates [{foreign.id}] do not exist."}
+        assert hub.accepted == 0
+        # the third fix fills the batch, all three are written with one INSERT
+        ws.send_json({"type": "gps", "fixes": fixes[2:]})
+        ws.send_json({"type": "status", "delivery_id": delivery.id, "delivery_status": "Delivered"})
+        assert ws.receive_json()["delivery_status_update"]["delivery_status"] == "Delivered"
+        assert hub.accepted == 3
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+    assert hub.connections == 0
+
+    assert len(api.get("/delivery/get_delivery_gps", params={"delivery_status_id": status.id}).json()) == 3
+    assert api.get("/delivery/get_latest_delivery_status_update",
+                   params={"delivery_id": delivery.id}).json()["delivery_status"] == "Delivered"
+
+
+def test_fixes_stay_buffered_until_they_are_stored(db_session_maker, seed):
+    delivery, = seed(Delivery(organization_id=ORGANIZATION_ID))
+    status, = seed(DeliveryStatusUpdate(delivery_id=delivery.id, delivery_status="In Transit"))
+    fixes = [GPSFix(delivery_status_id=status.id, latitude=9.0, longitude=38.7, timestamp=datetime(2024, 3, 1, 8, i))
+             for i in range(3)]
+    outage = [True]
+
+    def session_maker():
+        if outage.pop() if outage else False:
+            raise ConnectionError("database is down")
+        return db_session_maker()
+
+    async def run():
+        hub = DriverHub(session_maker, flush_interval=60, flush_size=2)
+        await hub.add_fixes(ORGANIZATION_ID, fixes[:2])
+        assert hub.accepted == 0 and hub._pending_count == 2
+        await hub.add_fixes(ORGANIZATION_ID, fixes[2:])
+        assert hub.accepted == 3 and hub._pending_count == 0
+        await hub.add_fixes(ORGANIZATION_ID, [GPSFix(**{**fixes[0].model_dump(), "timestamp": datetime(2024, 3, 1, 9)})])
+        # shutting down writes what is still buffered
+        await hub.close()
+        return hub.accepted
+    assert asyncio.run(run()) == 4
+
+
+def test_a_long_outage_keeps_only_the_newest_fixes(caplog):
+    def session_maker():
+        raise ConnectionError("database is down")
+
+    fixes = [GPSFix(delivery_status_id=1, latitude=9.0, longitude=38.7, timestamp=datetime(2024, 3, 1, 8, minute))
+             for minute in range(5)]
+
+    async def run():
+        hub = DriverHub(session_maker, flush_interval=60, flush_size=2, buffer_limit=3)
+        await hub.add_fixes(ORGANIZATION_ID, fixes[2:4])
+        await hub.add_fixes(ORGANIZATION_ID + 1, [fixes[0], fixes[4]])
+        await hub.add_fixes(ORGANIZATION_ID, fixes[1:2])
+        hub._flusher.cancel()
+        return hub
+    hub = asyncio.run(run())
+    assert hub._pending_count == 3 and hub.dropped == 2
+    assert {org: [fix.timestamp.minute for fix in kept] for org, kept in hub._pending.items() if kept} == {
+        ORGANIZATION_ID: [2, 3], ORGANIZATION_ID + 1: [4]}
+    assert "dropped the 1 oldest fixes" in caplog.text
+
+
+def test_update_delivery_pushes_assignments(api, driver, seed):
+    delivery = api.post("/delivery/create_delivery", data={"order_id": 1}).json()
+    with api.websocket_connect(f"/delivery/ws?token={token()}") as ws:
+        api.post("/delivery/update_delivery", data={"id": delivery["id"], "driver_id": driver.id,
+                                                     "delivery_instructions": "Gate 2"})
+        message = ws.receive_json()
+        assert (message["type"], message["delivery"]["id"]) == ("assigned", delivery["id"])
+        api.post("/delivery/update_delivery", data={"id": delivery["id"], "driver_id": driver.id,
+                                                     "delivery_instructions": "Gate 3"})
+        message = ws.receive_json()
+        assert (message["type"], message["delivery"]["delivery_instructions"]) == ("updated", "Gate 3")
+        api.post("/delivery/update_delivery", data={"id": delivery["id"], "driver_id": driver.id + 1})
+        assert ws.receive_json() == {"type": "unassigned", "delivery_id": delivery["id"]}
@@ -0,0 +1,52 @@
+import math
+
+import numpy as np
+
+from model.delivery import Delivery
+from model.orders import Order, OrderItem
+from model.product import Product
+from model.warehouse import Warehouse
+from services import routing
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+def test_stops_on_a_circle_are_visited_around_it():
+    angles = np.linspace(0, 2 * math.pi, 12, endpoint=False)
+    stops = [(9.0 + 0.05 * math.sin(a), 38.7 + 0.05 * math.cos(a)) for a in angles]
+    shuffled = np.random.default_rng(4).permutation(12).tolist()
+    order, legs = routing.plan_route(stops[0], [stops[i] for i in shuffled], routing.DistanceCache())
+    visited = [shuffled[i] for i in order]
+    assert visited in (list(range(12)), [0] + list(range(11, 0, -1)))
+    assert legs[0] == 0
+
+
+def test_sixty_stops_are_planned_without_lengthening_the_tour():
+    cache = routing.DistanceCache(maxsize=1000)
+    stops = [tuple(p) for p in np.random.default_rng(5).normal((9.02, 38.75), 0.05, (60, 2))]
+    order, legs = routing.plan_route((9.0, 38.7), stops, cache)
+    assert sorted(order) == list(range(60))
+    # 2-opt never makes the nearest neighbour tour longer
+    distances = cache.matrix([(9.0, 38.7), *stops])
+    tour = routing.nearest_neighbour(distances)
+    assert sum(legs) <= sum(distances[a, b] for a, b in zip(tour, tour[1:])) + 1e-9
+    # the cache keeps the newest pairs only
+    assert cache.stats()["size"] == 1000
+
+
+def test_route_plan_starts_at_the_source_warehouse(api, seed):
+    warehouse, = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID, latitude=9.0, longitude=38.70))
+    product, = seed(Product(name="Coffee", unit_of_measurement="kg", organization_id=ORGANIZATION_ID, warehouse_id=warehouse.id))
+    order, = seed(Order(client_id=1, user_id=USER_ID, organization_id=ORGANIZATION_ID))
+    seed(OrderItem(order_id=order.id, product_id=product.id, quantity=1, price=1))
+    deliveries = seed(*[Delivery(organization_id=ORGANIZATION_ID, order_id=order.id, driver_id=3, destination_latitude=9.0,
+                                 destination_longitude=longitude) for longitude in (38.90, 38.72, 38.80)],
+                      Delivery(organization_id=ORGANIZATION_ID, order_id=order.id, driver_id=3))
+    for delivery in deliveries:
+        api.post("/delivery/delivery_packed", params={"delivery_id": delivery.id})
+    api.post("/delivery/delivery_delivered", params={"delivery_id": deliveries[2].id})
+
+    plan = api.get("/delivery/route_plan", params={"driver_id": 3}).json()
+    assert plan["start"] == {"latitude": 9.0, "longitude": 38.70, "warehouse_id": warehouse.id}
+    assert [stop["delivery_id"] for stop in plan["stops"]] == [deliveries[1].id, deliveries[0].id]
+    assert plan["total_km"] == plan["stops"][-1]["cumulative_km"] > 20
+    assert plan["unrouted"] == [deliveries[3].id]
@@ -0,0 +1,141 @@
+from model.orders import Order, OrderItem
+from model.product import Product
+from model.user import Client
+from model.warehouse import Warehouse
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+def test_create_and_list_orders(api, seed):
+    client, = seed(Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", organization_id=ORGANIZATION_ID))
+    response = api.post("/sales/create_order", data={"client_id": client.id})
+    assert response.status_code == 200, response.text
+    assert response.json()["organization_id"] == ORGANIZATION_ID
+
+    orders = api.get("/sales/orders").json()["items"]
+    assert [o["client_id"] for o in orders] == [client.id]
+
+
+def test_order_paid_creates_delivery_and_transaction(api, seed):
+    warehouse, = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID))
+    product, client = seed(Product(name="Teff", unit_of_measurement="kg", warehouse_id=warehouse.id, organization_id=ORGANIZATION_ID, sales_price=10, quantity=100),
+                           Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", organization_id=ORGANIZATION_ID))
+    order, = seed(Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID))
+    seed(OrderItem(order_id=order.id, product_id=product.id, quantity=3, price=10))
+
+    response = api.post("/sales/paid", params={"order_id": order.id})
+    assert response.json()["status"] == "Succeeded"
+    assert api.get("/sales/transactions").json()["items"][0]["payment_amount"] == 30
+    assert len(api.get("/delivery/deliveries").json()["items"]) == 1
+
+
+def test_invoice_is_one_query(api, seed, queries):
+    bole, merkato = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID),
+                         Warehouse(name="Merkato", organization_id=ORGANIZATION_ID))
+    products = seed(*[Product(name=f"Product {i}", unit_of_measurement="kg", organization_id=ORGANIZATION_ID,
+                              warehouse_id=(bole if i % 2 else merkato).id) for i in range(150)])
+    client, = seed(Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", client_type="Distributor",
+                          organization_id=ORGANIZATION_ID))
+    order, = seed(Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID))
+    seed(*[OrderItem(order_id=order.id, product_id=p.id, quantity=2, price=5) for p in products])
+
+    queries.clear()
+    invoice = api.get("/sales/invoice", params={"order_id": order.id}).json()
+    assert len(queries) == 1
+    assert invoice["client_details"]["company_name"] == "Kaldis"
+    assert len(invoice["order_items"]) == 150
+    assert invoice["total"] == 150 * 10 * 0.9
+    line = invoice["product_map"][1]
+    assert line["product_id"] == products[1].id
+    assert line["warehouse_name"] == "Bole"
+    assert line["order_item_id"] == invoice["order_items"][1]["id"]
+
+    assert api.get("/sales/invoice", params={"order_id": order.id + 1}).json()["status_code"] == 400
+
+
+def test_create_multiple_order_items_reserves_stock_atomically(api, seed):
+    warehouse, = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID))
+    teff, coffee = seed(Product(name="Teff", unit_of_measurement="kg", warehouse_id=warehouse.id,
+                                organization_id=ORGANIZATION_ID, sales_price=10, quantity=10),
+                        Product(name="Coffee", unit_of_measurement="kg", warehouse_id=warehouse.id,
+                                organization_id=ORGANIZATION_ID, sales_price=25, quantity=5))
+    client, = seed(Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", organization_id=ORGANIZATION_ID))
+    order, = seed(Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID))
+
+    response = api.post("/sales/create_multiple_order_items", json=[
+        {"order_id": order.id, "product_id": teff.id, "quantity": 4, "price": 0},
+        {"order_id": order.id, "product_id": coffee.id, "quantity": 2, "price": 0},
+        {"order_id": order.id, "product_id": teff.id, "quantity": 1, "price": 0}])
+    assert response.json() == "Items Added Successfully"
+    items = api.get("/sales/order_items", params={"order_id": order.id}).json()
+    assert sorted((i["product_id"], i["quantity"], i["price"]) for i in items) == [
+        (teff.id, 1, 10), (teff.id, 4, 10), (coffee.id, 2, 25)]
+
+    # coffee has 3 left, so the whole second order is rejected and teff keeps its stock
+    response = api.post("/sales/create_multiple_order_items", json=[
+        {"order_id": order.id, "product_id": teff.id, "quantity": 5, "price": 0},
+        {"order_id": order.id, "product_id": coffee.id, "quantity": 4, "price": 0}])
+    assert response.json()["detail"] == f"Insufficient stock for product {coffee.id}"
+    assert len(api.get("/sales/order_items", params={"order_id": order.id}).json()) == 3
+    stock = {p["id"]: p["quantity"] for p in api.get("/products").json()["items"]}
+    assert stock == {teff.id: 5, coffee.id: 3}
+
+    # an unknown product is not reported as short
+    response = api.post("/sales/create_multiple_order_items", json=[
+        {"order_id": order.id, "product_id": teff.id, "quantity": 1, "price": 0},
+        {"order_id": order.id, "product_id": coffee.id + 100, "quantity": 1, "price": 0}])
+    assert response.json()["detail"] == f"Product {coffee.id + 100} does not exist."
+
+
+def test_update_multiple_order_items_applies_the_diff(api, seed, queries):
+    warehouse, = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID))
+    teff, coffee, honey = seed(*[Product(name=name, unit_of_measurement="kg", warehouse_id=warehouse.id,
+                                         organization_id=ORGANIZATION_ID, sales_price=price, quantity=10)
+                                 for name, price in (("Teff", 10), ("Coffee", 25), ("Honey", 40))])
+    client, = seed(Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", organization_id=ORGANIZATION_ID))
+    order, = seed(Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID))
+    api.post("/sales/create_multiple_order_items", json=[
+        {"order_id": order.id, "product_id": teff.id, "quantity": 4, "price": 0},
+        {"order_id": order.id, "product_id": coffee.id, "quantity": 2, "price": 0}])
+    kept, _ = api.get("/sales/order_items", params={"order_id": order.id}).json()
+
+    queries.clear()
+    items = api.post("/sales/update_multiple_order_items", json=[
+        {"id": kept["id"], "order_id": order.id, "product_id": teff.id, "quantity": 6, "price": 0},
+        {"order_id": order.id, "product_id": honey.id, "quantity": 1, "price": 0},
+        {"order_id": order.id, "product_id": honey.id, "quantity": 2, "price": 0}]).json()
+    assert [(i["id"] == kept["id"], i["product_id"], i["quantity"], i["price"]) for i in items] == [
+        (True, teff.id, 6, 10), (False, honey.id, 1, 40), (False, honey.id, 2, 40)]
+    # order check, old lines, prices, the product check, three stock updates, the ledger insert, delete, update,
+    # insert and the reload
+    assert len(queries) == 12
+    stock = {p["id"]: p["quantity"] for p in api.get("/products").json()["items"]}
+    assert stock == {teff.id: 4, coffee.id: 10, honey.id: 7}
+
+
+def test_single_line_changes_reserve_and_release_stock(api, seed):
+    teff, coffee = seed(*[Product(name=name, unit_of_measurement="kg", organization_id=ORGANIZATION_ID, sales_price=price,
+                                  quantity=10) for name, price in (("Teff", 10), ("Coffee", 25))])
+    client, = seed(Client(company_name="Kaldis", email="kaldis@example.com", phone="0911", organization_id=ORGANIZATION_ID))
+    order, other = seed(*[Order(client_id=client.id, user_id=USER_ID, organization_id=ORGANIZATION_ID) for _ in range(2)])
+
+    def stock():
+        return {p["id"]: p["quantity"] for p in api.get("/products").json()["items"]}
+
+    line = api.post("/sales/create_order_item", data={"order_id": order.id, "product_id": teff.id, "quantity": 4}).json()
+    assert line["price"] == 10 and stock() == {teff.id: 6, coffee.id: 10}
+    assert api.post("/sales/create_order_item", data={"order_id": order.id, "product_id": teff.id, "quantity": 7}).json()[
+        "detail"] == f"Insufficient stock for product {teff.id}"
+    line = api.post("/sales/update_order_item", data={"id": line["id"], "order_id": order.id, "product_id": coffee.id,
+                                                      "quantity": 3}).json()
+    assert line["price"] == 25 and stock() == {teff.id: 10, coffee.id: 7}
+    api.post("/sales/create_order_item", data={"order_id": other.id, "product_id": teff.id, "quantity": 2})
+
+    api.request("DELETE", "/sales/delete_order_item", data={"order_item_id": line["id"]})
+    assert stock() == {teff.id: 8, coffee.id: 10}
+    assert api.request("DELETE", "/sales/delete_order", data={"order_id": other.id}).json() == {
+        "message": "Order deleted successfully"}
+    assert stock() == {teff.id: 10, coffee.id: 10}
+    assert api.get("/sales/order_items", params={"order_id": other.id}).json()["detail"] == "Order does not exist."
+    movements = api.get("/warehouse/stock_movements", params={"product_id": teff.id}).json()["items"]
+    assert [(m["quantity"], m["reference_id"]) for m in movements] == [
+        (-4, order.id), (4, order.id), (-2, other.id), (2, other.id)]
@@ -0,0 +1,36 @@
+from model.product import Product
+from model.user import Supplier
+from services.search import TrigramIndex, similarity, trigrams
+from tests.conftest import ORGANIZATION_ID
+
+
+def test_trigrams_match_pg_trgm():
+    assert trigrams("Cat") == {"  c", " ca", "cat", "at "}
+    assert similarity("coffee", "coffee") == 1.0
+    assert similarity("coffee", "tea") == 0.0
+
+
+def test_trigram_index_ranks_typos_and_substrings():
+    index = TrigramIndex([(1, "Yirgacheffe Coffee"), (2, "Sidamo Coffee Beans"), (3, "Teff Flour"), (4, "Coffee")])
+    assert [key for key, _ in index.search("cofee")] == [4]
+    # like pg_trgm the whole name is compared, longer names need a lower threshold
+    assert [key for key, _ in index.search("cofee", threshold=0.2)] == [4, 1, 2]
+    # a short term scores low but still matches where it is a substring
+    assert [key for key, _ in index.search("ef", threshold=0.9)] == [1, 3]
+    assert len(index.search("coffee", limit=2)) == 2
+
+
+def test_product_search_tolerates_typos(api, seed):
+    products = seed(*[Product(name=name, organization_id=organization_id, unit_of_measurement="kg", quantity=1)
+                      for name, organization_id in [("Yirgacheffe Coffee", ORGANIZATION_ID), ("Coffee", ORGANIZATION_ID),
+                                                    ("Teff Flour", ORGANIZATION_ID), ("Coffee", 2)]])
+    found = api.get("/product_name", params={"product_name": "cofee", "threshold": 0.2}).json()
+    assert [p["id"] for p in found] == [products[1].id, products[0].id]
+    assert [p["id"] for p in api.get("/product_name", params={"product_name": "cofee", "limit": 1}).json()] == [products[1].id]
+    assert api.get("/product_name", params={"product_name": "cofee", "threshold": 2}).status_code == 422
+
+
+def test_supplier_search_tolerates_typos(api, seed):
+    seed(Supplier(company_name="Abyssinia Trading", email="a@example.com", phone="0911", contact_person_name="Hana"), Supplier(company_name="Awash Logistics", email="b@example.com", phone="0912", contact_person_name="Dawit"))
+    found = api.get("/user/supplier_name", params={"supplier_name": "abysinia"}).json()
+    assert [s["company_name"] for s in found] == ["Abyssinia Trading"]
@@ -0,0 +1,57 @@
+import numpy as np
+
+from model.delivery import Delivery
+from model.orders import Order, OrderItem
+from model.product import Product
+from model.warehouse import Warehouse
+from services import picking
+from services.picking import Bin, PickLine
+from tests.conftest import ORGANIZATION_ID, USER_ID
+
+
+def test_the_walk_snakes_through_the_aisles():
+    locations = ["B-10", "A-2", "A-10", "B-2", "C1", "c 5", None, "A-9-3", "A-9-1"]
+    bins = {i: Bin(f"p{i}", location, "pcs") for i, location in enumerate(locations)}
+    path = [bins[i].location for i in picking.walk(bins, bins)]
+    # bays count up A, down B, up C, unlocated last
+    assert path == ["A-2", "A-9-1", "A-9-3", "A-10", "B-10", "B-2", "C1", "c 5", None]
+
+
+def test_two_thousand_orders_are_batched_into_full_waves():
+    rng = np.random.default_rng(7)
+    bins = {i: Bin(f"p{i}", f"{chr(65 + i % 12)}-{i // 12 % 40:02d}-{i % 4}", "pcs") for i in range(2000)}
+    lines = [PickLine(order_id, int(product_id), 1.0)
+             for order_id in range(2000) for product_id in rng.integers(0, 2000, rng.integers(1, 10))]
+    waves = picking.build_waves(lines, bins, 25)
+    assert len(waves) == 80 and sorted(o for wave in waves for o in wave["order_ids"]) == list(range(2000))
+    assert sum(pick["quantity"] for wave in waves for pick in wave["picks"]) == len(lines)
+
+
+def test_pick_waves_cover_the_open_orders_of_the_warehouse(api, seed):
+    bole, merkato = seed(Warehouse(name="Bole", organization_id=ORGANIZATION_ID),
+                         Warehouse(name="Merkato", organization_id=ORGANIZATION_ID))
+    teff, oil, salt, coffee = seed(
+        Product(name="Teff", unit_of_measurement="kg", warehouse_id=bole.id, organization_id=ORGANIZATION_ID, location="B-01"),
+        Product(name="Oil", unit_of_measurement="l", warehouse_id=bole.id, organization_id=ORGANIZATION_ID, location="A-07"),
+        Product(name="Salt", unit_of_measurement="kg", warehouse_id=bole.id, organization_id=ORGANIZATION_ID, location="B-12"),
+        Product(name="Coffee", unit_of_measurement="kg", warehouse_id=merkato.id, organization_id=ORGANIZATION_ID, location="A-01"))
+    orders = seed(*[Order(client_id=1, user_id=USER_ID, organization_id=ORGANIZATION_ID) for _ in range(3)])
+    seed(OrderItem(order_id=orders[0].id, product_id=teff.id, quantity=2, price=1),
+         OrderItem(order_id=orders[0].id, product_id=coffee.id, quantity=1, price=1),
+         OrderItem(order_id=orders[1].id, product_id=teff.id, quantity=3, price=1),
+         OrderItem(order_id=orders[1].id, product_id=salt.id, quantity=1, price=1),
+         OrderItem(order_id=orders[1].id, product_id=oil.id, quantity=4, price=1),
+         OrderItem(order_id=orders[2].id, product_id=oil.id, quantity=5, price=1))
+    packed, = seed(Delivery(order_id=orders[2].id, organization_id=ORGANIZATION_ID))
+    api.post("/delivery/delivery_packed", params={"delivery_id": packed.id})
+
+    plan = api.get("/warehouse/pick_waves", params={"warehouse_id": bole.id}).json()
+    assert plan["orders"] == 2 and len(plan["waves"]) == 1
+    wave, = plan["waves"]
+    assert wave["order_ids"] == [orders[0].id, orders[1].id]
+    # aisle A up, then aisle B down
+    assert [(pick["location"], pick["quantity"]) for pick in wave["picks"]] == [("A-07", 4), ("B-12", 1), ("B-01", 5)]
+    assert wave["picks"][2]["orders"] == [{"order_id": orders[0].id, "quantity": 2}, {"order_id": orders[1].id, "quantity": 3}]
+
+    assert len(api.get("/warehouse/pick_waves", params={"warehouse_id": bole.id, "wave_size": 1}).json()["waves"]) == 2
+    assert "detail" in api.get("/warehouse/pick_waves", params={"warehouse_id": 999}).json()